@@ -6,7 +6,95 @@ class Settings(BaseSettings):
     app_name: str = "Music Platform"
     secret_key: str = "change-me"  # override via .env
     session_cookie: str = "music_session"
+    # resolved users are cached per process; with session_trust_cookie a freshly signed nickname
+    # in the cookie skips the lookup too, for at most user_cache_ttl seconds after it was issued
+    user_cache_size: int = 10000
+    user_cache_ttl: float = 60.0
+    session_trust_cookie: bool = False
+    # each signed-in user's liked track ids, cached per process for the like buttons on every page
+    liked_cache_size: int = 10000
+    liked_cache_ttl: float = 30.0
+    # bcrypt runs on its own process pool; raising bcrypt_rounds rehashes passwords on next login
+    bcrypt_rounds: int = 12
+    auth_workers: int = 2
+    auth_max_pending: int = 64
+    login_max_failures: int = 5
+    login_max_failures_per_ip: int = 50
+    login_failure_window: float = 15 * 60
     database_url: str = f"sqlite:///{(Path(__file__).resolve().parent.parent / 'music.db')}"
+    # optional replica for read-only handlers; defaults to database_url
+    database_read_url: str | None = None
+    # connection pool per engine (Postgres); SQLite uses one write connection and db_pool_size readers
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    sqlite_journal_mode: str = "wal"
+    sqlite_busy_timeout: float = 5.0
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # rendered track lists: "memory" (per process), "redis" (shared via redis_url) or "off"
+    fragment_cache: str = "memory"
+    fragment_cache_size: int = 1000
+    fragment_cache_ttl: int = 3600
+    fragment_play_staleness: float = 30.0
+    redis_url: str = "redis://localhost:6379/0"
+    # apply pending schema migrations on startup; turn off to run `python -m app.manage migrate` by hand
+    auto_migrate: bool = True
+    # play events are buffered and written in batches
+    play_queue_size: int = 10000
+    play_flush_size: int = 500
+    play_flush_interval: float = 1.0
+    play_enqueue_timeout: float = 0.05
+    # raw plays older than this are deleted in small batches; daily rollups keep the counts
+    # (0 keeps them forever; never less than the chart horizon)
+    play_retention_days: int = 180
+    play_prune_interval: float = 3600.0
+    play_prune_batch_size: int = 5000
+    play_prune_pause: float = 0.05
+    # deleted tracks are hidden at once; their rows and files are purged in batches in the background
+    track_purge_interval: float = 60.0
+    track_purge_batch_size: int = 5000
+    track_purge_pause: float = 0.05
+    # trending charts: decayed scores refreshed in the background, top chart_size kept per period
+    chart_refresh_interval: float = 60.0
+    chart_size: int = 100
+    chart_batch_size: int = 10000
+    chart_badge_size: int = 10
+    # "similar tracks" and the for-you feed: top neighbors per track from co-listening (needs scipy)
+    neighbors_k: int = 20
+    neighbors_refresh_interval: float = 300.0
+    neighbors_rebuild_interval: float = 24 * 3600
+    # live like/play counts over /api/v1/live: deltas are coalesced per tick; the "memory" broker
+    # only reaches clients of the same process, "redis" fans out across workers via redis_url
+    live_broker: str = "memory"
+    live_tick_interval: float = 0.5
+    live_send_buffer: int = 32
+    live_max_subscriptions: int = 500
+    # /metrics serves Prometheus text (behind a bearer token when metrics_token is set);
+    # statements slower than slow_query_ms are logged with their plan, and sql_debug logs
+    # statements repeated sql_repeat_threshold times in one request (likely an N+1)
+    metrics_token: str | None = None
+    slow_query_ms: float = 200.0
+    sql_debug: bool = False
+    sql_repeat_threshold: int = 5
+    # the platform catalog (static/uploads/platform) is synced in the background after startup;
+    # catalog_watch follows the directory with watchfiles, otherwise it is rescanned every
+    # catalog_rescan_interval seconds (0: only at startup)
+    catalog_watch: bool = False
+    catalog_rescan_interval: float = 0.0
+    max_upload_bytes: int = 50 * 1024 * 1024
+    # "local" (sharded under static/uploads) or "s3"; s3_endpoint_url may point at MinIO etc.
+    storage_backend: str = "local"
+    s3_bucket: str = ""
+    s3_prefix: str = ""
+    s3_endpoint_url: str | None = None
+    s3_public_url: str | None = None
+    # background audio analysis (duration, tags, waveform peaks, loudness)
+    audio_workers: int = 2
+    waveform_points: int = 400
+    ffmpeg_path: str = "ffmpeg"
+    # low/medium/high MP3 renditions built with ffmpeg's libmp3lame
+    transcode_workers: int = 1
 
     class Config:
         env_file = ".env"
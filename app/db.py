@@ -1,16 +1,111 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .config import settings
+from .services.observability import instrument_engine
 
-# SQLite для MVP, check_same_thread=False чтобы шарить соединение в Uvicorn
-connect_args = {"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
-engine = create_engine(settings.database_url, connect_args=connect_args, echo=False)
+_url = make_url(settings.database_url)
+IS_SQLITE = _url.get_backend_name() == "sqlite"
+# async drivers for the same database; asyncpg is only needed when running on Postgres
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _engine_options(pool_size: int) -> dict:
+    if IS_SQLITE:
+        # SQLite для MVP, check_same_thread=False чтобы шарить соединение в Uvicorn
+        return {"connect_args": {"check_same_thread": False}, "pool_size": pool_size, "max_overflow": 0}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
+
+
+def _tune_sqlite(engine, read_only: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers run alongside the single writer; NORMAL is durable across app crashes
+        cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout * 1000)}")
+        cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    return str(parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")) if backend in ASYNC_DRIVERS else url
+
+
+# SQLite allows one writer at a time: a single pooled write connection queues writers in
+# the pool instead of failing with SQLITE_BUSY, while reads use their own connections.
+engine = create_engine(
+    settings.database_url, echo=False, **_engine_options(1 if IS_SQLITE else settings.db_pool_size)
+)
+read_engine = create_engine(
+    settings.database_read_url or settings.database_url, echo=False, **_engine_options(settings.db_pool_size)
+)
+if IS_SQLITE:
+    _tune_sqlite(engine, read_only=False)
+    _tune_sqlite(read_engine, read_only=True)
+instrument_engine(engine, "write")
+instrument_engine(read_engine, "read")
+
+_async_engines: dict = {}
+
+
+def get_async_engine(read_only: bool = True):
+    """Async twin of ``read_engine``/``engine``, created on first use (needs aiosqlite/asyncpg)."""
+    if read_only not in _async_engines:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        url = (settings.database_read_url or settings.database_url) if read_only else settings.database_url
+        pool_size = 1 if IS_SQLITE and not read_only else settings.db_pool_size
+        async_engine = create_async_engine(_async_url(url), echo=False, **_engine_options(pool_size))
+        if IS_SQLITE:
+            _tune_sqlite(async_engine.sync_engine, read_only=read_only)
+        instrument_engine(async_engine.sync_engine, "async_read" if read_only else "async_write")
+        _async_engines[read_only] = async_engine
+    return _async_engines[read_only]
 
 
 def create_db_and_tables() -> None:
+    # new tables only; changes to existing ones are versioned in app.migrations
     SQLModel.metadata.create_all(engine)
 
 
+async def dispose_engines() -> None:
+    for async_engine in _async_engines.values():
+        await async_engine.dispose()
+    engine.dispose()
+    read_engine.dispose()
+
+
 def get_session() -> Session:
     with Session(engine) as session:
         yield session
+
+
+def get_read_session() -> Session:
+    with Session(read_engine) as session:
+        yield session
+
+
+async def get_async_session() -> AsyncSession:
+    # expire_on_commit=False: attributes stay readable after commit without awaiting a refresh
+    async with AsyncSession(get_async_engine(read_only=False), expire_on_commit=False) as session:
+        yield session
+
+
+async def get_async_read_session() -> AsyncSession:
+    async with AsyncSession(get_async_engine(read_only=True), expire_on_commit=False) as session:
+        yield session
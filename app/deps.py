@@ -1,10 +1,13 @@
-from fastapi import Depends, HTTPException, status, Cookie
+import time
+
+from fastapi import Depends, HTTPException, Request, status, Cookie
 from sqlmodel import Session, select
 from itsdangerous import URLSafeSerializer, BadSignature
 
 from .config import settings
-from .db import get_session
+from .db import get_read_session, get_session
 from .models.user import User
+from .services.sessions import SessionUser, lookups_total, user_cache
 
 serializer = URLSafeSerializer(settings.secret_key, salt="session")
 
@@ -13,38 +16,72 @@ def get_db_session(session: Session = Depends(get_session)) -> Session:
     return session
 
 
-def get_current_user(
-    session_data: str | None = Cookie(default=None, alias=settings.session_cookie),
-    db: Session = Depends(get_db_session),
-) -> User:
+def get_read_db_session(session: Session = Depends(get_read_session)) -> Session:
+    """Session on the read-only connections; use it for handlers that never write."""
+    return session
+
+
+def resolve_user(request: Request, session_data: str | None, db: Session) -> tuple[SessionUser | None, str]:
+    """Signed-in user for the cookie, or None and the reason it was rejected.
+
+    Checked in order: this request, the process cache, the nickname signed into the
+    cookie (when ``session_trust_cookie`` is on and the cookie is younger than
+    ``user_cache_ttl``, the staleness the cache already allows) and finally the database.
+    """
     if not session_data:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        return None, "Not authenticated"
+    cached = getattr(request.state, "session_user", None)
+    if cached is not None and cached[0] == session_data:
+        lookups_total["request"].inc()
+        return cached[1], cached[2]
+    result = _resolve(session_data, db)
+    request.state.session_user = (session_data, *result)
+    return result
+
+
+def _resolve(session_data: str, db: Session) -> tuple[SessionUser | None, str]:
     try:
         payload = serializer.loads(session_data)
     except BadSignature:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session")
-
+        return None, "Invalid session"
     user_id = payload.get("user_id")
     if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session payload")
+        return None, "Invalid session payload"
+
+    user = user_cache.get(user_id)
+    if user is not None:
+        lookups_total["cache"].inc()
+        return user, ""
+    nickname = payload.get("nickname")
+    issued_at = payload.get("iat") or 0
+    if nickname and settings.session_trust_cookie and time.time() - issued_at < settings.user_cache_ttl:
+        lookups_total["cookie"].inc()
+        return SessionUser(id=user_id, nickname=nickname), ""
+    lookups_total["database"].inc()
+    token = user_cache.token()
+    row = db.exec(select(User.id, User.nickname).where(User.id == user_id)).first()
+    if not row:
+        return None, "User not found"
+    user = SessionUser(id=row[0], nickname=row[1])
+    user_cache.put(user.id, user, token)
+    return user, ""
 
-    user = db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+def get_current_user(
+    request: Request,
+    session_data: str | None = Cookie(default=None, alias=settings.session_cookie),
+    db: Session = Depends(get_read_db_session),
+) -> SessionUser:
+    user, error = resolve_user(request, session_data, db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=error)
     return user
 
 
 def get_optional_user(
+    request: Request,
     session_data: str | None = Cookie(default=None, alias=settings.session_cookie),
-    db: Session = Depends(get_db_session),
-) -> User | None:
-    if not session_data:
-        return None
-    try:
-        payload = serializer.loads(session_data)
-    except BadSignature:
-        return None
-    user_id = payload.get("user_id")
-    if not user_id:
-        return None
-    return db.get(User, user_id)
+    db: Session = Depends(get_read_db_session),
+) -> SessionUser | None:
+    user, _ = resolve_user(request, session_data, db)
+    return user
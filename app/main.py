@@ -1,56 +1,79 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlmodel import Session
 
 from .config import settings
 from .db import create_db_and_tables
-from .db import engine
-from .routers import auth, tracks, profiles, pages
-from .models.user import User
-from .models.track import Track
-from pathlib import Path
+from .db import engine, dispose_engines
+from .middleware import BodySizeLimitMiddleware, RequestMetricsMiddleware
+from . import migrations
+from .routers import api, auth, tracks, profiles, charts, metrics, pages
+from .services.plays import play_buffer
+from .services.charts import chart_engine
+from .services.retention import play_pruner
+from .services.purge import track_purger
+from .services.recommendations import neighbor_index
+from .services.live import live_hub
+from .services.catalog import catalog_sync
+from .services import counters
+from .services.search import ensure_search_index
+from .services.analysis import audio_analyzer
+from .services.transcoding import transcoder
+from .services.passwords import password_hasher
 
 app = FastAPI(title=settings.app_name)
 
 templates = Jinja2Templates(directory="app/templates")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# leave room for the multipart envelope and the title/artist fields
+app.add_middleware(
+    BodySizeLimitMiddleware, max_bytes=settings.max_upload_bytes + 64 * 1024, paths={"/tracks/upload"}
+)
+# outermost, so the timings include the other middleware
+app.add_middleware(RequestMetricsMiddleware)
 
 
 @app.on_event("startup")
 def on_startup() -> None:
     create_db_and_tables()
-    seed_platform_user_and_tracks()
+    if settings.auto_migrate:
+        migrations.migrate(engine)
+    ensure_search_index(engine)
+    password_hasher.start()
+    audio_analyzer.start()
+    transcoder.start()
+    with Session(engine) as session:
+        counters.backfill_if_empty(session)
+    play_buffer.start()
+    chart_engine.start()
+    play_pruner.start()
+    track_purger.start()
+    neighbor_index.start()
+    live_hub.start()
+    catalog_sync.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    catalog_sync.stop()
+    await live_hub.stop()
+    neighbor_index.stop()
+    track_purger.stop()
+    play_pruner.stop()
+    chart_engine.stop()
+    play_buffer.stop()
+    audio_analyzer.stop()
+    transcoder.stop()
+    password_hasher.stop()
+    await dispose_engines()
 
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(tracks.router, prefix="/tracks", tags=["tracks"])
 app.include_router(profiles.router, prefix="/api/profiles", tags=["profiles"])
+app.include_router(charts.router, prefix="/api/charts", tags=["charts"])
+app.include_router(api.router, prefix="/api/v1", tags=["api"])
+app.include_router(metrics.router, tags=["metrics"])
 app.include_router(pages.router, tags=["pages"])
 
-
-def seed_platform_user_and_tracks() -> None:
-    """Create platform user and import mp3 files from static/uploads/platform as 'original' tracks."""
-    platform_uploads = Path("app/static/uploads/platform")
-    with Session(engine) as session:
-        platform_user = session.exec(select(User).where(User.nickname == "Platform")).first()
-        if not platform_user:
-            platform_user = User(nickname="Platform", hashed_password="platform")
-            session.add(platform_user)
-            session.commit()
-            session.refresh(platform_user)
-
-        if platform_uploads.exists():
-            for mp3_file in platform_uploads.glob("*.mp3"):
-                exists = session.exec(select(Track).where(Track.filename == f"platform/{mp3_file.name}")).first()
-                if exists:
-                    continue
-                track = Track(
-                    title=mp3_file.stem,
-                    artist="",
-                    filename=f"platform/{mp3_file.name}",
-                    creator_id=platform_user.id,
-                    is_platform=True,
-                )
-                session.add(track)
-            session.commit()
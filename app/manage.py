@@ -0,0 +1,108 @@
+"""Maintenance commands: ``python -m app.manage <command>``."""
+import argparse
+import sys
+
+from sqlmodel import Session
+
+from . import migrations
+from .db import create_db_and_tables, engine
+from .services import catalog, charts, counters, purge, recommendations, retention, search, storage
+
+
+def rebuild_counters(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        counters.rebuild_counters(session)
+    print("counters rebuilt")
+
+
+def reconcile_counters(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        fixed = counters.reconcile_counters(session)
+    print(f"{fixed} track(s) corrected")
+
+
+def prune_plays(args: argparse.Namespace) -> None:
+    deleted = retention.play_pruner.prune()
+    print(f"{deleted} play(s) pruned")
+
+
+def purge_tracks(args: argparse.Namespace) -> None:
+    purged = purge.track_purger.purge()
+    print(f"{purged} deleted track(s) purged")
+
+
+def rebuild_charts(args: argparse.Namespace) -> None:
+    charts.rebuild_charts()
+    print("charts rebuilt")
+
+
+def rebuild_neighbors(args: argparse.Namespace) -> None:
+    count = recommendations.neighbor_index.refresh(full=True)
+    print(f"neighbors computed for {count} track(s)")
+
+
+def rebuild_search_index(args: argparse.Namespace) -> None:
+    if not search.fts_enabled():
+        print("full-text search is not available for this database")
+        return
+    search.rebuild_search_index(engine)
+    print("search index rebuilt")
+
+
+def migrate_storage(args: argparse.Namespace) -> None:
+    with Session(engine) as session:
+        moved, missing = storage.migrate_layout(session)
+    print(f"{moved} file(s) moved, {missing} missing")
+
+
+def sync_catalog(args: argparse.Namespace) -> None:
+    result = catalog.sync_catalog()
+    print(f"{result.added} added, {result.changed} changed, {result.missing} missing, {result.restored} restored")
+
+
+def migrate(args: argparse.Namespace) -> None:
+    for name in migrations.migrate(engine):
+        print(f"applied {name}")
+    print(f"schema at version {migrations.current_version(engine)}")
+
+
+def check_plans(args: argparse.Namespace) -> None:
+    if engine.dialect.name != "sqlite":
+        print("query plan checks are written for SQLite")
+        return
+    failed = 0
+    for description, ok, plan in migrations.check_query_plans(engine):
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {description}: {plan}")
+    if failed:
+        sys.exit(1)
+
+
+COMMANDS = {
+    "migrate": (migrate, "apply pending schema migrations"),
+    "check-plans": (check_plans, "verify hot queries use their indexes (EXPLAIN QUERY PLAN)"),
+    "rebuild-counters": (rebuild_counters, "recompute likes/plays counters from raw history"),
+    "reconcile-counters": (reconcile_counters, "fix counters that drifted from raw history"),
+    "prune-plays": (prune_plays, "delete raw plays older than play_retention_days (rollups keep the counts)"),
+    "purge-tracks": (purge_tracks, "remove deleted tracks' plays, likes and unshared files now"),
+    "rebuild-charts": (rebuild_charts, "recompute trending scores from the full play and like history"),
+    "rebuild-neighbors": (rebuild_neighbors, "recompute similar tracks from all likes and plays"),
+    "rebuild-search-index": (rebuild_search_index, "repopulate the FTS5 track/profile index"),
+    "sync-catalog": (sync_catalog, "sync platform tracks with static/uploads/platform"),
+    "migrate-storage": (migrate_storage, "move uploads into the sharded layout of the configured backend"),
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (handler, help_text) in COMMANDS.items():
+        sub.add_parser(name, help=help_text).set_defaults(handler=handler)
+    args = parser.parse_args(argv)
+    create_db_and_tables()
+    search.ensure_search_index(engine)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
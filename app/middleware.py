@@ -0,0 +1,101 @@
+import time
+
+from fastapi import HTTPException, status
+from starlette.datastructures import MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .services import metrics
+from .services.observability import SQL_BUCKETS, STATEMENT_BUCKETS, RequestStats, current_request, report_repeats
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over ``max_bytes`` on the given paths before they are spooled.
+
+    Declared Content-Length is checked up front; chunked bodies are counted as they stream in.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, paths: set[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                response = PlainTextResponse("Request body is too large", status_code=413)
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Request body is too large"
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class RequestMetricsMiddleware:
+    """Per-route latency and SQL statement counts for every HTTP request.
+
+    Routes are labelled by their path template (``/tracks/{track_id}/play``), so the
+    number of series stays bounded. With ``sql_debug`` the response carries a
+    Server-Timing header with the request's statement count and database time.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.sql_debug:
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing", f'db;dur={stats.seconds * 1000:.1f};desc="{stats.statements} statements"'
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            method = scope["method"]
+            metrics.histogram(
+                "http_request_duration_seconds", "Request latency by route", method=method, route=stats.route
+            ).observe(time.perf_counter() - start)
+            metrics.counter(
+                "http_requests_total", "Requests by route and status", method=method, route=stats.route, status=str(status_code)
+            ).inc()
+            metrics.histogram(
+                "http_request_db_statements", "SQL statements per request", buckets=STATEMENT_BUCKETS, route=stats.route
+            ).observe(stats.statements)
+            metrics.histogram(
+                "http_request_db_seconds", "Database time per request", buckets=SQL_BUCKETS, route=stats.route
+            ).observe(stats.seconds)
+            if settings.sql_debug:
+                report_repeats(stats)
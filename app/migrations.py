@@ -0,0 +1,256 @@
+"""Versioned schema changes for existing databases.
+
+``create_all`` only creates missing tables, so anything added to a table that already
+exists (indexes, columns) goes here as a numbered migration. Migrations run at startup
+(``auto_migrate``) or with ``python -m app.manage migrate``; each runs once, in its own
+transaction, and is recorded in ``schema_version``. Write them to be idempotent: on a
+fresh database ``create_all`` has already built the current schema.
+"""
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Connection, func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = []
+
+SCHEMA_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS schema_version ("
+    "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+)
+
+
+def migration(version: int, name: str):
+    def register(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+
+    return register
+
+
+def create_index(conn: Connection, name: str, table: str, *columns: str) -> None:
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)})'))
+
+
+def drop_index(conn: Connection, name: str) -> None:
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    """``ALTER TABLE ... ADD COLUMN`` unless the column is already there."""
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA_VERSION_DDL))
+        return set(conn.execute(text("SELECT version FROM schema_version")).scalars())
+
+
+def pending(engine: Engine) -> list[tuple[int, str, Callable]]:
+    done = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def current_version(engine: Engine) -> int:
+    return max(applied_versions(engine), default=0)
+
+
+def migrate(engine: Engine) -> list[str]:
+    """Apply pending migrations in order; returns the names of those applied."""
+    applied = []
+    for version, name, fn in pending(engine):
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                    {"v": version, "n": name, "t": datetime.utcnow()},
+                )
+                fn(conn)
+        except IntegrityError:
+            # another process applied it first
+            continue
+        applied.append(f"{version:04d} {name}")
+    return applied
+
+
+@migration(1, "track listing indexes")
+def _track_listing_indexes(conn: Connection) -> None:
+    # keyset pagination over (created_at, id), overall, per catalog filter and per creator
+    create_index(conn, "ix_track_created_at_id", "track", "created_at", "id")
+    create_index(conn, "ix_track_is_platform_created_at_id", "track", "is_platform", "created_at", "id")
+    create_index(conn, "ix_track_creator_id_created_at_id", "track", "creator_id", "created_at", "id")
+
+
+@migration(2, "favorite track_id index")
+def _favorite_track_id(conn: Connection) -> None:
+    # the primary key leads with user_id, so per-track likes and deletes scanned the table
+    create_index(conn, "ix_favorite_track_id", "favorite", "track_id")
+
+
+@migration(3, "play track_id, played_at index")
+def _play_track_played_at(conn: Connection) -> None:
+    # per-track play counts, optionally bounded by time
+    create_index(conn, "ix_play_track_id_played_at", "play", "track_id", "played_at")
+
+
+@migration(4, "favorite created_at")
+def _favorite_created_at(conn: Connection) -> None:
+    # likes feed the trending charts by time; older rows stay NULL and are left out
+    add_column(conn, "favorite", "created_at", "DATETIME")
+    create_index(conn, "ix_favorite_created_at", "favorite", "created_at")
+
+
+@migration(5, "user daily plays rollup")
+def _user_daily_plays(conn: Connection) -> None:
+    # the table itself comes from create_all; fill it from the raw history kept so far
+    from .models.play import Play
+    from .models.stats import UserDailyPlays
+
+    table = UserDailyPlays.__table__
+    if conn.execute(select(table.c.user_id).limit(1)).first() is not None:
+        return
+    day = func.date(Play.played_at)
+    conn.execute(
+        table.insert().from_select(
+            ["user_id", "track_id", "day", "plays"],
+            select(Play.user_id, Play.track_id, day, func.count())
+            .where(Play.user_id.is_not(None))
+            .group_by(Play.user_id, Play.track_id, day),
+        )
+    )
+
+
+@migration(6, "drop redundant play indexes")
+def _drop_play_indexes(conn: Connection) -> None:
+    # track_id is the prefix of ix_play_track_id_played_at; user history is read from the rollup
+    drop_index(conn, "ix_play_track_id")
+    drop_index(conn, "ix_play_user_id")
+
+
+@migration(7, "track file_missing")
+def _track_file_missing(conn: Connection) -> None:
+    # set by the catalog sync for platform files removed from disk
+    add_column(conn, "track", "file_missing", "BOOLEAN NOT NULL DEFAULT 0")
+
+
+@migration(8, "track deleted_at")
+def _track_deleted_at(conn: Connection) -> None:
+    # tombstones left by delete for the background purger
+    add_column(conn, "track", "deleted_at", "DATETIME")
+    create_index(conn, "ix_track_deleted_at", "track", "deleted_at")
+    # before deleting a purged track's file, check no other track shares the blob
+    create_index(conn, "ix_track_filename", "track", "filename")
+    # the purger deletes a track's per-user rollups in batches
+    create_index(conn, "ix_userdailyplays_track_id", "userdailyplays", "track_id")
+
+
+@migration(9, "idempotency key request hash")
+def _idempotency_request_hash(conn: Connection) -> None:
+    add_column(conn, "idempotencykey", "request_hash", "VARCHAR(64)")
+
+
+@migration(10, "favorite like order")
+def _favorite_like_order(conn: Connection) -> None:
+    # profile pages list favorites by like time; undated likes sort last, and at the epoch
+    # they stay behind the chart engine's cursor, which only reads likes after it
+    conn.execute(text("UPDATE favorite SET created_at = '1970-01-01 00:00:00.000000' WHERE created_at IS NULL"))
+    create_index(conn, "ix_favorite_user_id_created_at", "favorite", "user_id", "created_at", "track_id")
+
+
+@migration(11, "track purged_at")
+def _track_purged_at(conn: Connection) -> None:
+    # purged tracks keep their row, so the purger's queue skips them by index
+    add_column(conn, "track", "purged_at", "DATETIME")
+    create_index(conn, "ix_track_purged_at_deleted_at", "track", "purged_at", "deleted_at")
+    drop_index(conn, "ix_track_deleted_at")
+
+
+def hot_queries() -> list[tuple[str, object, str]]:
+    """(description, statement, index the plan must use) for the queries the indexes exist for."""
+    from sqlmodel import delete
+
+    from .models.favorite import Favorite
+    from .models.play import Play
+    from .models.track import Track
+
+    page = [1, 2, 3]
+    return [
+        (
+            "newest tracks",
+            select(Track.id).order_by(Track.created_at.desc(), Track.id.desc()).limit(50),
+            "ix_track_created_at_id",
+        ),
+        (
+            "newest platform tracks",
+            select(Track.id)
+            .where(Track.is_platform == True)  # noqa: E712
+            .order_by(Track.created_at.desc(), Track.id.desc())
+            .limit(50),
+            "ix_track_is_platform_created_at_id",
+        ),
+        (
+            "likes per track for a page",
+            select(Favorite.track_id, func.count()).where(Favorite.track_id.in_(page)).group_by(Favorite.track_id),
+            "ix_favorite_track_id",
+        ),
+        (
+            "delete a track's likes",
+            delete(Favorite).where(Favorite.track_id == 1),
+            "ix_favorite_track_id",
+        ),
+        (
+            "a user's favorites, newest like first",
+            select(Favorite.track_id, Favorite.created_at)
+            .where(Favorite.user_id == 1)
+            .order_by(Favorite.created_at.desc(), Favorite.track_id.desc())
+            .limit(50),
+            "ix_favorite_user_id_created_at",
+        ),
+        (
+            "likes since the last chart pass",
+            select(Favorite.track_id, Favorite.created_at).where(
+                Favorite.created_at > datetime(2000, 1, 1), Favorite.created_at <= datetime(2000, 1, 2)
+            ),
+            "ix_favorite_created_at",
+        ),
+        (
+            "tracks waiting to be purged",
+            select(Track.id)
+            .where(Track.deleted_at != None, Track.purged_at == None)  # noqa: E711
+            .order_by(Track.deleted_at)
+            .limit(10),
+            "ix_track_purged_at_deleted_at",
+        ),
+        (
+            "a deleted track's plays, in batches",
+            select(Play.id).where(Play.track_id == 1).limit(1000),
+            "ix_play_track_id_played_at",
+        ),
+        (
+            "plays past the retention window",
+            select(Play.id).where(Play.played_at < datetime(2000, 1, 1)).order_by(Play.played_at).limit(1000),
+            "ix_play_played_at",
+        ),
+        (
+            "recent plays of a track",
+            select(func.count()).select_from(Play).where(Play.track_id == 1, Play.played_at >= datetime(2000, 1, 1)),
+            "ix_play_track_id_played_at",
+        ),
+    ]
+
+
+def check_query_plans(engine: Engine) -> list[tuple[str, bool, str]]:
+    """EXPLAIN QUERY PLAN each hot query on SQLite: (description, uses expected index, plan)."""
+    results = []
+    with engine.connect() as conn:
+        for description, stmt, index in hot_queries():
+            compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+            plan = "; ".join(row[-1] for row in rows)
+            ok = index in plan and "TEMP B-TREE" not in plan
+            results.append((description, ok, plan))
+    return results
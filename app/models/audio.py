@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, LargeBinary
+from sqlmodel import SQLModel, Field
+
+
+class TrackAudio(SQLModel, table=True):
+    """Server-side facts about a track's audio, filled in by the background analyzer."""
+
+    track_id: int = Field(foreign_key="track.id", primary_key=True)
+    status: str = Field(default="done", max_length=16)  # done | failed | unavailable
+    duration: Optional[float] = None
+    bitrate: Optional[int] = None  # kbps, averaged over all frames
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    tag_title: Optional[str] = None
+    tag_artist: Optional[str] = None
+    tag_album: Optional[str] = None
+    loudness_db: Optional[float] = None  # RMS level in dBFS
+    peaks: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))  # uint8 per point
+    analyzed_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,9 @@
+from sqlmodel import SQLModel, Field
+
+
+class CatalogFile(SQLModel, table=True):
+    """Last seen mtime and size of each file in the platform catalog directory."""
+
+    filename: str = Field(primary_key=True, max_length=255)
+    mtime_ns: int
+    size: int
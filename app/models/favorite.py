@@ -1,11 +1,22 @@
+from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
 class Favorite(SQLModel, table=True):
+    # the primary key leads with user_id; per-track lookups need their own index, and a
+    # user's likes newest first (profile pages) need one in like order
+    __table_args__ = (
+        Index("ix_favorite_track_id", "track_id"),
+        Index("ix_favorite_user_id_created_at", "user_id", "created_at", "track_id"),
+    )
+
     user_id: int = Field(foreign_key="user.id", primary_key=True)
     track_id: int = Field(foreign_key="track.id", primary_key=True)
+    # likes made before the column existed are backfilled to the epoch
+    created_at: Optional[datetime] = Field(default_factory=datetime.utcnow, index=True)
 
     user: Optional["User"] = Relationship(back_populates="favorites")
     track: Optional["Track"] = Relationship(back_populates="favorites")
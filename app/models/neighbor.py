@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from sqlmodel import SQLModel, Field
+
+
+class TrackNeighbor(SQLModel, table=True):
+    """Precomputed item-to-item similarity: the top neighbors of a track, best first."""
+
+    track_id: int = Field(foreign_key="track.id", primary_key=True)
+    rank: int = Field(primary_key=True)
+    neighbor_id: int = Field(foreign_key="track.id")
+    score: float
+    # newest value is where the next incremental refresh picks up
+    computed_at: datetime = Field(default_factory=datetime.utcnow, index=True)
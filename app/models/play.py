@@ -1,13 +1,19 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
 class Play(SQLModel, table=True):
+    """Raw play events, kept for ``play_retention_days``; older history lives in the daily rollups."""
+
+    # the composite index also serves track_id lookups; played_at alone drives retention pruning
+    __table_args__ = (Index("ix_play_track_id_played_at", "track_id", "played_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    track_id: int = Field(foreign_key="track.id", index=True)
-    user_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
+    track_id: int = Field(foreign_key="track.id")
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     played_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
     track: Optional["Track"] = Relationship(back_populates="plays")
@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import SQLModel, Field
+
+
+class QueueItem(SQLModel, table=True):
+    """A user's play queue, persisted so it follows them across pages and devices."""
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    position: int = Field(primary_key=True)
+    track_id: int = Field(foreign_key="track.id")
+    added_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class IdempotencyKey(SQLModel, table=True):
+    """Stored result of a batch request, replayed when the client retries with the same key."""
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    key: str = Field(primary_key=True, max_length=64)
+    response: str  # JSON
+    # sha256 of the operations, so a key reused for a different batch is refused; NULL on older rows
+    request_hash: Optional[str] = Field(default=None, max_length=64)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from sqlmodel import SQLModel, Field
+
+
+class Rendition(SQLModel, table=True):
+    """A transcoded copy of a track at one rung of the bitrate ladder."""
+
+    track_id: int = Field(foreign_key="track.id", primary_key=True)
+    quality: str = Field(primary_key=True, max_length=16)  # low | medium | high
+    filename: str  # storage key, like Track.filename
+    bitrate: int  # kbps
+    size: int  # bytes
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,58 @@
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlmodel import SQLModel, Field
+
+
+class TrackStats(SQLModel, table=True):
+    """Denormalized per-track counters, kept in sync by services.counters."""
+
+    track_id: int = Field(foreign_key="track.id", primary_key=True)
+    likes_count: int = 0
+    plays_count: int = 0
+
+
+class TrackDailyPlays(SQLModel, table=True):
+    track_id: int = Field(foreign_key="track.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    plays: int = 0
+
+
+class UserDailyPlays(SQLModel, table=True):
+    # the primary key leads with user_id; purging a deleted track needs its own index
+    __table_args__ = (Index("ix_userdailyplays_track_id", "track_id"),)
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    track_id: int = Field(foreign_key="track.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    plays: int = 0
+
+
+class RetentionState(SQLModel, table=True):
+    """Raw rows of ``name`` before ``pruned_before`` are gone; only rollups cover them."""
+
+    name: str = Field(primary_key=True, max_length=32)
+    pruned_before: datetime
+
+
+class TrackTrend(SQLModel, table=True):
+    """Time-decayed play and like scores per chart period, maintained by services.charts."""
+
+    __table_args__ = (Index("ix_tracktrend_period_rank", "period", "rank"),)
+
+    period: str = Field(primary_key=True, max_length=8)
+    track_id: int = Field(foreign_key="track.id", primary_key=True)
+    plays_score: float = 0.0
+    likes_score: float = 0.0
+    # position in the chart, NULL below the top chart_size
+    rank: Optional[int] = None
+
+
+class ChartState(SQLModel, table=True):
+    """How far the chart engine has read Play and Favorite, and when scores were last decayed."""
+
+    name: str = Field(primary_key=True, max_length=32)
+    play_id: int = 0
+    liked_at: datetime
+    computed_at: datetime
@@ -1,16 +1,32 @@
 from datetime import datetime
 from typing import Optional, List
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
 
 class Track(SQLModel, table=True):
+    # keyset pagination walks (created_at, id) newest first, optionally per filter/creator
+    __table_args__ = (
+        Index("ix_track_created_at_id", "created_at", "id"),
+        Index("ix_track_is_platform_created_at_id", "is_platform", "created_at", "id"),
+        Index("ix_track_creator_id_created_at_id", "creator_id", "created_at", "id"),
+        # the purger's queue: deleted, not yet purged, oldest first
+        Index("ix_track_purged_at_deleted_at", "purged_at", "deleted_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str = Field(index=True, max_length=120)
     artist: str = Field(default="", max_length=120)
-    filename: str  # stored file path/filename
+    filename: str = Field(index=True)  # storage key; identical uploads share one
     creator_id: int = Field(foreign_key="user.id", index=True)
     is_platform: bool = Field(default=False, index=True)
+    # platform files that disappeared from disk; cleared if they come back
+    file_missing: bool = Field(default=False)
+    # set on delete: the track is hidden at once and services.purge removes it in the background
+    deleted_at: Optional[datetime] = None
+    # set once purged; the row stays behind as a tombstone so its id is never handed out again
+    purged_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     creator: Optional["User"] = Relationship(back_populates="tracks")
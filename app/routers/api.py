@@ -0,0 +1,256 @@
+"""Versioned JSON API with compact track listings.
+
+Tracks are validated as ``TrackRead``, serialized with orjson and kept in the fragment
+cache under the current data version; each process also keeps the compressed body per
+encoding, so a repeated request costs one cache lookup and no compression. Responses
+carry the same weak ETags as the HTML pages and are brotli- or gzip-compressed when the
+client accepts it. ``?fields=id,title`` trims every track to the listed fields.
+"""
+import gzip
+from typing import Callable
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, status
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from ..config import settings
+from ..deps import get_current_user, get_db_session, get_read_db_session
+from ..models.queue import IdempotencyKey
+from ..routers.profiles import get_user_by_nickname, profile_payload
+from ..routers.tracks import aggregate_track_counts
+from ..schemas.batch import BatchRequest
+from ..schemas.track import TrackRead
+from ..services import batch as batch_service, fragments, metrics
+from ..services.etags import etag_matches, version_etag
+from ..services.fragments import cache_key, fragment_cache, hits_total, misses_total
+from ..services.likes import liked_cache
+from ..services.live import live_hub
+from ..services.lru import TTLCache
+from ..services.pagination import clamp_limit
+from ..services.search import search_tracks
+from ..services.sessions import SessionUser
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+router = APIRouter()
+
+TRACK_FIELDS = tuple(TrackRead.model_fields)
+track_list = TypeAdapter(list[TrackRead])
+# smaller bodies aren't worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+# compressed bodies per (cache key, encoding); the key carries the data version, as the ETag does
+encoded_cache: TTLCache[tuple[str, str], tuple[bytes, dict]] = TTLCache(
+    max_size=settings.fragment_cache_size if settings.fragment_cache != "off" else 0,
+    ttl=settings.fragment_cache_ttl,
+    size_gauge=metrics.gauge("api_encoded_cache_size", "Compressed API bodies held in the process-level cache"),
+)
+
+
+def select_fields(fields: str | None) -> tuple[str, ...]:
+    if not fields:
+        return TRACK_FIELDS
+    wanted = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in wanted if name not in TRACK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return wanted
+
+
+def compact(tracks: list[dict], fields: tuple[str, ...]) -> list[dict]:
+    """Validate the tracks as ``TrackRead`` and keep ``fields``, in that order."""
+    validated = track_list.dump_python(track_list.validate_python(tracks))
+    return [{name: track[name] for name in fields} for track in validated]
+
+
+def accepted_encodings(request: Request) -> set[str]:
+    encodings = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def preferred_encoding(request: Request) -> str:
+    accepted = accepted_encodings(request)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    return "gzip" if "gzip" in accepted else "identity"
+
+
+def encode(body: bytes, encoding: str) -> tuple[bytes, dict]:
+    """Compress the body with ``encoding``; returns it with the matching headers."""
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) < MIN_COMPRESS_SIZE or encoding == "identity":
+        return body, headers
+    if encoding == "br":
+        return brotli.compress(body, quality=4), {**headers, "Content-Encoding": "br"}
+    return gzip.compress(body, compresslevel=6), {**headers, "Content-Encoding": "gzip"}
+
+
+def cached_json(request: Request, current_user: SessionUser | None, build: Callable[[], dict]) -> Response:
+    """Serve ``build()`` as JSON, from cache and with ETag revalidation where possible."""
+    version = fragment_cache.version()
+    etag = version_etag(request, current_user, version, "api")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={**headers, "Vary": "Accept-Encoding"})
+    key = cache_key("api", version, request.url.path, request.url.query, current_user.id if current_user else None)
+    encoding = preferred_encoding(request)
+    encoded = encoded_cache.get((key, encoding))
+    if encoded is None:
+        body = fragment_cache.get(key)
+        if body is None:
+            misses_total.inc()
+            body = orjson.dumps(build()).decode()
+            fragment_cache.set(key, body)
+        else:
+            hits_total.inc()
+        encoded = encode(body.encode(), encoding)
+        encoded_cache.put((key, encoding), encoded)
+    else:
+        hits_total.inc()
+    content, encoding_headers = encoded
+    return Response(content, media_type="application/json", headers={**headers, **encoding_headers})
+
+
+def compact_profile(payload: dict, fields: tuple[str, ...]) -> dict:
+    return {
+        **payload,
+        "uploaded": compact(payload["uploaded"], fields),
+        "favorites": compact(payload["favorites"], fields),
+    }
+
+
+@router.get("/tracks")
+def list_tracks(
+    request: Request,
+    q: str | None = None,
+    filter: str = "all",
+    cursor: str | None = None,
+    limit: int | None = None,
+    fields: str | None = None,
+    db: Session = Depends(get_read_db_session),
+):
+    """The index listing: newest first, optionally searched and filtered like ``/``."""
+    selected = select_fields(fields)
+    filter = filter if filter in {"all", "user", "platform"} else "all"
+
+    def build() -> dict:
+        tracks, next_cursor = search_tracks(db, q, filter_by=filter, cursor=cursor, limit=clamp_limit(limit))
+        return {"tracks": compact(aggregate_track_counts(db, tracks), selected), "next_cursor": next_cursor}
+
+    return cached_json(request, None, build)
+
+
+@router.get("/profiles/me")
+def my_profile(
+    request: Request,
+    uploaded_cursor: str | None = None,
+    favorites_cursor: str | None = None,
+    limit: int | None = None,
+    fields: str | None = None,
+    db: Session = Depends(get_read_db_session),
+    user: SessionUser = Depends(get_current_user),
+):
+    selected = select_fields(fields)
+    return cached_json(
+        request,
+        user,
+        lambda: compact_profile(profile_payload(db, user, uploaded_cursor, favorites_cursor, limit), selected),
+    )
+
+
+@router.get("/profiles/{nickname}")
+def profile(
+    request: Request,
+    nickname: str,
+    uploaded_cursor: str | None = None,
+    favorites_cursor: str | None = None,
+    limit: int | None = None,
+    fields: str | None = None,
+    db: Session = Depends(get_read_db_session),
+):
+    selected = select_fields(fields)
+
+    def build() -> dict:
+        user = get_user_by_nickname(db, nickname)
+        return compact_profile(profile_payload(db, user, uploaded_cursor, favorites_cursor, limit), selected)
+
+    return cached_json(request, None, build)
+
+
+@router.get("/queue")
+def queue(
+    fields: str | None = None,
+    db: Session = Depends(get_read_db_session),
+    user: SessionUser = Depends(get_current_user),
+):
+    selected = select_fields(fields)
+    tracks = aggregate_track_counts(db, batch_service.user_queue(db, user.id))
+    return Response(orjson.dumps({"tracks": compact(tracks, selected)}), media_type="application/json")
+
+
+def replay(stored: IdempotencyKey, fingerprint: str) -> Response:
+    if stored.request_hash is not None and stored.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different batch",
+        )
+    batch_service.replayed_total.inc()
+    return Response(stored.response, media_type="application/json", headers={"Idempotent-Replayed": "true"})
+
+
+@router.post("/batch")
+def batch(
+    request: Request,
+    body: BatchRequest,
+    db: Session = Depends(get_db_session),
+    user: SessionUser = Depends(get_current_user),
+):
+    """Apply up to 100 like/unlike/play/queue operations in one transaction.
+
+    With an ``Idempotency-Key`` header, a retry of the same request returns the stored
+    result instead of applying the operations again; reusing the key for different
+    operations is a 422.
+    """
+    key = request.headers.get("idempotency-key")
+    if key is not None and not 0 < len(key) <= 64:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Idempotency-Key must be 1-64 characters")
+    fingerprint = batch_service.request_hash(body.ops)
+    if key and (stored := db.get(IdempotencyKey, (user.id, key))):
+        return replay(stored, fingerprint)
+    results, changed = batch_service.apply_batch(db, user.id, body.ops)
+    payload = orjson.dumps({"results": results}).decode()
+    if key:
+        db.add(IdempotencyKey(user_id=user.id, key=key, response=payload, request_hash=fingerprint))
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent request with the same key, or the same like made from another tab
+        db.rollback()
+        stored = db.get(IdempotencyKey, (user.id, key)) if key else None
+        if stored is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Concurrent update, retry the batch")
+        return replay(stored, fingerprint)
+    if "like" in changed:
+        liked_cache.invalidate(user.id)
+        fragments.bump("like")
+    if "plays" in changed:
+        fragments.bump("plays", settings.fragment_play_staleness)
+    if deltas := batch_service.counter_deltas(results):
+        live_hub.publish(deltas)
+    return Response(payload, media_type="application/json")
+
+
+@router.websocket("/live")
+async def live(websocket: WebSocket):
+    """Like and play count deltas for the subscribed tracks; see ``services.live``."""
+    await live_hub.serve(websocket)
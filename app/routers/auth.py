@@ -1,60 +1,68 @@
-from fastapi import APIRouter, Depends, Response, Request, Form
+from fastapi import APIRouter, Depends, Request, Form
 from fastapi.responses import RedirectResponse
 from sqlmodel import Session, select
 
 from ..deps import get_db_session, get_current_user
+from ..services.sessions import SessionUser
 from ..schemas.auth import SignUp, Login
-from ..services import auth as auth_service
+from ..services import auth as auth_service, fragments
 from ..models.user import User
 
 router = APIRouter()
 
 
 @router.post("/signup")
-def signup(
-    response: Response,
+async def signup(
     nickname: str = Form(...),
     password: str = Form(...),
     db: Session = Depends(get_db_session),
 ):
-    user = auth_service.signup(SignUp(nickname=nickname, password=password), db)
-    auth_service.set_session_cookie(response, user.id)
-    return RedirectResponse(url="/", status_code=303)
+    user = await auth_service.signup(SignUp(nickname=nickname, password=password), db)
+    redirect = RedirectResponse(url="/", status_code=303)
+    auth_service.set_session_cookie(redirect, user)
+    return redirect
 
 
 @router.post("/login")
-def login(
-    response: Response,
+async def login(
+    request: Request,
     nickname: str = Form(...),
     password: str = Form(...),
     db: Session = Depends(get_db_session),
 ):
-    user = auth_service.login(Login(nickname=nickname, password=password), db)
-    auth_service.set_session_cookie(response, user.id)
-    return RedirectResponse(url="/", status_code=303)
+    client_ip = request.client.host if request.client else "unknown"
+    user = await auth_service.login(Login(nickname=nickname, password=password), db, client_ip)
+    redirect = RedirectResponse(url="/", status_code=303)
+    auth_service.set_session_cookie(redirect, user)
+    return redirect
 
 
 @router.post("/logout")
-def logout(response: Response):
-    auth_service.clear_session_cookie(response)
-    return RedirectResponse(url="/", status_code=303)
+def logout():
+    redirect = RedirectResponse(url="/", status_code=303)
+    auth_service.clear_session_cookie(redirect)
+    return redirect
 
 
 @router.post("/nickname")
 def change_nickname(
-    response: Response,
     nickname: str = Form(...),
     db: Session = Depends(get_db_session),
-    user: User = Depends(get_current_user),
+    current_user: SessionUser = Depends(get_current_user),
 ):
     # ensure unique
     exists = db.exec(select(User).where(User.nickname == nickname)).first()
-    if exists and exists.id != user.id:
+    if exists and exists.id != current_user.id:
         return RedirectResponse(url="/profiles/me?err=busy", status_code=303)
+    user = db.get(User, current_user.id)
     user.nickname = nickname
     db.add(user)
     db.commit()
     db.refresh(user)
-    # refresh session cookie to keep logged in with new nickname
-    auth_service.set_session_cookie(response, user.id)
-    return RedirectResponse(url=f"/profiles/{user.nickname}", status_code=303)
+    auth_service.remember_user(user)
+    # listings show creator nicknames
+    fragments.bump("nickname")
+    # refresh session cookie so the signed nickname matches
+    redirect = RedirectResponse(url=f"/profiles/{user.nickname}", status_code=303)
+    auth_service.set_session_cookie(redirect, user)
+    return redirect
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session, select
+
+from ..deps import get_read_db_session
+from ..models.track import Track
+from ..routers.tracks import aggregate_track_counts
+from ..services.charts import PERIODS, chart_engine
+from ..services.pagination import clamp_limit
+
+router = APIRouter()
+
+
+def chart_tracks(db: Session, period: str, limit: int | None) -> list[dict]:
+    """Top of the in-memory chart joined with track details, in rank order."""
+    entries = chart_engine.top(period, limit)
+    tracks = {
+        t.id: t
+        for t in db.exec(
+            select(Track)
+            .where(Track.id.in_([e.track_id for e in entries]))
+            .where(Track.deleted_at == None, Track.file_missing == False)  # noqa: E711, E712
+        ).all()
+    } if entries else {}
+    ranked = [(e, tracks[e.track_id]) for e in entries if e.track_id in tracks]
+    enriched = aggregate_track_counts(db, [track for _, track in ranked])
+    for (entry, _), track in zip(ranked, enriched):
+        track["rank"] = entry.rank
+        track["score"] = round(chart_engine.current_score(period, entry), 4)
+    return enriched
+
+
+@router.get("/{period}")
+def chart(period: str, limit: int | None = None, db: Session = Depends(get_read_db_session)):
+    if period not in PERIODS:
+        raise HTTPException(status_code=404, detail="Unknown chart period")
+    return {
+        "period": period,
+        "computed_at": chart_engine.snapshot.computed_at,
+        "tracks": chart_tracks(db, period, clamp_limit(limit)),
+    }
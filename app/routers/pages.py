@@ -1,122 +1,217 @@
+import json
+import re
+from pathlib import Path
+
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from markupsafe import Markup
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..deps import get_db_session, get_optional_user
+from ..db import get_async_read_session
+from ..deps import get_optional_user
 from ..services.search import search_tracks, search_profiles
-from ..models.favorite import Favorite
-from ..models.track import Track
+from ..services.likes import LikedSet, liked_set
+from ..services.profiles import profile_tracks
+from ..services.charts import PERIODS, chart_engine
+from ..services.etags import etag_matches, version_etag
+from ..services.fragments import cache_key, fragment_cache, hits_total, misses_total
+from ..routers.charts import chart_tracks
 from ..routers.tracks import aggregate_track_counts
+from ..services.transcoding import CLIENT_HINTS
 
 templates = Jinja2Templates(directory="app/templates")
 router = APIRouter()
 
+# cached track lists carry one placeholder per track where the per-user actions go
+ACTIONS_RE = re.compile(r"<!--actions:(\d+):(\d+)-->")
+# changes whenever a template is edited, so a deploy never revalidates old pages
+TEMPLATE_STAMP = str(max(int(p.stat().st_mtime) for p in Path("app/templates").glob("*.html")))
+
+
+def render_track_list(tracks: list[dict]) -> str:
+    hit_ids, top_play_ids, top_like_ids = chart_engine.badges()
+    return templates.get_template("track_list.html").render(
+        tracks=tracks, hit_ids=hit_ids, top_play_ids=top_play_ids, top_like_ids=top_like_ids
+    )
+
+
+def overlay(html: str, current_user, liked_ids: LikedSet) -> Markup:
+    """Fill the per-user action placeholders of a cached track list."""
+    if not current_user:
+        return Markup(ACTIONS_RE.sub("", html))
+    track_actions = templates.get_template("track_actions.html").module.track_actions
+    return Markup(
+        ACTIONS_RE.sub(
+            lambda m: str(track_actions(int(m[1]), int(m[2]), current_user, liked_ids)),
+            html,
+        )
+    )
+
+
+def liked_track_ids(db: Session, current_user) -> LikedSet:
+    """Tracks the current user has liked, from the per-user liked-set cache."""
+    return liked_set(db, current_user.id if current_user else None)
+
+
+def cached_fragment(db: Session, key_parts: tuple, build) -> dict:
+    key = cache_key(*key_parts)
+    cached = fragment_cache.get(key)
+    if cached is not None:
+        hits_total.inc()
+        return json.loads(cached)
+    misses_total.inc()
+    data = build(db)
+    fragment_cache.set(key, json.dumps(data))
+    return data
+
 
-def compute_tops(tracks: list[dict]):
-    if not tracks:
-        return set(), set(), set()
-    max_play = max(t["plays_count"] for t in tracks)
-    max_like = max(t["likes_count"] for t in tracks)
-    hit_ids = set()
-    top_play_ids = set()
-    top_like_ids = set()
-    for t in tracks:
-        pid = t["id"]
-        is_play = max_play > 0 and t["plays_count"] == max_play
-        is_like = max_like > 0 and t["likes_count"] == max_like
-        if is_play and is_like:
-            hit_ids.add(pid)
-        elif is_play:
-            top_play_ids.add(pid)
-        elif is_like:
-            top_like_ids.add(pid)
-    return hit_ids, top_play_ids, top_like_ids
+def not_modified(request: Request, etag: str) -> Response | None:
+    return Response(status_code=304, headers=page_headers(etag)) if etag_matches(request, etag) else None
+
+
+def page_headers(etag: str) -> dict:
+    return {
+        "ETag": etag,
+        # always revalidate; the ETag makes that a cheap 304
+        "Cache-Control": "private, no-cache",
+        # ask the browser to send network hints with the audio requests this page makes
+        "Accept-CH": CLIENT_HINTS,
+    }
+
+
+def index_fragment(db: Session, q: str | None, filter: str, cursor: str | None) -> dict:
+    tracks, next_cursor = search_tracks(db, q, filter_by=filter, cursor=cursor)
+    return {"tracks_html": render_track_list(aggregate_track_counts(db, tracks)), "next_cursor": next_cursor}
+
+
+def index_context(db: Session, q: str | None, filter: str, cursor: str | None, current_user, version: int) -> dict:
+    fragment = cached_fragment(
+        db, ("index", version, q or "", filter, cursor), lambda db: index_fragment(db, q, filter, cursor)
+    )
+    liked_ids = liked_track_ids(db, current_user)
+    return {
+        "tracks_html": overlay(fragment["tracks_html"], current_user, liked_ids),
+        "next_cursor": fragment["next_cursor"],
+        "query": q or "",
+        "filter": filter,
+        "current_user": current_user,
+    }
 
 
 @router.get("/", response_class=HTMLResponse)
-def index(
+async def index(
     request: Request,
     q: str | None = None,
     filter: str = "all",
-    db: Session = Depends(get_db_session),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_read_session),
     current_user=Depends(get_optional_user),
 ):
     filter = filter if filter in {"all", "user", "platform"} else "all"
-    tracks = search_tracks(db, q, filter_by=filter)
-    enriched_tracks = aggregate_track_counts(db, tracks)
-    hit_ids, top_play_ids, top_like_ids = compute_tops(enriched_tracks)
-    # mark liked ids for current user
-    liked_ids = set()
-    if current_user:
-        liked_ids = {
-            fav.track_id
-            for fav in db.exec(select(Favorite).where(Favorite.user_id == current_user.id)).all()
-        }
+    version = fragment_cache.version()
+    etag = version_etag(request, current_user, version, TEMPLATE_STAMP)
+    if response := not_modified(request, etag):
+        return response
+    # the queries are plain sync ORM code; run_sync drives them over the async connection
+    context = await db.run_sync(index_context, q, filter, cursor, current_user, version)
     return templates.TemplateResponse(
         "index.html",
-        {
-            "request": request,
-            "tracks": enriched_tracks,
-            "query": q or "",
-            "filter": filter,
-            "current_user": current_user,
-            "liked_ids": liked_ids,
-            "hit_ids": hit_ids,
-            "top_play_ids": top_play_ids,
-            "top_like_ids": top_like_ids,
-        },
+        {"request": request, **context},
+        headers=page_headers(etag),
+    )
+
+
+@router.get("/profiles/me", response_class=HTMLResponse)
+def my_profile_page(request: Request, current_user=Depends(get_optional_user)):
+    if not current_user:
+        return RedirectResponse(url="/", status_code=303)
+    return RedirectResponse(url=f"/profiles/{current_user.nickname}", status_code=302)
+
+
+def profile_fragment(db: Session, nickname: str, uploaded_cursor: str | None, favorites_cursor: str | None) -> dict:
+    from ..routers.profiles import get_user_by_nickname
+
+    user = get_user_by_nickname(db, nickname)
+    uploaded, uploaded_next, favorites, favorites_next = profile_tracks(db, user.id, uploaded_cursor, favorites_cursor)
+    return {
+        "profile_user": {"id": user.id, "nickname": user.nickname},
+        "uploaded_html": render_track_list(uploaded),
+        "favorites_html": render_track_list(favorites),
+        "uploaded_next": uploaded_next,
+        "favorites_next": favorites_next,
+    }
+
+
+def profile_context(
+    db: Session,
+    nickname: str,
+    profile: str | None,
+    uploaded_cursor: str | None,
+    favorites_cursor: str | None,
+    current_user,
+    version: int,
+) -> dict:
+    fragment = cached_fragment(
+        db,
+        ("profile", version, nickname, uploaded_cursor, favorites_cursor),
+        lambda db: profile_fragment(db, nickname, uploaded_cursor, favorites_cursor),
     )
+    liked_ids = liked_track_ids(db, current_user)
+    return {
+        **fragment,
+        "uploaded_html": overlay(fragment["uploaded_html"], current_user, liked_ids),
+        "favorites_html": overlay(fragment["favorites_html"], current_user, liked_ids),
+        "current_user": current_user,
+        "profile_query": profile or "",
+        "profiles": search_profiles(db, profile) if profile else [],
+    }
 
 
 @router.get("/profiles/{nickname}", response_class=HTMLResponse)
-def profile_page(
+async def profile_page(
     request: Request,
     nickname: str,
     profile: str | None = None,
-    db: Session = Depends(get_db_session),
+    uploaded_cursor: str | None = None,
+    favorites_cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_read_session),
     current_user=Depends(get_optional_user),
 ):
-    from ..routers.profiles import get_user_by_nickname
-
-    user = get_user_by_nickname(db, nickname)
-    uploaded = db.exec(select(Track).where(Track.creator_id == user.id)).all()
-    favorite_ids = [fav.track_id for fav in db.exec(select(Favorite).where(Favorite.user_id == user.id)).all()]
-    favorites = db.exec(select(Track).where(Track.id.in_(favorite_ids))).all() if favorite_ids else []
-    liked_ids = set()
-    if current_user:
-        liked_ids = {
-            fav.track_id
-            for fav in db.exec(select(Favorite).where(Favorite.user_id == current_user.id)).all()
-        }
-    profile_results = search_profiles(db, profile) if profile else []
-    uploaded_enriched = aggregate_track_counts(db, uploaded)
-    favorites_enriched = aggregate_track_counts(db, favorites)
-    up_hit, up_play, up_like = compute_tops(uploaded_enriched)
-    fav_hit, fav_play, fav_like = compute_tops(favorites_enriched)
+    version = fragment_cache.version()
+    etag = version_etag(request, current_user, version, TEMPLATE_STAMP)
+    # profile search results aren't covered by the data version, so they always revalidate in full
+    if not profile and (response := not_modified(request, etag)):
+        return response
+    context = await db.run_sync(
+        profile_context, nickname, profile, uploaded_cursor, favorites_cursor, current_user, version
+    )
     return templates.TemplateResponse(
         "profile.html",
-        {
-            "request": request,
-            "profile_user": user,
-            "uploaded": uploaded_enriched,
-            "favorites": favorites_enriched,
-            "current_user": current_user,
-            "liked_ids": liked_ids,
-            "profile_query": profile or "",
-            "profiles": profile_results,
-            "uploaded_hit": up_hit,
-            "uploaded_play": up_play,
-            "uploaded_like": up_like,
-            "favorites_hit": fav_hit,
-            "favorites_play": fav_play,
-            "favorites_like": fav_like,
-        },
+        {"request": request, **context},
+        headers=page_headers(etag),
     )
 
 
-@router.get("/profiles/me", response_class=HTMLResponse)
-def my_profile_page(request: Request, current_user=Depends(get_optional_user)):
-    if not current_user:
-        return RedirectResponse(url="/", status_code=303)
-    return RedirectResponse(url=f"/profiles/{current_user.nickname}", status_code=302)
+def charts_context(db: Session, period: str, current_user) -> dict:
+    tracks = chart_tracks(db, period, None)
+    html = render_track_list(tracks)
+    return {
+        "tracks_html": overlay(html, current_user, liked_track_ids(db, current_user)),
+        "period": period,
+        "periods": list(PERIODS),
+        "current_user": current_user,
+    }
+
+
+@router.get("/charts", response_class=HTMLResponse)
+async def charts_page(
+    request: Request,
+    period: str = "day",
+    db: AsyncSession = Depends(get_async_read_session),
+    current_user=Depends(get_optional_user),
+):
+    period = period if period in PERIODS else "day"
+    context = await db.run_sync(charts_context, period, current_user)
+    return templates.TemplateResponse("charts.html", {"request": request, **context})
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 
-from ..deps import get_db_session, get_current_user
+from ..deps import get_read_db_session, get_current_user
 from ..models.user import User
-from ..models.track import Track
-from ..models.favorite import Favorite
-from ..routers.tracks import aggregate_track_counts
+from ..services.pagination import clamp_limit
+from ..services.sessions import SessionUser
+from ..services.profiles import profile_tracks
 
 router = APIRouter()
 
@@ -17,26 +17,39 @@ def get_user_by_nickname(db: Session, nickname: str) -> User:
     return user
 
 
-@router.get("/me")
-def my_profile(db: Session = Depends(get_db_session), user: User = Depends(get_current_user)):
-    uploaded = db.exec(select(Track).where(Track.creator_id == user.id)).all()
-    favorite_ids = [fav.track_id for fav in db.exec(select(Favorite).where(Favorite.user_id == user.id)).all()]
-    favorites = db.exec(select(Track).where(Track.id.in_(favorite_ids))).all() if favorite_ids else []
+def profile_payload(
+    db: Session, user: User | SessionUser, uploaded_cursor: str | None, favorites_cursor: str | None, limit: int | None
+) -> dict:
+    uploaded, uploaded_next, favorites, favorites_next = profile_tracks(
+        db, user.id, uploaded_cursor, favorites_cursor, clamp_limit(limit)
+    )
     return {
         "user": {"id": user.id, "nickname": user.nickname},
-        "uploaded": aggregate_track_counts(db, uploaded),
-        "favorites": aggregate_track_counts(db, favorites),
+        "uploaded": uploaded,
+        "favorites": favorites,
+        "uploaded_next_cursor": uploaded_next,
+        "favorites_next_cursor": favorites_next,
     }
 
 
+@router.get("/me")
+def my_profile(
+    uploaded_cursor: str | None = None,
+    favorites_cursor: str | None = None,
+    limit: int | None = None,
+    db: Session = Depends(get_read_db_session),
+    user: SessionUser = Depends(get_current_user),
+):
+    return profile_payload(db, user, uploaded_cursor, favorites_cursor, limit)
+
+
 @router.get("/{nickname}")
-def profile(nickname: str, db: Session = Depends(get_db_session)):
+def profile(
+    nickname: str,
+    uploaded_cursor: str | None = None,
+    favorites_cursor: str | None = None,
+    limit: int | None = None,
+    db: Session = Depends(get_read_db_session),
+):
     user = get_user_by_nickname(db, nickname)
-    uploaded = db.exec(select(Track).where(Track.creator_id == user.id)).all()
-    favorite_ids = [fav.track_id for fav in db.exec(select(Favorite).where(Favorite.user_id == user.id)).all()]
-    favorites = db.exec(select(Track).where(Track.id.in_(favorite_ids))).all() if favorite_ids else []
-    return {
-        "user": {"id": user.id, "nickname": user.nickname},
-        "uploaded": aggregate_track_counts(db, uploaded),
-        "favorites": aggregate_track_counts(db, favorites),
-    }
+    return profile_payload(db, user, uploaded_cursor, favorites_cursor, limit)
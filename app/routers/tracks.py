@@ -1,13 +1,28 @@
-from fastapi import APIRouter, Depends, UploadFile, Form, File, HTTPException, status
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, UploadFile, Form, File, HTTPException, Request, status
 from fastapi.responses import RedirectResponse, JSONResponse
-from sqlmodel import Session, select, func, delete
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session, select
 
-from ..deps import get_db_session, get_current_user, get_optional_user
+from ..deps import get_db_session, get_read_db_session, get_current_user, get_optional_user
 from ..models.track import Track
 from ..models.favorite import Favorite
-from ..models.play import Play
 from ..models.user import User
-from ..services.storage import save_mp3, file_url
+from ..services.sessions import SessionUser
+from ..services.storage import file_path, file_url, receive_mp3, storage
+from ..services.streaming import stream_file
+from ..services.likes import liked_cache
+from ..services.live import live_hub
+from ..services.purge import track_purger
+from ..services.plays import play_buffer
+from ..services import counters, fragments, recommendations
+from ..services.charts import chart_engine, retract_likes
+from ..services.pagination import clamp_limit
+from ..services.analysis import audio_analyzer, audio_payload
+from ..services.transcoding import CLIENT_HINTS, pick_rendition, preferred_quality, served_total, transcoder
+from ..models.audio import TrackAudio
+from ..models.rendition import Rendition
 from ..schemas.track import TrackUpdate
 
 router = APIRouter()
@@ -15,32 +30,98 @@ router = APIRouter()
 
 def get_track_with_owner(db: Session, track_id: int) -> Track:
     track = db.get(Track, track_id)
-    if not track:
+    if not track or track.deleted_at is not None or track.file_missing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Track not found")
     return track
 
 
 @router.post("/upload")
-def upload_track(
+async def upload_track(
     title: str = Form(...),
     artist: str = Form(""),
     file: UploadFile = File(...),
     db: Session = Depends(get_db_session),
-    user: User = Depends(get_current_user),
+    user: SessionUser = Depends(get_current_user),
 ):
-    filename = save_mp3(file)
+    tmp_path, filename = await receive_mp3(file)
     track = Track(title=title, artist=artist, filename=filename, creator_id=user.id, is_platform=False)
+    try:
+        # the row goes in first, so the purger can't delete a shared blob this upload reuses
+        await run_in_threadpool(_save_track, db, track)
+        await run_in_threadpool(storage.put, tmp_path, filename)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        if track.id is not None:
+            await run_in_threadpool(_abandon_track, db, track)
+        raise
+    fragments.bump("upload")
+    # a blob that isn't stored locally is recorded as unavailable with a DB write
+    await run_in_threadpool(audio_analyzer.submit, track.id, track.filename)
+    transcoder.submit(track.id, track.filename)
+    return RedirectResponse(url="/", status_code=303)
+
+
+def _save_track(db: Session, track: Track) -> None:
     db.add(track)
     db.commit()
     db.refresh(track)
-    return RedirectResponse(url="/", status_code=303)
+    # hand the write connection back before the background jobs below need it
+    db.close()
+
+
+def _abandon_track(db: Session, track: Track) -> None:
+    """Tombstone an upload whose blob could not be stored, for the purger to remove."""
+    track.deleted_at = datetime.utcnow()
+    db.add(track)
+    db.commit()
+    db.close()
+
+
+@router.get("/audio")
+def tracks_audio(ids: str, db: Session = Depends(get_read_db_session)):
+    """Batch lookup of precomputed audio facts, e.g. ``/tracks/audio?ids=1,2,3``."""
+    try:
+        track_ids = sorted({int(part) for part in ids.split(",") if part.strip()})[:100]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be integers")
+    rows = {
+        row.track_id: row
+        for row in db.exec(select(TrackAudio).where(TrackAudio.track_id.in_(track_ids))).all()
+    } if track_ids else {}
+    return {"tracks": [audio_payload(tid, rows.get(tid)) for tid in track_ids]}
+
+
+@router.get("/for-you")
+def for_you(
+    limit: int | None = None,
+    db: Session = Depends(get_read_db_session),
+    user: SessionUser = Depends(get_current_user),
+):
+    """Tracks similar to what the user likes and plays; this week's chart until they have history."""
+    limit = clamp_limit(limit)
+    ranked = recommendations.for_you(db, user.id, limit)
+    if not ranked:
+        ranked = [(e.track_id, chart_engine.current_score("week", e)) for e in chart_engine.top("week", limit)]
+    return {"tracks": scored_tracks(db, ranked)}
+
+
+@router.get("/{track_id}/similar")
+def similar_tracks(track_id: int, limit: int | None = None, db: Session = Depends(get_read_db_session)):
+    track = get_track_with_owner(db, track_id)
+    return {"tracks": scored_tracks(db, recommendations.similar_tracks(db, track.id, clamp_limit(limit)))}
+
+
+@router.get("/{track_id}/audio")
+def track_audio(track_id: int, db: Session = Depends(get_read_db_session)):
+    track = get_track_with_owner(db, track_id)
+    return audio_payload(track.id, db.get(TrackAudio, track.id))
 
 
 @router.post("/{track_id}/like")
 def like_track(
     track_id: int,
     db: Session = Depends(get_db_session),
-    user: User = Depends(get_current_user),
+    user: SessionUser = Depends(get_current_user),
 ):
     track = get_track_with_owner(db, track_id)
     existing = db.get(Favorite, (user.id, track.id))
@@ -48,7 +129,11 @@ def like_track(
         return RedirectResponse(url="/", status_code=303)
     fav = Favorite(user_id=user.id, track_id=track.id)
     db.add(fav)
+    counters.add_likes(db, track.id, 1)
     db.commit()
+    liked_cache.invalidate(user.id)
+    fragments.bump("like")
+    live_hub.publish({track.id: (1, 0)})
     return RedirectResponse(url="/", status_code=303)
 
 
@@ -56,43 +141,71 @@ def like_track(
 def unlike_track(
     track_id: int,
     db: Session = Depends(get_db_session),
-    user: User = Depends(get_current_user),
+    user: SessionUser = Depends(get_current_user),
 ):
     _ = get_track_with_owner(db, track_id)
     existing = db.get(Favorite, (user.id, track_id))
     if existing:
         db.delete(existing)
+        counters.add_likes(db, track_id, -1)
+        retract_likes(db, [(track_id, existing.created_at)])
         db.commit()
+        liked_cache.invalidate(user.id)
+        fragments.bump("like")
+        live_hub.publish({track_id: (-1, 0)})
     return RedirectResponse(url="/", status_code=303)
 
 
 @router.post("/{track_id}/play")
 def play_track(
     track_id: int,
-    db: Session = Depends(get_db_session),
-    user: User | None = Depends(get_optional_user),
+    db: Session = Depends(get_read_db_session),
+    user: SessionUser | None = Depends(get_optional_user),
 ):
     track = get_track_with_owner(db, track_id)
-    play = Play(track_id=track.id, user_id=user.id if user else None)
-    db.add(play)
-    db.commit()
+    play_buffer.submit(track.id, user.id if user else None)
     return JSONResponse({"status": "ok"})
 
 
+@router.api_route("/{track_id}/stream", methods=["GET", "HEAD"])
+def stream_track(
+    track_id: int,
+    request: Request,
+    quality: str | None = None,
+    db: Session = Depends(get_read_db_session),
+):
+    """Serve the rendition matching ``?quality=`` or the client's network hints."""
+    track = get_track_with_owner(db, track_id)
+    wanted = preferred_quality(request, quality)
+    renditions = db.exec(select(Rendition).where(Rendition.track_id == track.id)).all()
+    rendition = pick_rendition(renditions, wanted)
+    filename = rendition.filename if rendition else track.filename
+    served_total[rendition.quality if rendition else "original"].inc()
+    path = file_path(filename)
+    if path is None:
+        response = RedirectResponse(url=file_url(filename), status_code=307)
+    else:
+        response = stream_file(request, path)
+    if quality is None:
+        response.headers["Vary"] = CLIENT_HINTS
+    return response
+
+
 @router.post("/{track_id}/delete")
 def delete_track(
     track_id: int,
     db: Session = Depends(get_db_session),
-    user: User = Depends(get_current_user),
+    user: SessionUser = Depends(get_current_user),
 ):
     track = get_track_with_owner(db, track_id)
     if track.creator_id != user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
-    # cascade delete favorites and plays
-    db.exec(delete(Favorite).where(Favorite.track_id == track.id))
-    db.exec(delete(Play).where(Play.track_id == track.id))
-    db.delete(track)
+    # a tombstone hides the track at once; plays, likes and the file are purged in the background
+    track.deleted_at = datetime.utcnow()
+    db.add(track)
     db.commit()
+    fragments.bump("delete")
+    track_purger.wake()
     return RedirectResponse(url="/", status_code=303)
 
 
@@ -102,7 +215,7 @@ def update_track(
     title: str = Form(...),
     artist: str = Form(""),
     db: Session = Depends(get_db_session),
-    user: User = Depends(get_current_user),
+    user: SessionUser = Depends(get_current_user),
 ):
     track = get_track_with_owner(db, track_id)
     if track.creator_id != user.id:
@@ -111,6 +224,7 @@ def update_track(
     track.artist = artist
     db.add(track)
     db.commit()
+    fragments.bump("update")
     return RedirectResponse(url="/profiles/me", status_code=303)
 
 
@@ -125,16 +239,7 @@ def aggregate_track_counts(db: Session, tracks: list[Track]) -> list[dict]:
         else []
     )
     creator_map = {cid: nick for cid, nick in creators}
-    likes_counts = dict(
-        db.exec(
-            select(Favorite.track_id, func.count(Favorite.user_id)).where(Favorite.track_id.in_(track_ids)).group_by(Favorite.track_id)
-        ).all()
-    )
-    play_counts = dict(
-        db.exec(
-            select(Play.track_id, func.count(Play.id)).where(Play.track_id.in_(track_ids)).group_by(Play.track_id)
-        ).all()
-    )
+    track_counters = counters.load_counters(db, track_ids)
     enriched = []
     for t in tracks:
         enriched.append(
@@ -146,9 +251,27 @@ def aggregate_track_counts(db: Session, tracks: list[Track]) -> list[dict]:
                 "creator_nickname": creator_map.get(t.creator_id, ""),
                 "filename": t.filename,
                 "is_platform": t.is_platform,
-                "likes_count": likes_counts.get(t.id, 0),
-                "plays_count": play_counts.get(t.id, 0),
+                **track_counters[t.id],
                 "created_at": t.created_at,
             }
         )
     return enriched
+
+
+def scored_tracks(db: Session, ranked: list[tuple[int, float]]) -> list[dict]:
+    """Track dicts for (track id, score) pairs, keeping their order and skipping deleted or missing tracks."""
+    if not ranked:
+        return []
+    tracks = {
+        t.id: t
+        for t in db.exec(
+            select(Track)
+            .where(Track.id.in_([tid for tid, _ in ranked]))
+            .where(Track.deleted_at == None, Track.file_missing == False)  # noqa: E711, E712
+        ).all()
+    }
+    scores = {tid: score for tid, score in ranked}
+    enriched = aggregate_track_counts(db, [tracks[tid] for tid, _ in ranked if tid in tracks])
+    for track in enriched:
+        track["score"] = round(scores[track["id"]], 4)
+    return enriched
@@ -0,0 +1,12 @@
+from typing import List, Literal
+
+from pydantic import BaseModel, Field
+
+
+class BatchOp(BaseModel):
+    op: Literal["like", "unlike", "play", "queue_add", "queue_remove", "queue_clear"]
+    track_id: int | None = None
+
+
+class BatchRequest(BaseModel):
+    ops: List[BatchOp] = Field(min_length=1, max_length=100)
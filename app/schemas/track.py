@@ -1,6 +1,6 @@
 from typing import Optional
 from datetime import datetime
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, ConfigDict, constr
 
 
 class TrackBase(BaseModel):
@@ -24,7 +24,7 @@ class TrackRead(TrackBase):
     is_platform: bool = False
     likes_count: int = 0
     plays_count: int = 0
+    plays_7d: int = 0
     created_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,161 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..db import engine
+from ..models.audio import TrackAudio
+from ..models.track import Track
+from . import metrics
+from .audio import analyze_file
+from .storage import file_path
+
+logger = logging.getLogger(__name__)
+
+analyzed_total = metrics.counter("audio_analyzed_total", "Tracks analyzed successfully")
+failed_total = metrics.counter("audio_analysis_failed_total", "Tracks whose analysis failed")
+inflight_gauge = metrics.gauge("audio_analysis_inflight", "Tracks queued or being analyzed")
+
+
+class AudioAnalyzer:
+    """Runs analyze_file on a process pool (decoding is CPU-bound) and stores results.
+
+    New uploads are submitted directly; a backfill thread picks up every track that has
+    no TrackAudio row yet, throttled to ``backlog`` outstanding jobs.
+    """
+
+    def __init__(self, workers: int, points: int, ffmpeg: str, backlog: int):
+        self.workers = workers
+        self.points = points
+        self.ffmpeg = ffmpeg
+        self._pool: ProcessPoolExecutor | None = None
+        self._inflight: set[int] = set()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(backlog)
+        inflight_gauge.set_function(lambda: len(self._inflight))
+
+    def start(self) -> None:
+        if self._pool:
+            return
+        self._pool = self._new_pool()
+        threading.Thread(target=self._backfill, name="audio-backfill", daemon=True).start()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the parent already runs writer threads
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, track_id: int, filename: str, throttle: bool = False) -> bool:
+        """Queue a track for analysis. Blocking: it stats the file and may write a row, so
+        call it from a worker thread, not the event loop."""
+        pool = self._pool
+        if pool is None:
+            return False
+        with self._lock:
+            if track_id in self._inflight:
+                return False
+            self._inflight.add(track_id)
+        path = file_path(filename)
+        if path is None or not path.exists():
+            # remote or missing blob: nothing to decode locally
+            self._store(track_id, {"status": "unavailable"})
+            self._inflight.discard(track_id)
+            return False
+        if throttle:
+            self._slots.acquire()
+        try:
+            future = pool.submit(analyze_file, str(path), self.points, self.ffmpeg)
+        except RuntimeError:
+            # pool shut down while we were waiting
+            self._inflight.discard(track_id)
+            if throttle:
+                self._slots.release()
+            return False
+        future.add_done_callback(partial(self._done, pool, track_id, throttle))
+        return True
+
+    def _done(self, pool: ProcessPoolExecutor, track_id: int, throttled: bool, future: Future) -> None:
+        try:
+            if future.cancelled():
+                return
+            try:
+                result = future.result()
+                result["status"] = "done" if result.get("duration") else "failed"
+            except BrokenProcessPool:
+                # a worker died (e.g. OOM on a huge file); replace the pool and leave the
+                # track without a row so the next backfill retries it
+                logger.exception("Audio worker pool broke while analyzing track %s", track_id)
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = self._new_pool()
+                return
+            except Exception:
+                logger.exception("Audio analysis failed for track %s", track_id)
+                result = {"status": "failed"}
+            (analyzed_total if result["status"] == "done" else failed_total).inc()
+            self._store(track_id, result)
+        finally:
+            self._inflight.discard(track_id)
+            if throttled:
+                self._slots.release()
+
+    def _store(self, track_id: int, result: dict) -> None:
+        with Session(engine) as session:
+            track = session.get(Track, track_id)
+            if track is None or track.deleted_at is not None:
+                return
+            session.merge(TrackAudio(track_id=track_id, **result))
+            session.commit()
+
+    def _backfill(self) -> None:
+        last_id = 0
+        while self._pool is not None:
+            with Session(engine) as session:
+                rows = session.exec(
+                    select(Track.id, Track.filename)
+                    .outerjoin(TrackAudio, TrackAudio.track_id == Track.id)
+                    .where(TrackAudio.track_id == None, Track.id > last_id)  # noqa: E711
+                    .where(Track.deleted_at == None, Track.file_missing == False)  # noqa: E711, E712
+                    .order_by(Track.id)
+                    .limit(200)
+                ).all()
+            if not rows:
+                return
+            for track_id, filename in rows:
+                self.submit(track_id, filename, throttle=True)
+            last_id = rows[-1][0]
+
+
+def audio_payload(track_id: int, row: TrackAudio | None) -> dict:
+    if row is None:
+        return {"track_id": track_id, "status": "pending"}
+    return {
+        "track_id": track_id,
+        "status": row.status,
+        "duration": row.duration,
+        "bitrate": row.bitrate,
+        "sample_rate": row.sample_rate,
+        "channels": row.channels,
+        "title": row.tag_title,
+        "artist": row.tag_artist,
+        "album": row.tag_album,
+        "loudness_db": row.loudness_db,
+        "peaks": list(row.peaks) if row.peaks else [],
+    }
+
+
+audio_analyzer = AudioAnalyzer(
+    workers=settings.audio_workers,
+    points=settings.waveform_points,
+    ffmpeg=settings.ffmpeg_path,
+    backlog=settings.audio_workers * 4,
+)
@@ -0,0 +1,168 @@
+"""MP3 inspection that runs inside worker processes.
+
+Nothing here imports the app, so spawned workers stay cheap to start.
+"""
+import math
+import mmap
+import subprocess
+from typing import Optional
+
+# kbps by (MPEG version group, layer); version group 1 = MPEG-1, 2 = MPEG-2/2.5
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Hz by version bits: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_TEXT_FRAMES = {"TIT2": "title", "TPE1": "artist", "TALB": "album"}
+_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+# sample rate used when decoding for peaks/loudness; enough resolution for a waveform
+DECODE_RATE = 8000
+
+
+def _frame(data, pos: int) -> Optional[tuple[int, int, int, int]]:
+    """Decode the MPEG header at pos: (frame length, samples, sample rate, channels)."""
+    if pos + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[pos], data[pos + 1], data[pos + 2], data[pos + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_idx = b2 >> 4
+    rate_idx = (b2 >> 2) & 0x03
+    if version == 1 or layer_bits == 0 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    layer = 4 - layer_bits
+    group = 1 if version == 3 else 2
+    bitrate = _BITRATES[(group, layer)][bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    padding = (b2 >> 1) & 0x01
+    channels = 1 if (b3 >> 6) == 3 else 2
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate, channels
+    if layer == 3 and group == 2:
+        return 72 * bitrate // sample_rate + padding, 576, sample_rate, channels
+    return 144 * bitrate // sample_rate + padding, 1152, sample_rate, channels
+
+
+def _id3_size(data) -> int:
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+def _decode_text(raw: bytes) -> Optional[str]:
+    if not raw:
+        return None
+    text = raw[1:].decode(_ENCODINGS.get(raw[0], "latin-1"), errors="replace")
+    return text.strip("\x00").strip() or None
+
+
+def read_id3(data) -> dict:
+    """Title/artist/album from an ID3v2.3/2.4 tag, falling back to ID3v1."""
+    tags: dict = {}
+    end = _id3_size(data)
+    if end:
+        major = data[3]
+        pos = 10
+        while pos + 10 <= end and data[pos] != 0:
+            frame_id = bytes(data[pos:pos + 4]).decode("latin-1", errors="replace")
+            raw_size = data[pos + 4:pos + 8]
+            if major >= 4:
+                size = (raw_size[0] << 21) | (raw_size[1] << 14) | (raw_size[2] << 7) | raw_size[3]
+            else:
+                size = int.from_bytes(raw_size, "big")
+            if size <= 0:
+                break
+            if frame_id in _TEXT_FRAMES:
+                tags[_TEXT_FRAMES[frame_id]] = _decode_text(bytes(data[pos + 10:pos + 10 + size]))
+            pos += 10 + size
+    if not tags and len(data) >= 128 and data[-128:-125] == b"TAG":
+        v1 = bytes(data[-128:])
+        for key, start in (("title", 3), ("artist", 33), ("album", 63)):
+            value = v1[start:start + 30].split(b"\x00")[0].decode("latin-1").strip()
+            if value:
+                tags[key] = value
+    return tags
+
+
+def scan_frames(data) -> dict:
+    """Walk every MPEG frame to get exact duration and average bitrate (works for VBR)."""
+    pos = _id3_size(data)
+    limit = len(data) - (128 if data[-128:-125] == b"TAG" else 0)
+    frames = samples = audio_bytes = 0
+    sample_rate = channels = None
+    while pos < limit:
+        header = _frame(data, pos)
+        if header is None or header[0] <= 0:
+            pos += 1
+            continue
+        length, frame_samples, rate, chans = header
+        frames += 1
+        samples += frame_samples
+        audio_bytes += length
+        sample_rate = sample_rate or rate
+        channels = channels or chans
+        pos += length
+    if not frames or not sample_rate:
+        return {}
+    duration = samples / sample_rate
+    return {
+        "duration": duration,
+        "bitrate": int(audio_bytes * 8 / duration / 1000) if duration else None,
+        "sample_rate": sample_rate,
+        "channels": channels,
+    }
+
+
+def decode_pcm(path: str, ffmpeg: str) -> Optional[bytes]:
+    """Mono 16-bit PCM at DECODE_RATE via ffmpeg, or None if ffmpeg is unavailable."""
+    try:
+        proc = subprocess.run(
+            [ffmpeg, "-v", "error", "-i", path, "-ac", "1", "-ar", str(DECODE_RATE), "-f", "s16le", "-"],
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout
+
+
+def peaks_and_loudness(pcm: bytes, points: int) -> tuple[Optional[bytes], Optional[float]]:
+    """Downsample to ``points`` uint8 peak values and compute RMS loudness in dBFS."""
+    import numpy as np
+
+    samples = np.frombuffer(pcm, dtype="<i2")
+    if samples.size == 0:
+        return None, None
+    magnitudes = np.abs(samples.astype(np.int32))
+    if magnitudes.size < points:
+        magnitudes = np.pad(magnitudes, (0, points - magnitudes.size))
+    usable = magnitudes.size - magnitudes.size % points
+    buckets = magnitudes[:usable].reshape(points, -1).max(axis=1)
+    peaks = np.minimum(buckets * 255 // 32768, 255).astype(np.uint8).tobytes()
+    rms = float(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+    loudness = 20 * math.log10(rms / 32768) if rms > 0 else None
+    return peaks, loudness
+
+
+def analyze_file(path: str, points: int, ffmpeg: str) -> dict:
+    """Everything the listings need about one file; safe to run in a worker process."""
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        result = scan_frames(data)
+        tags = read_id3(data)
+    result.update({f"tag_{key}": value for key, value in tags.items()})
+    pcm = decode_pcm(path, ffmpeg)
+    if pcm:
+        try:
+            result["peaks"], result["loudness_db"] = peaks_and_loudness(pcm, points)
+        except ImportError:
+            # numpy is optional; metadata is still useful without a waveform
+            pass
+    return result
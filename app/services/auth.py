@@ -1,51 +1,86 @@
+import time
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status, Response
-from passlib.context import CryptContext
 from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
 from itsdangerous import URLSafeSerializer
 
 from ..config import settings
 from ..deps import serializer
 from ..models.user import User
+from . import metrics, throttle
+from .passwords import password_hasher
+from .sessions import SessionUser, user_cache
 from ..schemas.auth import SignUp, Login
-from ..db import get_session
+from ..db import read_engine
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logins_total = {
+    result: metrics.counter("auth_logins_total", "Login attempts by outcome", result=result)
+    for result in ("success", "failure", "throttled")
+}
+# failed logins are limited per account (guessing one password) and per client IP (spraying many)
+nickname_failures = throttle.FailureLimiter(settings.login_max_failures, settings.login_failure_window)
+ip_failures = throttle.FailureLimiter(settings.login_max_failures_per_ip, settings.login_failure_window)
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+def create_session_cookie(user: User | SessionUser) -> str:
+    # the nickname is signed in so requests right after login can be authenticated without a lookup
+    return serializer.dumps({"user_id": user.id, "nickname": user.nickname, "iat": int(time.time())})
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+def _find_user(nickname: str) -> Optional[User]:
+    # a short read-only session, so the write connection isn't held while bcrypt runs
+    with Session(read_engine) as session:
+        return session.exec(select(User).where(User.nickname == nickname)).first()
 
 
-def create_session_cookie(user_id: int) -> str:
-    return serializer.dumps({"user_id": user_id})
+async def signup(data: SignUp, db: Session) -> User:
+    if await run_in_threadpool(_find_user, data.nickname):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nickname already taken")
+    user = User(nickname=data.nickname, hashed_password=await password_hasher.hash(data.password))
+    await run_in_threadpool(_save_user, db, user)
+    remember_user(user)
+    return user
 
 
-def signup(data: SignUp, db: Session) -> User:
-    exists = db.exec(select(User).where(User.nickname == data.nickname)).first()
-    if exists:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nickname already taken")
-    user = User(nickname=data.nickname, hashed_password=hash_password(data.password))
+async def login(data: Login, db: Session, client_ip: str) -> User:
+    limited = ((nickname_failures, data.nickname.lower()), (ip_failures, client_ip))
+    try:
+        throttle.check(*limited)
+    except HTTPException:
+        logins_total["throttled"].inc()
+        raise
+    user = await run_in_threadpool(_find_user, data.nickname)
+    ok, new_hash = await password_hasher.verify(data.password, user.hashed_password if user else None)
+    if not ok:
+        logins_total["failure"].inc()
+        for limiter, key in limited:
+            limiter.fail(key)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid credentials")
+    logins_total["success"].inc()
+    nickname_failures.reset(data.nickname.lower())
+    if new_hash:
+        # stored hash predates the current bcrypt cost; upgrade it while we have the password
+        user.hashed_password = new_hash
+        await run_in_threadpool(_save_user, db, user)
+    return user
+
+
+def _save_user(db: Session, user: User) -> None:
     db.add(user)
     db.commit()
     db.refresh(user)
-    return user
 
 
-def login(data: Login, db: Session) -> User:
-    user = db.exec(select(User).where(User.nickname == data.nickname)).first()
-    if not user or not verify_password(data.password, user.hashed_password):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid credentials")
-    return user
+def remember_user(user: User) -> None:
+    """Refresh the process cache after a user is created or renamed."""
+    user_cache.invalidate(user.id)
+    user_cache.put(user.id, SessionUser(id=user.id, nickname=user.nickname))
 
 
-def set_session_cookie(response: Response, user_id: int) -> None:
-    cookie_value = create_session_cookie(user_id)
+def set_session_cookie(response: Response, user: User | SessionUser) -> None:
+    cookie_value = create_session_cookie(user)
     response.set_cookie(
         key=settings.session_cookie,
         value=cookie_value,
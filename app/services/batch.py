@@ -0,0 +1,156 @@
+"""Many like/unlike/play/queue operations from one request, applied in one transaction.
+
+Operations run in order against the user's state loaded up front (existing tracks,
+likes, queue), so a batch that likes and unlikes the same track nets out to nothing and
+costs a handful of statements however long it is. Plays are written directly with the
+batch rather than through the play buffer, so an idempotent retry can't count them twice.
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+import orjson
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from ..models.favorite import Favorite
+from ..models.play import Play
+from ..models.queue import IdempotencyKey, QueueItem
+from ..models.track import Track
+from ..schemas.batch import BatchOp
+from . import charts, counters, metrics
+
+MAX_QUEUE = 200
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+ops_total = {
+    op: metrics.counter("batch_ops_total", "Operations received in batch requests", op=op)
+    for op in ("like", "unlike", "play", "queue_add", "queue_remove", "queue_clear")
+}
+replayed_total = metrics.counter("batch_replayed_total", "Batch requests answered from a stored idempotency key")
+
+
+def apply_batch(db: Session, user_id: int, ops: list[BatchOp]) -> tuple[list[dict], set[str]]:
+    """Stage the operations in ``db`` without committing.
+
+    Returns one result per operation (``ok``, ``noop``, ``not_found`` or ``queue_full``)
+    and the kinds of data that changed, for cache invalidation.
+    """
+    now = datetime.utcnow()
+    track_ids = {op.track_id for op in ops if op.track_id is not None}
+    existing = set(
+        db.exec(
+            select(Track.id).where(
+                Track.id.in_(track_ids), Track.deleted_at == None, Track.file_missing == False  # noqa: E711, E712
+            )
+        ).all()
+    ) if track_ids else set()
+    liked_at = dict(
+        db.exec(
+            select(Favorite.track_id, Favorite.created_at).where(
+                Favorite.user_id == user_id, Favorite.track_id.in_(existing)
+            )
+        ).all()
+    ) if existing else {}
+    liked_before = set(liked_at)
+    queue_before = list(
+        db.exec(select(QueueItem.track_id).where(QueueItem.user_id == user_id).order_by(QueueItem.position)).all()
+    )
+
+    liked = set(liked_before)
+    queue = list(queue_before)
+    plays = []
+    results = []
+    for op in ops:
+        ops_total[op.op].inc()
+        status = "ok"
+        if op.op == "queue_clear":
+            queue.clear()
+        elif op.track_id not in existing:
+            status = "not_found"
+        elif op.op == "like":
+            status = "noop" if op.track_id in liked else "ok"
+            liked.add(op.track_id)
+        elif op.op == "unlike":
+            status = "ok" if op.track_id in liked else "noop"
+            liked.discard(op.track_id)
+        elif op.op == "play":
+            plays.append({"track_id": op.track_id, "user_id": user_id, "played_at": now})
+        elif op.op == "queue_add":
+            if len(queue) >= MAX_QUEUE:
+                status = "queue_full"
+            else:
+                queue.append(op.track_id)
+        elif op.op == "queue_remove":
+            if op.track_id in queue:
+                queue.remove(op.track_id)
+            else:
+                status = "noop"
+        results.append({"op": op.op, "track_id": op.track_id, "status": status})
+
+    changed = set()
+    added, removed = liked - liked_before, liked_before - liked
+    if added:
+        db.exec(
+            Favorite.__table__.insert(),
+            params=[{"user_id": user_id, "track_id": tid, "created_at": now} for tid in sorted(added)],
+        )
+    if removed:
+        db.exec(delete(Favorite).where(Favorite.user_id == user_id, Favorite.track_id.in_(removed)))
+        charts.retract_likes(db, [(tid, liked_at[tid]) for tid in sorted(removed)])
+    for tid in added:
+        counters.add_likes(db, tid, 1)
+    for tid in removed:
+        counters.add_likes(db, tid, -1)
+    if added or removed:
+        changed.add("like")
+    if plays:
+        db.exec(Play.__table__.insert(), params=plays)
+        counters.record_plays(db.connection(), plays)
+        changed.add("plays")
+    if queue != queue_before:
+        db.exec(delete(QueueItem).where(QueueItem.user_id == user_id))
+        if queue:
+            db.exec(
+                QueueItem.__table__.insert(),
+                params=[
+                    {"user_id": user_id, "position": i, "track_id": tid, "added_at": now} for i, tid in enumerate(queue)
+                ],
+            )
+    return results, changed
+
+
+def counter_deltas(results: list[dict]) -> dict[int, tuple[int, int]]:
+    """Net (likes, plays) change per track from ``apply_batch`` results."""
+    deltas: dict[int, list[int]] = {}
+    for result in results:
+        if result["status"] != "ok" or result["op"] not in ("like", "unlike", "play"):
+            continue
+        delta = deltas.setdefault(result["track_id"], [0, 0])
+        if result["op"] == "play":
+            delta[1] += 1
+        else:
+            delta[0] += 1 if result["op"] == "like" else -1
+    return {track_id: (likes, plays) for track_id, (likes, plays) in deltas.items() if likes or plays}
+
+
+def user_queue(db: Session, user_id: int) -> list[Track]:
+    """Queued tracks in play order; a track can be queued more than once."""
+    rows = db.exec(
+        select(Track)
+        .join(QueueItem, QueueItem.track_id == Track.id)
+        .where(QueueItem.user_id == user_id, Track.deleted_at == None, Track.file_missing == False)  # noqa: E711, E712
+        .order_by(QueueItem.position)
+    ).all()
+    return list(rows)
+
+
+def request_hash(ops: list[BatchOp]) -> str:
+    """Fingerprint of a batch's operations, stored with its idempotency key."""
+    return hashlib.sha256(orjson.dumps([op.model_dump() for op in ops])).hexdigest()
+
+
+def expire_idempotency_keys(db: Session, now: datetime | None = None) -> int:
+    cutoff = (now or datetime.utcnow()) - IDEMPOTENCY_TTL
+    count = db.exec(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)).rowcount
+    db.commit()
+    return count
@@ -0,0 +1,220 @@
+"""Keeps the platform catalog, MP3s shipped in ``static/uploads/platform``, in sync with Track rows.
+
+A sync scans the directory once (name, mtime, size per file), loads the platform tracks
+and the stored ``CatalogFile`` manifest in two queries, and writes the differences in
+one transaction: new files become tracks, files whose mtime or size changed lose their
+analysis and renditions (rows and blobs) so both are redone, and tracks whose file is
+gone are flagged ``file_missing`` (and unflagged if it comes back); listings and lookups
+skip flagged tracks like deleted ones. It runs in a background thread after startup, so a large
+catalog no longer delays serving.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import bindparam, delete, select, update
+
+from ..config import settings
+from ..db import engine
+from ..models.audio import TrackAudio
+from ..models.catalog import CatalogFile
+from ..models.rendition import Rendition
+from ..models.track import Track
+from ..models.user import User
+from . import fragments, metrics
+from .analysis import audio_analyzer
+from .storage import PLATFORM_PREFIX, UPLOAD_ROOT, backend_for
+from .transcoding import transcoder
+
+logger = logging.getLogger(__name__)
+
+PLATFORM_DIR = UPLOAD_ROOT / PLATFORM_PREFIX.rstrip("/")
+PLATFORM_NICKNAME = "Platform"
+
+manifest_table = CatalogFile.__table__
+track_table = Track.__table__
+
+sync_seconds = metrics.histogram("catalog_sync_seconds", "Time spent on one platform catalog sync")
+files_gauge = metrics.gauge("catalog_files", "MP3 files in the platform catalog directory")
+
+
+@dataclass
+class SyncResult:
+    added: int = 0
+    changed: int = 0
+    missing: int = 0
+    restored: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.missing or self.restored)
+
+
+def scan(directory: Path) -> dict[str, tuple[int, int]]:
+    """``platform/<name>`` -> (mtime_ns, size) for every MP3 directly in ``directory``."""
+    files = {}
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return files
+    with entries:
+        for entry in entries:
+            if entry.name.endswith(".mp3") and entry.is_file():
+                stat = entry.stat()
+                files[PLATFORM_PREFIX + entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def platform_user_id(conn) -> int:
+    user_id = conn.execute(select(User.id).where(User.nickname == PLATFORM_NICKNAME)).scalar()
+    if user_id is None:
+        user_id = conn.execute(
+            User.__table__.insert().values(
+                nickname=PLATFORM_NICKNAME, hashed_password="platform", created_at=datetime.utcnow()
+            )
+        ).inserted_primary_key[0]
+    return user_id
+
+
+def sync_catalog(directory: Path = PLATFORM_DIR) -> SyncResult:
+    """Bring platform tracks in line with ``directory``; returns what changed."""
+    start = time.perf_counter()
+    files = scan(directory)
+    files_gauge.set(len(files))
+    result = SyncResult()
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        creator_id = platform_user_id(conn)
+        tracks = {
+            row.filename: (row.id, row.file_missing)
+            for row in conn.execute(
+                select(Track.id, Track.filename, Track.file_missing).where(Track.filename.startswith(PLATFORM_PREFIX))
+            )
+        }
+        manifest = {row.filename: (row.mtime_ns, row.size) for row in conn.execute(select(manifest_table))}
+
+        new = [key for key in files if key not in tracks]
+        if new:
+            conn.execute(
+                track_table.insert(),
+                [
+                    {
+                        "title": Path(key).stem,
+                        "artist": "",
+                        "filename": key,
+                        "creator_id": creator_id,
+                        "is_platform": True,
+                        "file_missing": False,
+                        "created_at": now,
+                    }
+                    for key in new
+                ],
+            )
+        changed = [tracks[key][0] for key, stat in files.items() if key in tracks and manifest.get(key, stat) != stat]
+        stale = []
+        if changed:
+            # stale analysis and renditions; the workers redo them from the new file
+            stale = list(conn.execute(select(Rendition.filename).where(Rendition.track_id.in_(changed))).scalars())
+            conn.execute(delete(TrackAudio).where(TrackAudio.track_id.in_(changed)))
+            conn.execute(delete(Rendition).where(Rendition.track_id.in_(changed)))
+        flags = [
+            {"b_id": track_id, "b_missing": key not in files}
+            for key, (track_id, missing) in tracks.items()
+            if missing != (key not in files)
+        ]
+        if flags:
+            conn.execute(
+                update(track_table).where(track_table.c.id == bindparam("b_id")).values(file_missing=bindparam("b_missing")),
+                flags,
+            )
+
+        if files != manifest:
+            conn.execute(delete(manifest_table))
+            if files:
+                conn.execute(
+                    manifest_table.insert(),
+                    [{"filename": key, "mtime_ns": mtime, "size": size} for key, (mtime, size) in files.items()],
+                )
+        # tracks whose audio needs (re)processing
+        work = changed + [f["b_id"] for f in flags if not f["b_missing"]]
+        if new:
+            added = set(new)
+            for track_id, key in conn.execute(
+                select(Track.id, Track.filename).where(Track.filename.startswith(PLATFORM_PREFIX))
+            ):
+                if key in added:
+                    tracks[key] = (track_id, False)
+                    work.append(track_id)
+
+    result.added, result.changed = len(new), len(changed)
+    result.missing = sum(f["b_missing"] for f in flags)
+    result.restored = len(flags) - result.missing
+    for key in stale:
+        backend_for(key).delete(key)
+    filenames = {track_id: key for key, (track_id, _) in tracks.items()}
+    for track_id in work:
+        audio_analyzer.submit(track_id, filenames[track_id])
+        transcoder.submit(track_id, filenames[track_id])
+    if result:
+        fragments.bump("catalog")
+        logger.info(
+            "Platform catalog: %d added, %d changed, %d missing, %d restored",
+            result.added, result.changed, result.missing, result.restored,
+        )
+    sync_seconds.observe(time.perf_counter() - start)
+    return result
+
+
+class CatalogSync:
+    """Syncs once in the background after startup, then on changes or every ``interval`` seconds."""
+
+    def __init__(self, directory: Path, watch: bool, interval: float):
+        self.directory = directory
+        self.watch = watch
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _sync(self) -> None:
+        try:
+            sync_catalog(self.directory)
+        except Exception:
+            logger.exception("Platform catalog sync failed")
+
+    def _run(self) -> None:
+        self._sync()
+        if self.watch and self.directory.exists():
+            try:
+                from watchfiles import watch
+            except ImportError:  # optional dependency
+                logger.warning("watchfiles is not installed; falling back to catalog_rescan_interval")
+            else:
+                # each batch of changes triggers one full diff; it costs one scan and two queries
+                for _ in watch(self.directory, stop_event=self._stop, recursive=False, debounce=2000):
+                    self._sync()
+                return
+        while self.interval and not self._stop.wait(self.interval):
+            self._sync()
+
+
+catalog_sync = CatalogSync(
+    directory=PLATFORM_DIR,
+    watch=settings.catalog_watch,
+    interval=settings.catalog_rescan_interval,
+)
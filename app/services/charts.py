@@ -0,0 +1,310 @@
+"""Trending charts from exponentially decayed play and like scores.
+
+A background thread folds new Play rows (by id) and Favorite rows (by created_at) into
+``TrackTrend``. Stored scores are as of ``ChartState.computed_at``: each pass decays them
+to "now" with one UPDATE per period, then adds the new events. Unliking takes a like that
+was already folded in back out (``retract_likes``), so toggling a like can't pump a track. Tracks that decay below
+``MIN_SCORE`` are dropped, so the table only holds recently active tracks. Every process
+keeps the ranked top of each period in memory for badges and the /charts pages.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, case, delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from ..config import settings
+from ..db import engine, read_engine
+from ..models.favorite import Favorite
+from ..models.play import Play
+from ..models.stats import ChartState, TrackTrend
+from . import fragments, metrics
+from .counters import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# half-life of a play or like, in seconds
+PERIODS = {"hour": 3600, "day": 24 * 3600, "week": 7 * 24 * 3600}
+LIKE_WEIGHT = 5.0
+MIN_SCORE = 1e-3
+# track badges compare plays and likes over this period
+BADGE_PERIOD = "day"
+# likes are read by timestamp; give in-flight transactions time to commit
+LIKE_SETTLE = timedelta(seconds=5)
+STATE = "trending"
+EPOCH = datetime(1970, 1, 1)
+
+trend_table = TrackTrend.__table__
+state_table = ChartState.__table__
+score = trend_table.c.plays_score + LIKE_WEIGHT * trend_table.c.likes_score
+
+passes_total = metrics.counter("chart_passes_total", "Chart passes that folded in new events")
+events_total = metrics.counter("chart_events_total", "Plays and likes folded into the charts")
+pass_seconds = metrics.histogram("chart_pass_seconds", "Time spent on one chart pass")
+
+
+def decay(seconds: float, half_life: float) -> float:
+    return 0.5 ** (max(seconds, 0.0) / half_life)
+
+
+@dataclass(frozen=True)
+class ChartEntry:
+    rank: int
+    track_id: int
+    plays_score: float
+    likes_score: float
+
+    @property
+    def score(self) -> float:
+        return self.plays_score + LIKE_WEIGHT * self.likes_score
+
+
+@dataclass(frozen=True)
+class ChartSnapshot:
+    computed_at: datetime
+    entries: dict[str, list[ChartEntry]]
+    ranks: dict[str, dict[int, int]]
+    badges: tuple[frozenset, frozenset, frozenset]
+
+
+EMPTY = ChartSnapshot(EPOCH, {p: [] for p in PERIODS}, {p: {} for p in PERIODS}, (frozenset(),) * 3)
+
+
+class ChartEngine:
+    def __init__(self, interval: float, size: int, batch_size: int, badge_size: int):
+        self.interval = interval
+        self.size = size
+        self.batch_size = batch_size
+        self.badge_size = badge_size
+        self.snapshot = EMPTY
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="chart-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Chart refresh failed")
+            self._stop.wait(self.interval)
+
+    def refresh(self) -> None:
+        """Catch up with new plays and likes, then reload the in-memory charts."""
+        while self.advance() and not self._stop.is_set():
+            pass
+        self.reload()
+
+    def advance(self, now: datetime | None = None) -> bool:
+        """Fold one batch of new events into the scores; True if more are waiting.
+
+        Several processes may run this: the pass claims its batch by moving the cursor
+        with a compare-and-set, and a process that loses the race just skips it.
+        """
+        now = now or datetime.utcnow()
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                state = conn.execute(select(state_table).where(state_table.c.name == STATE)).first()
+                play_id, liked_at, computed_at = (
+                    (state.play_id, state.liked_at, state.computed_at) if state else (0, EPOCH, now)
+                )
+                plays = conn.execute(
+                    select(Play.id, Play.track_id, Play.played_at)
+                    .where(Play.id > play_id)
+                    .order_by(Play.id)
+                    .limit(self.batch_size)
+                ).all()
+                likes = conn.execute(
+                    select(Favorite.track_id, Favorite.created_at).where(
+                        Favorite.created_at > liked_at, Favorite.created_at <= now - LIKE_SETTLE
+                    )
+                ).all()
+                if not plays and not likes:
+                    return False
+                cursor = {
+                    "play_id": plays[-1].id if plays else play_id,
+                    "liked_at": max(like.created_at for like in likes) if likes else liked_at,
+                    "computed_at": now,
+                }
+                if state is None:
+                    conn.execute(state_table.insert().values(name=STATE, **cursor))
+                else:
+                    claimed = conn.execute(
+                        update(state_table)
+                        .where(
+                            state_table.c.name == STATE,
+                            state_table.c.play_id == play_id,
+                            state_table.c.computed_at == computed_at,
+                        )
+                        .values(**cursor)
+                    ).rowcount
+                    if claimed != 1:
+                        return False
+                for period, half_life in PERIODS.items():
+                    self._fold(conn, period, half_life, (now - computed_at).total_seconds(), plays, likes, now)
+        except IntegrityError:
+            # another process created the state row first
+            return False
+        passes_total.inc()
+        events_total.inc(len(plays) + len(likes))
+        pass_seconds.observe(time.perf_counter() - start)
+        return len(plays) == self.batch_size
+
+    def _fold(self, conn, period: str, half_life: float, elapsed: float, plays, likes, now: datetime) -> None:
+        in_period = trend_table.c.period == period
+        factor = decay(elapsed, half_life)
+        conn.execute(
+            update(trend_table)
+            .where(in_period)
+            .values(plays_score=trend_table.c.plays_score * factor, likes_score=trend_table.c.likes_score * factor)
+        )
+        gains: dict[int, list[float]] = defaultdict(lambda: [0.0, 0.0])
+        for _, track_id, played_at in plays:
+            gains[track_id][0] += decay((now - played_at).total_seconds(), half_life)
+        for track_id, created_at in likes:
+            gains[track_id][1] += decay((now - created_at).total_seconds(), half_life)
+        rows = [
+            {"period": period, "track_id": tid, "plays_score": p, "likes_score": lk, "rank": None}
+            for tid, (p, lk) in gains.items()
+            if p + LIKE_WEIGHT * lk >= MIN_SCORE
+        ]
+        if rows:
+            stmt = upsert_insert(trend_table)
+            conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["period", "track_id"],
+                    set_={
+                        "plays_score": trend_table.c.plays_score + stmt.excluded.plays_score,
+                        "likes_score": trend_table.c.likes_score + stmt.excluded.likes_score,
+                    },
+                ),
+                rows,
+            )
+        conn.execute(delete(trend_table).where(in_period, score < MIN_SCORE))
+
+        conn.execute(update(trend_table).where(in_period, trend_table.c.rank.is_not(None)).values(rank=None))
+        top = conn.execute(
+            select(trend_table.c.track_id).where(in_period).order_by(score.desc(), trend_table.c.track_id).limit(self.size)
+        ).scalars().all()
+        if top:
+            conn.execute(
+                update(trend_table)
+                .where(trend_table.c.period == bindparam("b_period"), trend_table.c.track_id == bindparam("b_track_id"))
+                .values(rank=bindparam("b_rank")),
+                [{"b_period": period, "b_track_id": tid, "b_rank": i} for i, tid in enumerate(top, start=1)],
+            )
+
+    def reload(self) -> None:
+        """Read the ranked charts and badge sets into memory."""
+        with read_engine.connect() as conn:
+            computed_at = conn.execute(
+                select(state_table.c.computed_at).where(state_table.c.name == STATE)
+            ).scalar()
+            entries = {}
+            for period in PERIODS:
+                rows = conn.execute(
+                    select(trend_table.c.rank, trend_table.c.track_id, trend_table.c.plays_score, trend_table.c.likes_score)
+                    .where(trend_table.c.period == period, trend_table.c.rank.is_not(None))
+                    .order_by(trend_table.c.rank)
+                ).all()
+                entries[period] = [ChartEntry(*row) for row in rows]
+            top_plays, top_likes = (
+                frozenset(
+                    conn.execute(
+                        select(trend_table.c.track_id)
+                        .where(trend_table.c.period == BADGE_PERIOD, column > 0)
+                        .order_by(column.desc(), trend_table.c.track_id)
+                        .limit(self.badge_size)
+                    ).scalars()
+                )
+                for column in (trend_table.c.plays_score, trend_table.c.likes_score)
+            )
+        hits = top_plays & top_likes
+        badges = (hits, top_plays - hits, top_likes - hits)
+        previous = self.snapshot
+        self.snapshot = ChartSnapshot(
+            computed_at=computed_at or EPOCH,
+            entries=entries,
+            ranks={period: {e.track_id: e.rank for e in chart} for period, chart in entries.items()},
+            badges=badges,
+        )
+        if badges != previous.badges:
+            # badges are baked into cached track lists
+            fragments.bump("charts")
+
+    def rank(self, period: str, track_id: int) -> int | None:
+        return self.snapshot.ranks[period].get(track_id)
+
+    def top(self, period: str, limit: int | None = None) -> list[ChartEntry]:
+        return self.snapshot.entries[period][:limit]
+
+    def badges(self) -> tuple[frozenset, frozenset, frozenset]:
+        """(hit, most played, most liked) track ids; a hit is both."""
+        return self.snapshot.badges
+
+    def current_score(self, period: str, entry: ChartEntry, now: datetime | None = None) -> float:
+        elapsed = ((now or datetime.utcnow()) - self.snapshot.computed_at).total_seconds()
+        return entry.score * decay(elapsed, PERIODS[period])
+
+
+def retract_likes(db, likes: list[tuple[int, datetime]]) -> None:
+    """Subtract removed favorites, ``(track_id, created_at)``, in the caller's transaction.
+
+    Only likes up to the engine's cursor were folded in; newer ones are deleted before
+    the engine ever reads them.
+    """
+    state = db.exec(
+        select(state_table.c.liked_at, state_table.c.computed_at).where(state_table.c.name == STATE)
+    ).first()
+    folded = [(tid, created_at) for tid, created_at in likes if state and created_at and created_at <= state.liked_at]
+    if not folded:
+        return
+    remaining = trend_table.c.likes_score - bindparam("b_loss")
+    db.exec(
+        update(trend_table)
+        .where(trend_table.c.period == bindparam("b_period"), trend_table.c.track_id == bindparam("b_track_id"))
+        .values(likes_score=case((remaining > 0, remaining), else_=0.0)),
+        params=[
+            {
+                "b_period": period,
+                "b_track_id": tid,
+                "b_loss": decay((state.computed_at - created_at).total_seconds(), half_life),
+            }
+            for period, half_life in PERIODS.items()
+            for tid, created_at in folded
+        ],
+    )
+
+
+def rebuild_charts() -> None:
+    """Drop all scores and recompute them from the full Play and Favorite history."""
+    with engine.begin() as conn:
+        conn.execute(delete(trend_table))
+        conn.execute(delete(state_table))
+    while chart_engine.advance():
+        pass
+
+
+chart_engine = ChartEngine(
+    interval=settings.chart_refresh_interval,
+    size=settings.chart_size,
+    batch_size=settings.chart_batch_size,
+    badge_size=settings.chart_badge_size,
+)
@@ -0,0 +1,223 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, delete, func, select
+
+from ..db import engine
+from ..models.favorite import Favorite
+from ..models.play import Play
+from ..models.stats import RetentionState, TrackDailyPlays, TrackStats, TrackTrend, UserDailyPlays
+from ..models.track import Track
+
+stats_table = TrackStats.__table__
+daily_table = TrackDailyPlays.__table__
+user_daily_table = UserDailyPlays.__table__
+
+RECENT_DAYS = 7
+
+
+def upsert_insert(table):
+    """INSERT with ``on_conflict_do_*`` for the configured database."""
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+
+def add_likes(db: Session, track_id: int, delta: int) -> None:
+    """Apply a like (+1) or unlike (-1) to the track's counters in the caller's transaction."""
+    stmt = upsert_insert(stats_table).values(track_id=track_id, likes_count=max(delta, 0), plays_count=0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["track_id"],
+        set_={"likes_count": stats_table.c.likes_count + delta},
+    )
+    db.exec(stmt)
+
+
+def record_plays(conn, events: Iterable[dict]) -> None:
+    """Fold a batch of play events into total, per-day and per-user-day counters."""
+    totals: Counter = Counter()
+    daily: Counter = Counter()
+    user_daily: Counter = Counter()
+    for event in events:
+        totals[event["track_id"]] += 1
+        daily[(event["track_id"], event["played_at"].date())] += 1
+        if event["user_id"] is not None:
+            user_daily[(event["user_id"], event["track_id"], event["played_at"].date())] += 1
+    if not totals:
+        return
+
+    stmt = upsert_insert(stats_table)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["track_id"],
+            set_={"plays_count": stats_table.c.plays_count + stmt.excluded.plays_count},
+        ),
+        [{"track_id": tid, "likes_count": 0, "plays_count": n} for tid, n in totals.items()],
+    )
+    stmt = upsert_insert(daily_table)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["track_id", "day"],
+            set_={"plays": daily_table.c.plays + stmt.excluded.plays},
+        ),
+        [{"track_id": tid, "day": day, "plays": n} for (tid, day), n in daily.items()],
+    )
+    if user_daily:
+        stmt = upsert_insert(user_daily_table)
+        conn.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "track_id", "day"],
+                set_={"plays": user_daily_table.c.plays + stmt.excluded.plays},
+            ),
+            [{"user_id": uid, "track_id": tid, "day": day, "plays": n} for (uid, tid, day), n in user_daily.items()],
+        )
+
+
+def delete_track_counters(db: Session, track_id: int) -> None:
+    db.exec(delete(TrackTrend).where(TrackTrend.track_id == track_id))
+    db.exec(delete(daily_table).where(daily_table.c.track_id == track_id))
+    db.exec(delete(user_daily_table).where(user_daily_table.c.track_id == track_id))
+    db.exec(delete(stats_table).where(stats_table.c.track_id == track_id))
+
+
+def load_counters(db: Session, track_ids: list[int]) -> dict[int, dict]:
+    """Counters for the given tracks: two primary-key lookups, no scan of raw history."""
+    if not track_ids:
+        return {}
+    counters = {tid: {"likes_count": 0, "plays_count": 0, "plays_7d": 0} for tid in track_ids}
+    rows = db.exec(
+        select(stats_table.c.track_id, stats_table.c.likes_count, stats_table.c.plays_count).where(
+            stats_table.c.track_id.in_(track_ids)
+        )
+    ).all()
+    for tid, likes, plays in rows:
+        counters[tid]["likes_count"] = likes
+        counters[tid]["plays_count"] = plays
+    since = datetime.utcnow().date() - timedelta(days=RECENT_DAYS - 1)
+    rows = db.exec(
+        select(daily_table.c.track_id, func.sum(daily_table.c.plays))
+        .where(daily_table.c.track_id.in_(track_ids), daily_table.c.day >= since)
+        .group_by(daily_table.c.track_id)
+    ).all()
+    for tid, plays in rows:
+        counters[tid]["plays_7d"] = plays or 0
+    return counters
+
+
+def plays_pruned_before(db: Session) -> Optional[datetime]:
+    """Start of the raw play history; earlier plays only survive in the daily rollups."""
+    return db.exec(select(RetentionState.pruned_before).where(RetentionState.name == "play")).first()
+
+
+def rebuild_counters(db: Session) -> None:
+    """Recompute every counter from Favorite, Play and, for pruned days, the rollups.
+
+    Daily rows are rebuilt only for days still covered by raw plays; plays_count is then
+    the sum of all daily rows, so history older than the retention window is kept.
+    """
+    boundary = plays_pruned_before(db)
+    raw_plays = Play.__table__.select().with_only_columns(Play.track_id, Play.user_id, Play.played_at)
+    if boundary is not None:
+        raw_plays = raw_plays.where(Play.played_at >= boundary)
+        db.exec(delete(daily_table).where(daily_table.c.day >= boundary.date()))
+        db.exec(delete(user_daily_table).where(user_daily_table.c.day >= boundary.date()))
+    else:
+        db.exec(delete(daily_table))
+        db.exec(delete(user_daily_table))
+    raw = raw_plays.subquery()
+    day = func.date(raw.c.played_at)
+    db.exec(
+        daily_table.insert().from_select(
+            ["track_id", "day", "plays"],
+            select(raw.c.track_id, day, func.count()).group_by(raw.c.track_id, day),
+        )
+    )
+    db.exec(
+        user_daily_table.insert().from_select(
+            ["user_id", "track_id", "day", "plays"],
+            select(raw.c.user_id, raw.c.track_id, day, func.count())
+            .where(raw.c.user_id.is_not(None))
+            .group_by(raw.c.user_id, raw.c.track_id, day),
+        )
+    )
+    db.exec(delete(stats_table))
+    likes = select(func.count()).select_from(Favorite.__table__).where(Favorite.track_id == Track.id)
+    plays = select(func.coalesce(func.sum(daily_table.c.plays), 0)).where(daily_table.c.track_id == Track.id)
+    db.exec(
+        stats_table.insert().from_select(
+            ["track_id", "likes_count", "plays_count"],
+            select(Track.id, likes.scalar_subquery(), plays.scalar_subquery()),
+        )
+    )
+    db.commit()
+
+
+def _play_totals(db: Session, track_ids: list[int], boundary: Optional[datetime]) -> dict[int, int]:
+    """All-time plays per track: raw rows plus the rollups of pruned days.
+
+    Raw rows before ``boundary`` are not counted: pruning moves the boundary first and may
+    leave such rows behind (unread by the charts, or after a crash), and their days are
+    already in the rollups.
+    """
+    raw = select(Play.track_id, func.count()).where(Play.track_id.in_(track_ids))
+    if boundary is not None:
+        raw = raw.where(Play.played_at >= boundary)
+    totals: Counter = Counter(dict(db.exec(raw.group_by(Play.track_id)).all()))
+    if boundary is not None:
+        totals.update(
+            dict(
+                db.exec(
+                    select(daily_table.c.track_id, func.sum(daily_table.c.plays))
+                    .where(daily_table.c.track_id.in_(track_ids), daily_table.c.day < boundary.date())
+                    .group_by(daily_table.c.track_id)
+                ).all()
+            )
+        )
+    return totals
+
+
+def reconcile_counters(db: Session, chunk_size: int = 1000) -> int:
+    """Fix totals that drifted from the raw tables; returns how many tracks were corrected."""
+    fixed = 0
+    last_id = 0
+    boundary = plays_pruned_before(db)
+    while True:
+        track_ids = db.exec(
+            select(Track.id).where(Track.id > last_id).order_by(Track.id).limit(chunk_size)
+        ).all()
+        if not track_ids:
+            break
+        last_id = track_ids[-1]
+        likes = dict(
+            db.exec(
+                select(Favorite.track_id, func.count()).where(Favorite.track_id.in_(track_ids)).group_by(Favorite.track_id)
+            ).all()
+        )
+        plays = _play_totals(db, track_ids, boundary)
+        stored = load_counters(db, track_ids)
+        drifted = [
+            {"track_id": tid, "likes_count": likes.get(tid, 0), "plays_count": plays.get(tid, 0)}
+            for tid in track_ids
+            if (stored[tid]["likes_count"], stored[tid]["plays_count"]) != (likes.get(tid, 0), plays.get(tid, 0))
+        ]
+        if drifted:
+            stmt = upsert_insert(stats_table)
+            db.exec(
+                stmt.on_conflict_do_update(
+                    index_elements=["track_id"],
+                    set_={"likes_count": stmt.excluded.likes_count, "plays_count": stmt.excluded.plays_count},
+                ),
+                params=drifted,
+            )
+            db.commit()
+            fixed += len(drifted)
+    return fixed
+
+
+def backfill_if_empty(db: Session) -> None:
+    """Populate counters on first start after upgrading an existing database."""
+    has_stats = db.exec(select(stats_table.c.track_id).limit(1)).first()
+    has_track = db.exec(select(Track.id).limit(1)).first()
+    if has_track and not has_stats:
+        rebuild_counters(db)
@@ -0,0 +1,27 @@
+"""Weak ETags derived from the fragment cache's data version.
+
+Any write that changes a listing bumps the version, so ``(version, URL, viewer)``
+identifies a response without rendering it: a matching If-None-Match gets a 304
+before the handler touches the database.
+"""
+import hashlib
+
+from fastapi import Request
+
+from .fragments import not_modified_total
+
+
+def version_etag(request: Request, current_user, version: int, stamp: str = "") -> str:
+    viewer = f"{current_user.id}:{current_user.nickname}" if current_user else "-"
+    digest = hashlib.blake2b(
+        f"{request.url.path}?{request.url.query}|{viewer}|{stamp}".encode(), digest_size=8
+    ).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        not_modified_total.inc()
+        return True
+    return False
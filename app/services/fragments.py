@@ -0,0 +1,167 @@
+"""Cache for rendered track-list fragments.
+
+Entries are keyed by the page inputs plus a global data version. Writes that change what
+a listing shows bump the version instead of deleting keys, so stale entries are never
+served and simply age out of the LRU (or expire in Redis).
+"""
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from ..config import settings
+from . import metrics
+
+hits_total = metrics.counter("fragment_cache_hits_total", "Track-list fragments served from cache")
+misses_total = metrics.counter("fragment_cache_misses_total", "Track-list fragments rendered from the database")
+not_modified_total = metrics.counter("page_not_modified_total", "HTML pages answered with 304")
+_bump_counters: dict = {}
+
+
+class FragmentBackend(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def version(self) -> int:
+        ...
+
+    @abstractmethod
+    def bump(self) -> None:
+        ...
+
+
+class NullBackend(FragmentBackend):
+    """``fragment_cache=off``: always render, but keep versions so ETags still work."""
+
+    def __init__(self):
+        # start from the clock so a restart can't reuse ETags handed out before it
+        self._version = int(time.time())
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        pass
+
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> None:
+        self._version += 1
+
+
+class MemoryBackend(FragmentBackend):
+    """Per-process LRU. The version is per-process too, so use Redis with several workers."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._version = int(time.time())
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> None:
+        with self._lock:
+            self._version += 1
+
+
+class RedisBackend(FragmentBackend):
+    """Any Redis-compatible server (Redis, Valkey, KeyDB, ...) shared by all workers."""
+
+    VERSION_KEY = "fragments:version"
+
+    def __init__(self, url: str, ttl: int):
+        try:
+            import redis
+        except ImportError as exc:  # optional dependency
+            raise RuntimeError("fragment_cache=redis requires the redis package") from exc
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(f"fragments:{key}")
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        self.client.set(f"fragments:{key}", value, ex=self.ttl)
+
+    def version(self) -> int:
+        value = self.client.get(self.VERSION_KEY)
+        if value is None:
+            # same clock seed as the in-process backends, in case the server was flushed
+            self.client.set(self.VERSION_KEY, int(time.time()), nx=True)
+            value = self.client.get(self.VERSION_KEY)
+        return int(value)
+
+    def bump(self) -> None:
+        self.client.incr(self.VERSION_KEY)
+
+
+def cache_key(*parts) -> str:
+    """Short key for a tuple of JSON-able page inputs."""
+    return hashlib.blake2b(json.dumps(parts).encode(), digest_size=16).hexdigest()
+
+
+def build_backend() -> FragmentBackend:
+    if settings.fragment_cache == "redis":
+        return RedisBackend(settings.redis_url, settings.fragment_cache_ttl)
+    if settings.fragment_cache == "memory":
+        return MemoryBackend(settings.fragment_cache_size)
+    if settings.fragment_cache != "off":
+        raise RuntimeError(f"unknown fragment_cache: {settings.fragment_cache!r}")
+    return NullBackend()
+
+
+fragment_cache = build_backend()
+_last_bump: dict[str, float] = {}
+_deferred: set[str] = set()
+
+
+def bump(reason: str, min_interval: float = 0) -> None:
+    """Invalidate every cached listing.
+
+    ``min_interval`` rate-limits noisy sources like play flushes; a suppressed bump is
+    remembered and applied by ``bump_deferred`` once the interval has passed.
+    """
+    now = time.monotonic()
+    if min_interval and now - _last_bump.get(reason, float("-inf")) < min_interval:
+        _deferred.add(reason)
+        return
+    _deferred.discard(reason)
+    _last_bump[reason] = now
+    if reason not in _bump_counters:
+        _bump_counters[reason] = metrics.counter(
+            "fragment_cache_bumps_total", "Data version bumps by cause", reason=reason
+        )
+    _bump_counters[reason].inc()
+    fragment_cache.bump()
+
+
+def bump_deferred(reason: str, min_interval: float) -> None:
+    if reason in _deferred:
+        bump(reason, min_interval)
@@ -0,0 +1,67 @@
+"""Per-user liked-track sets, cached so rendering a track list needs no Favorite query.
+
+A user's likes are loaded once (a range scan of the Favorite primary key, which already
+returns them sorted) and kept as a sorted int array: 8 bytes per like, membership by
+bisection. Like/unlike in this process drops the entry; changes made by another worker
+are picked up within ``ttl`` seconds, as with the user cache.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..models.favorite import Favorite
+from . import metrics
+from .lru import TTLCache
+
+lookups_total = {
+    source: metrics.counter("liked_set_lookups_total", "Liked-track set lookups by where they were answered", source=source)
+    for source in ("cache", "database")
+}
+cache_size = metrics.gauge("liked_cache_size", "Liked-track sets held in the process-level cache")
+
+
+class LikedSet:
+    """Immutable set of track ids backed by a sorted array."""
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, sorted_ids: Iterable[int] = ()):
+        self._ids = array("q", sorted_ids)
+
+    def __contains__(self, track_id) -> bool:
+        i = bisect_left(self._ids, track_id)
+        return i < len(self._ids) and self._ids[i] == track_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+
+EMPTY = LikedSet()
+
+liked_cache: TTLCache[int, LikedSet] = TTLCache(
+    max_size=settings.liked_cache_size, ttl=settings.liked_cache_ttl, size_gauge=cache_size
+)
+
+
+def liked_set(db: Session, user_id: Optional[int]) -> LikedSet:
+    """Every track ``user_id`` has liked (empty for anonymous visitors)."""
+    if user_id is None:
+        return EMPTY
+    liked = liked_cache.get(user_id)
+    if liked is not None:
+        lookups_total["cache"].inc()
+        return liked
+    lookups_total["database"].inc()
+    # a like committed while we read invalidates the entry; the token keeps this read out
+    token = liked_cache.token()
+    liked = LikedSet(
+        db.exec(select(Favorite.track_id).where(Favorite.user_id == user_id).order_by(Favorite.track_id)).all()
+    )
+    liked_cache.put(user_id, liked, token)
+    return liked
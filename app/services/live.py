@@ -0,0 +1,326 @@
+"""Live like/play counter updates pushed over WebSockets.
+
+Writers call ``live_hub.publish`` after their transaction commits; deltas are summed per
+track and flushed once per tick, so a burst of plays on a popular track is one message
+entry rather than one per play. Each connection subscribes to the tracks it shows and has
+a bounded send queue: a client that can't keep up is disconnected instead of buffering
+without limit. With ``live_broker=redis`` every worker publishes its deltas to a Redis
+channel and delivers what it hears there to its own connections.
+
+Deltas are only correct on top of a known total, so a subscription is answered with the
+tracks' current counters first, and when the broker subscription drops and comes back
+every connection is sent fresh totals for what it watches. Before reading the totals the
+worker publishes its pending deltas for those tracks, so a change counted in the totals
+isn't delivered again after them. Deltas still pending in other workers can be, at most
+one tick's worth, until the next totals.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect, status
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from ..db import read_engine
+from . import metrics
+from .counters import load_counters
+
+logger = logging.getLogger(__name__)
+
+connections_gauge = metrics.gauge("live_connections", "Open live counter WebSockets")
+messages_total = metrics.counter("live_messages_total", "Counter update messages queued for clients")
+deltas_total = metrics.counter("live_deltas_total", "Per-track counter deltas fanned out")
+dropped_total = metrics.counter("live_dropped_total", "Live clients disconnected for falling behind")
+fanout_seconds = metrics.histogram("live_fanout_seconds", "Time spent fanning out one tick of deltas")
+broker_retries_total = metrics.counter("live_broker_retries_total", "Times the live broker subscription failed or ended")
+
+# backoff between broker reconnects, in seconds
+BROKER_RETRY_MIN = 1.0
+BROKER_RETRY_MAX = 30.0
+
+
+class MemoryBroker:
+    """Single process: deltas go straight to the local connections."""
+
+    shared = False
+
+    async def listen(self, deliver, ready) -> None:
+        self.deliver = deliver
+        await ready()
+        # nothing to lose: stay subscribed until cancelled
+        await asyncio.Event().wait()
+
+    async def publish(self, deltas: list) -> None:
+        self.deliver(deltas)
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisBroker:
+    """Pub/sub over any Redis-compatible server, for several uvicorn workers."""
+
+    CHANNEL = "live:counters"
+    shared = True
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:  # optional dependency
+            raise RuntimeError("live_broker=redis requires the redis package") from exc
+        self.client = redis.Redis.from_url(url)
+
+    async def listen(self, deliver, ready) -> None:
+        """Deliver channel messages until the subscription fails or ends."""
+        pubsub = self.client.pubsub()
+        try:
+            await pubsub.subscribe(self.CHANNEL)
+            await ready()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    deliver(orjson.loads(message["data"]))
+        finally:
+            await pubsub.aclose()
+
+    async def publish(self, deltas: list) -> None:
+        await self.client.publish(self.CHANNEL, orjson.dumps(deltas))
+
+    async def stop(self) -> None:
+        await self.client.aclose()
+
+
+class Subscriber:
+    __slots__ = ("websocket", "tracks", "queue", "close_code")
+
+    def __init__(self, websocket: WebSocket, buffer: int):
+        self.websocket = websocket
+        self.tracks: set[int] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.close_code = status.WS_1000_NORMAL_CLOSURE
+
+
+class LiveHub:
+    def __init__(self, tick: float, send_buffer: int, max_subscriptions: int, broker):
+        self.tick = tick
+        self.send_buffer = send_buffer
+        self.max_subscriptions = max_subscriptions
+        self.broker = broker
+        self._pending: dict[int, list[int]] = {}
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[Subscriber]] = defaultdict(set)
+        self._connections: set[Subscriber] = set()
+        self._tasks: list[asyncio.Task] = []
+        connections_gauge.set_function(lambda: len(self._connections))
+
+    def start(self) -> None:
+        """Start the tick loop and the broker subscription; call from the event loop (the startup hook)."""
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._listen()), loop.create_task(self._run())]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.broker.stop()
+        for sub in list(self._connections):
+            self._close(sub, status.WS_1001_GOING_AWAY)
+
+    def publish(self, deltas: dict[int, tuple[int, int]]) -> None:
+        """Add (likes, plays) deltas per track; safe to call from any thread."""
+        if not self.broker.shared and not self._subscribers:
+            return
+        with self._lock:
+            for track_id, (likes, plays) in deltas.items():
+                pending = self._pending.setdefault(track_id, [0, 0])
+                pending[0] += likes
+                pending[1] += plays
+
+    async def _listen(self) -> None:
+        """Keep the broker subscription up, retrying with backoff when it fails or ends."""
+        delay = BROKER_RETRY_MIN
+
+        async def ready() -> None:
+            nonlocal delay
+            delay = BROKER_RETRY_MIN
+            # deltas published while the subscription was down are lost; resend totals
+            await self._send_totals(list(self._connections))
+
+        while True:
+            try:
+                await self.broker.listen(self.deliver, ready)
+                logger.warning("Live broker subscription ended; resubscribing in %.0fs", delay)
+            except Exception:
+                logger.exception("Live broker subscription failed; resubscribing in %.0fs", delay)
+            broker_retries_total.inc()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, BROKER_RETRY_MAX)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            await self._publish(pending)
+
+    async def _flush(self, track_ids: list[int]) -> None:
+        """Publish the pending deltas of ``track_ids`` now instead of at the next tick."""
+        with self._lock:
+            pending = {t: self._pending.pop(t) for t in track_ids if t in self._pending}
+        await self._publish(pending)
+
+    async def _publish(self, pending: dict[int, list[int]]) -> None:
+        deltas = [[track_id, likes, plays] for track_id, (likes, plays) in pending.items() if likes or plays]
+        if not deltas:
+            return
+        try:
+            await self.broker.publish(deltas)
+        except Exception:
+            logger.exception("Failed to publish %d live counter deltas", len(deltas))
+
+    def deliver(self, deltas: list) -> None:
+        """Queue each local connection the deltas for the tracks it watches."""
+        start = time.perf_counter()
+        per_subscriber: dict[Subscriber, list] = defaultdict(list)
+        for entry in deltas:
+            for sub in self._subscribers.get(entry[0], ()):
+                per_subscriber[sub].append(entry)
+        # clients watching the same tracks get the same bytes
+        encoded: dict[tuple, str] = {}
+        for sub, entries in per_subscriber.items():
+            key = tuple(entry[0] for entry in entries)
+            if key not in encoded:
+                encoded[key] = orjson.dumps({"d": entries}).decode()
+            self._queue(sub, encoded[key])
+        messages_total.inc(len(per_subscriber))
+        deltas_total.inc(len(deltas))
+        fanout_seconds.observe(time.perf_counter() - start)
+
+    async def _send_totals(self, subs: list[Subscriber], track_ids: list[int] | None = None) -> None:
+        """Queue each of ``subs`` the current counters of the tracks it watches (of ``track_ids``)."""
+        wanted = set(track_ids) if track_ids is not None else None
+        watched = {sub: sorted(t for t in sub.tracks if wanted is None or t in wanted) for sub in subs}
+        all_ids = sorted({t for ids in watched.values() for t in ids})
+        if not all_ids:
+            return
+        try:
+            totals = await run_in_threadpool(current_totals, all_ids)
+        except Exception:
+            logger.exception("Failed to load live counter totals for %d tracks", len(all_ids))
+            return
+        for sub, ids in watched.items():
+            if ids and sub in self._connections:
+                self._queue(sub, orjson.dumps({"t": [totals[t] for t in ids]}).decode())
+
+    def _queue(self, sub: Subscriber, message: str) -> None:
+        try:
+            sub.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            dropped_total.inc()
+            self._close(sub, status.WS_1013_TRY_AGAIN_LATER)
+
+    def _subscribe(self, sub: Subscriber, track_ids: list[int]) -> None:
+        for track_id in track_ids:
+            if len(sub.tracks) >= self.max_subscriptions:
+                break
+            sub.tracks.add(track_id)
+            self._subscribers[track_id].add(sub)
+
+    def _unsubscribe(self, sub: Subscriber, track_ids) -> None:
+        for track_id in list(track_ids):
+            sub.tracks.discard(track_id)
+            watchers = self._subscribers.get(track_id)
+            if watchers is not None:
+                watchers.discard(sub)
+                if not watchers:
+                    del self._subscribers[track_id]
+
+    def _close(self, sub: Subscriber, code: int) -> None:
+        """Stop delivering to ``sub`` and have its writer close the socket."""
+        self._unsubscribe(sub, sub.tracks)
+        self._connections.discard(sub)
+        sub.close_code = code
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    async def serve(self, websocket: WebSocket) -> None:
+        """Handle one connection until either side closes it.
+
+        The client sends ``{"subscribe": [track ids]}`` and ``{"unsubscribe": [...]}``;
+        the server answers a subscription with ``{"t": [[track id, likes, plays], ...]}``
+        totals, then sends ``{"d": [[track id, likes delta, plays delta], ...]}``.
+        """
+        await websocket.accept()
+        sub = Subscriber(websocket, self.send_buffer)
+        self._connections.add(sub)
+        reader = asyncio.create_task(self._read(sub))
+        writer = asyncio.create_task(self._write(sub))
+        try:
+            await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # forget the connection before awaiting anything: a cancelled handler may
+            # not get to run past its next await
+            self._unsubscribe(sub, sub.tracks)
+            self._connections.discard(sub)
+            reader.cancel()
+            writer.cancel()
+            await asyncio.gather(reader, writer, return_exceptions=True)
+
+    async def _read(self, sub: Subscriber) -> None:
+        try:
+            while True:
+                try:
+                    message = orjson.loads(await sub.websocket.receive_text())
+                    subscribe = [int(t) for t in message.get("subscribe", ())]
+                    unsubscribe = [int(t) for t in message.get("unsubscribe", ())]
+                except (ValueError, TypeError, AttributeError):
+                    self._close(sub, status.WS_1003_UNSUPPORTED_DATA)
+                    return
+                self._unsubscribe(sub, unsubscribe)
+                self._subscribe(sub, subscribe)
+                # subscribed first, so no delta published after the totals are read is missed;
+                # deltas still pending here are already in the totals, so they go out first
+                # and the totals overwrite them
+                await self._flush(subscribe)
+                await self._send_totals([sub], subscribe)
+        except WebSocketDisconnect:
+            pass
+
+    async def _write(self, sub: Subscriber) -> None:
+        try:
+            while (message := await sub.queue.get()) is not None:
+                await sub.websocket.send_text(message)
+            await sub.websocket.close(code=sub.close_code)
+        except (WebSocketDisconnect, RuntimeError):
+            # the client went away mid-send
+            pass
+
+
+def current_totals(track_ids: list[int]) -> dict[int, list[int]]:
+    with Session(read_engine) as db:
+        counters = load_counters(db, track_ids)
+    return {tid: [tid, c["likes_count"], c["plays_count"]] for tid, c in counters.items()}
+
+
+def build_broker():
+    if settings.live_broker == "redis":
+        return RedisBroker(settings.redis_url)
+    if settings.live_broker != "memory":
+        raise RuntimeError(f"unknown live_broker: {settings.live_broker!r}")
+    return MemoryBroker()
+
+
+live_hub = LiveHub(
+    tick=settings.live_tick_interval,
+    send_buffer=settings.live_send_buffer,
+    max_subscriptions=settings.live_max_subscriptions,
+    broker=build_broker(),
+)
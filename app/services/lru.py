@@ -0,0 +1,76 @@
+"""Process-wide LRU with a TTL, shared by the per-user caches.
+
+Entries expire after ``ttl`` seconds, which bounds how stale a value changed by another
+worker can get. Within the process a loader takes a ``token()`` before reading the
+database and passes it to ``put``; an ``invalidate`` in between makes that put a no-op,
+so a value read before a write can't be cached after the write dropped it.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+from .metrics import Gauge
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    def __init__(self, max_size: int, ttl: float, size_gauge: Optional[Gauge] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        # generation of each key's last invalidation, bounded like the entries; a key
+        # evicted from here counts as invalidated at ``_floor``
+        self._invalidated: OrderedDict[K, int] = OrderedDict()
+        self._generation = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+        if size_gauge is not None:
+            size_gauge.set_function(lambda: len(self._entries))
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def token(self) -> int:
+        """Take before loading a value; see ``put``."""
+        with self._lock:
+            return self._generation
+
+    def put(self, key: K, value: V, token: Optional[int] = None) -> None:
+        """Cache ``value``, unless ``key`` was invalidated after ``token`` was taken."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if token is not None and self._invalidated.get(key, self._floor) > token:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.max_size, 1):
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._invalidated.clear()
+            self._generation += 1
+            self._floor = self._generation
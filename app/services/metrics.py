@@ -0,0 +1,162 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self, name: str, help: str = "", labels: Optional[dict] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    def __init__(self, name: str, help: str = "", labels: Optional[dict] = None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self._value = 0.0
+        self._fn: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        """Read the value lazily from fn (e.g. a queue size) instead of tracking it."""
+        self._fn = fn
+
+    @property
+    def value(self) -> float:
+        return self._fn() if self._fn else self._value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str = "", labels: Optional[dict] = None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """Cumulative bucket counts plus sum/count, Prometheus-style."""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, c in zip(self.buckets, counts):
+            running += c
+            cumulative.append((bound, running))
+        cumulative.append((float("inf"), count))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+
+_registry: dict[tuple, object] = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(cls, name: str, help: str, labels: dict, **kwargs):
+    key = (name, tuple(sorted(labels.items())))
+    with _registry_lock:
+        metric = _registry.get(key)
+        if metric is None:
+            metric = cls(name, help, labels, **kwargs)
+            _registry[key] = metric
+        return metric
+
+
+def counter(name: str, help: str = "", **labels) -> Counter:
+    return _get_or_create(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str = "", **labels) -> Gauge:
+    return _get_or_create(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str = "", buckets=DEFAULT_BUCKETS, **labels) -> Histogram:
+    return _get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+
+def all_metrics() -> list:
+    with _registry_lock:
+        return list(_registry.values())
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict, extra: Optional[dict] = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def exposition() -> str:
+    """Every registered metric in the Prometheus text format (version 0.0.4)."""
+    by_name: dict[str, list] = {}
+    for metric in all_metrics():
+        by_name.setdefault(metric.name, []).append(metric)
+    lines = []
+    for name, family in sorted(by_name.items()):
+        kind = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}[type(family[0])]
+        lines.append(f"# HELP {name} {family[0].help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for metric in family:
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(metric.labels)} {_number(metric.value)}")
+                continue
+            snapshot = metric.snapshot()
+            for bound, count in snapshot["buckets"]:
+                lines.append(f"{name}_bucket{_labels(metric.labels, {'le': _number(bound)})} {count}")
+            lines.append(f"{name}_sum{_labels(metric.labels)} {_number(snapshot['sum'])}")
+            lines.append(f"{name}_count{_labels(metric.labels)} {snapshot['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,132 @@
+"""Per-request SQL accounting, slow-query logging and repeated-query detection.
+
+``instrument_engine`` hooks SQLAlchemy's cursor events on an engine. Every statement is
+counted in the global metrics and, while a request is being served, in that request's
+``RequestStats`` (a context variable set by ``RequestMetricsMiddleware``; threadpool and
+``run_sync`` code inherit it). Statements slower than ``slow_query_ms`` are logged with
+their query plan. With ``sql_debug`` on, a statement that runs ``sql_repeat_threshold``
+times in one request - the usual shape of an N+1 - is logged once per route.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+
+from ..config import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("app.sql.slow")
+
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# the same slow statement is logged at most once per interval
+SLOW_LOG_INTERVAL = 60.0
+# statements remembered for that; statements with inlined values are all distinct, so evict the oldest
+SLOW_LOG_MAX_STATEMENTS = 1000
+EXPLAIN = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE)\b", re.IGNORECASE)
+
+slow_total = metrics.counter("db_slow_statements_total", "Statements slower than slow_query_ms")
+_engine_metrics: dict = {}
+_repeat_counters: dict = {}
+_slow_logged: OrderedDict[str, float] = OrderedDict()
+_slow_lock = threading.Lock()
+
+
+@dataclass
+class RequestStats:
+    scope: dict = field(default_factory=dict, repr=False)
+    statements: int = 0
+    seconds: float = 0.0
+    repeated: Counter = field(default_factory=Counter)
+
+    @property
+    def route(self) -> str:
+        """The matched path template; routing stores it in the shared scope before the endpoint runs."""
+        return getattr(self.scope.get("route"), "path", None) or "unrouted"
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def instrument_engine(engine, name: str) -> None:
+    """Count and time every statement on ``engine`` (pass ``sync_engine`` for async ones)."""
+    if name not in _engine_metrics:
+        _engine_metrics[name] = (
+            metrics.counter("db_statements_total", "SQL statements executed", engine=name),
+            metrics.histogram("db_statement_seconds", "SQL statement execution time", buckets=SQL_BUCKETS, engine=name),
+        )
+    statements_total, statement_seconds = _engine_metrics[name]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        statements_total.inc()
+        statement_seconds.observe(elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.seconds += elapsed
+            if settings.sql_debug:
+                stats.repeated[statement] += 1
+        if elapsed * 1000 >= settings.slow_query_ms:
+            log_slow(conn, statement, parameters, executemany, elapsed, stats)
+
+
+def log_slow(conn, statement: str, parameters, executemany: bool, elapsed: float, stats: Optional[RequestStats]) -> None:
+    slow_total.inc()
+    now = time.monotonic()
+    with _slow_lock:
+        if now - _slow_logged.get(statement, float("-inf")) < SLOW_LOG_INTERVAL:
+            return
+        _slow_logged[statement] = now
+        _slow_logged.move_to_end(statement)
+        while len(_slow_logged) > SLOW_LOG_MAX_STATEMENTS:
+            _slow_logged.popitem(last=False)
+    plan = None
+    prefix = EXPLAIN.get(conn.dialect.name)
+    if prefix and not executemany and EXPLAINABLE.match(statement):
+        try:
+            # EXPLAIN doesn't run the statement; use a raw cursor so it isn't counted again
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                plan = "\n".join("  " + " | ".join(str(col) for col in row) for row in cursor.fetchall())
+            finally:
+                cursor.close()
+        except Exception as exc:
+            plan = f"  (no plan: {exc})"
+    slow_logger.warning(
+        "Slow statement: %.1f ms%s\n%s\nparams: %.500r%s",
+        elapsed * 1000,
+        f" in {stats.route}" if stats else "",
+        statement,
+        parameters,
+        f"\nplan:\n{plan}" if plan else "",
+    )
+
+
+def report_repeats(stats: RequestStats) -> None:
+    """Log statements that ran often enough in one request to look like an N+1."""
+    for statement, count in stats.repeated.items():
+        if count < settings.sql_repeat_threshold:
+            continue
+        key = (stats.route, statement)
+        if key not in _repeat_counters:
+            _repeat_counters[key] = metrics.counter(
+                "db_repeated_statements_total", "Requests that repeated one statement (sql_debug)", route=stats.route
+            )
+            # new (route, statement) pairs only; the counter keeps counting the rest
+            logger.warning("Possible N+1 in %s: statement ran %d times\n%s", stats.route, count, statement)
+        _repeat_counters[key].inc()
@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=lambda v: v.isoformat())
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, dict):
+            raise ValueError(cursor)
+        return payload
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_page(stmt, created_col, id_col, cursor: Optional[str], limit: int):
+    """Order newest first by (created_at, id) and resume strictly after the cursor.
+
+    Fetches one extra row so the caller can tell whether a next page exists.
+    """
+    payload = decode_cursor(cursor)
+    if payload:
+        try:
+            created_at = datetime.fromisoformat(payload["c"])
+            last_id = int(payload["i"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        stmt = stmt.where(
+            (created_col < created_at) | ((created_col == created_at) & (id_col < last_id))
+        )
+    return stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def split_page(rows: list, limit: int, created: str = "created_at") -> tuple[list, Optional[str]]:
+    """Trim the look-ahead row and build the cursor for the next keyset page.
+
+    ``created`` names the row attribute the page is ordered by, with ``id``.
+    """
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    last = rows[-1]
+    return rows, encode_cursor({"c": getattr(last, created), "i": last.id})
+
+
+def offset_of(cursor: Optional[str]) -> int:
+    """Relevance-ranked results have no stable sort key, so they page by offset."""
+    payload = decode_cursor(cursor)
+    if not payload:
+        return 0
+    try:
+        return max(int(payload["o"]), 0)
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
@@ -0,0 +1,105 @@
+"""bcrypt hashing on a dedicated process pool, so a burst of logins can't occupy the
+threadpool that serves pages and play pings."""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from ..config import settings
+from . import metrics
+
+hash_seconds = metrics.histogram("auth_hash_seconds", "Time to hash a password, queueing included")
+verify_seconds = metrics.histogram("auth_verify_seconds", "Time to verify a password, queueing included")
+rehashed_total = metrics.counter("auth_rehashed_total", "Stored hashes upgraded to the current cost on login")
+busy_total = metrics.counter("auth_busy_total", "Password operations refused because the pool was saturated")
+pending_gauge = metrics.gauge("auth_pending", "Password operations queued or running")
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    # min_rounds makes hashes below the current cost report needs_update on login
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+
+def hash_sync(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def verify_sync(password: str, hashed: str, rounds: int) -> tuple[bool, Optional[str]]:
+    """(matches, replacement hash when the stored one uses outdated parameters)."""
+    try:
+        return _context(rounds).verify_and_update(password, hashed)
+    except ValueError:
+        # not a recognised hash, e.g. the platform account's placeholder
+        return False, None
+
+
+class PasswordHasher:
+    """Async front for bcrypt: at most ``workers`` hashes run at once, and no more than
+    ``max_pending`` wait; beyond that callers get 503 instead of piling up."""
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._dummy_hash: Optional[str] = None
+        pending_gauge.set_function(lambda: self._pending)
+
+    def start(self) -> None:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            busy_total.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-ins in progress, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            # without a pool (CLI, scripts) fall back to a thread
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        began = time.perf_counter()
+        try:
+            return await self._run(hash_sync, password, self.rounds)
+        finally:
+            hash_seconds.observe(time.perf_counter() - began)
+
+    async def verify(self, password: str, hashed: Optional[str]) -> tuple[bool, Optional[str]]:
+        """Check a password; pass ``hashed=None`` for unknown users to spend the same time."""
+        began = time.perf_counter()
+        try:
+            if hashed is None:
+                if self._dummy_hash is None:
+                    self._dummy_hash = await self._run(hash_sync, "dummy password", self.rounds)
+                await self._run(verify_sync, password, self._dummy_hash, self.rounds)
+                return False, None
+            ok, new_hash = await self._run(verify_sync, password, hashed, self.rounds)
+            if new_hash:
+                rehashed_total.inc()
+            return ok, new_hash
+        finally:
+            verify_seconds.observe(time.perf_counter() - began)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.auth_workers, max_pending=settings.auth_max_pending, rounds=settings.bcrypt_rounds
+)
@@ -0,0 +1,144 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlmodel import select
+
+from ..config import settings
+from ..db import engine
+from ..models.play import Play
+from ..models.track import Track
+from . import counters, fragments, metrics
+from .live import live_hub
+
+logger = logging.getLogger(__name__)
+
+queue_depth = metrics.gauge("plays_queue_depth", "Play events waiting to be written")
+enqueued_total = metrics.counter("plays_enqueued_total", "Play events accepted into the buffer")
+rejected_total = metrics.counter("plays_rejected_total", "Play events rejected because the buffer was full")
+flushed_total = metrics.counter("plays_flushed_total", "Play events written to the database")
+dropped_total = metrics.counter("plays_dropped_total", "Play events lost after a failed flush")
+discarded_total = metrics.counter("plays_discarded_total", "Play events skipped because the track was deleted")
+flush_seconds = metrics.histogram("plays_flush_seconds", "Time spent writing one batch of plays")
+flush_batch_size = metrics.histogram(
+    "plays_flush_batch_size", "Plays written per batch", buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+
+
+class PlayBuffer:
+    """Bounded in-process queue of play events drained by a single writer thread.
+
+    Handlers only enqueue; the writer inserts whole batches in one transaction once
+    ``flush_size`` events are collected or ``flush_interval`` seconds have passed.
+    """
+
+    def __init__(self, max_size: int, flush_size: int, flush_interval: float, enqueue_timeout: float):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        queue_depth.set_function(self._queue.qsize)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="play-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the writer and flush whatever is still queued."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(remaining), self.flush_size):
+            self._flush(remaining[start:start + self.flush_size])
+
+    def submit(self, track_id: int, user_id: int | None) -> None:
+        event = {"track_id": track_id, "user_id": user_id, "played_at": datetime.utcnow()}
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # back-pressure: the client may retry later, the writer is behind
+            rejected_total.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Play ingestion is overloaded",
+                headers={"Retry-After": "1"},
+            )
+        enqueued_total.inc()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            # play counts on cached pages may lag by up to fragment_play_staleness
+            fragments.bump_deferred("plays", settings.fragment_play_staleness)
+
+    def _collect(self) -> list[dict]:
+        batch: list[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: list[dict]) -> None:
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                # a track deleted since its plays were queued may already be purged; checked
+                # in the write transaction, so the purger can't remove it in between
+                live = set(
+                    conn.execute(
+                        select(Track.id).where(
+                            Track.id.in_({e["track_id"] for e in batch}), Track.deleted_at == None  # noqa: E711
+                        )
+                    ).scalars()
+                )
+                kept = [e for e in batch if e["track_id"] in live]
+                discarded_total.inc(len(batch) - len(kept))
+                batch = kept
+                if batch:
+                    conn.execute(Play.__table__.insert(), batch)
+                    counters.record_plays(conn, batch)
+        except Exception:
+            dropped_total.inc(len(batch))
+            logger.exception("Failed to flush %d play events", len(batch))
+            return
+        if not batch:
+            return
+        fragments.bump("plays", settings.fragment_play_staleness)
+        live_hub.publish({track_id: (0, plays) for track_id, plays in Counter(e["track_id"] for e in batch).items()})
+        flush_seconds.observe(time.perf_counter() - start)
+        flush_batch_size.observe(len(batch))
+        flushed_total.inc(len(batch))
+
+
+play_buffer = PlayBuffer(
+    max_size=settings.play_queue_size,
+    flush_size=settings.play_flush_size,
+    flush_interval=settings.play_flush_interval,
+    enqueue_timeout=settings.play_enqueue_timeout,
+)
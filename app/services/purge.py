@@ -0,0 +1,193 @@
+"""Purges deleted tracks in the background and garbage-collects their files.
+
+Deleting a track only sets ``Track.deleted_at``; every listing and lookup skips
+tombstoned rows, so the track disappears at once without the request touching its plays.
+The purger then removes what references the track in small transactions (plays, likes
+and per-user rollups ``batch_size`` rows at a time, pausing in between so the single
+SQLite writer is never held for long), marks the track row purged, and finally deletes
+the uploaded blob and its renditions unless a live track still uses them: uploads are
+content-addressed, so identical files share one blob.
+
+Uploads save their row before storing the blob, and the purger moves unreferenced blobs
+aside and checks for references again before deleting them, so an identical file being
+uploaded while its last copy is purged keeps its blob.
+
+The row itself stays as a tombstone (``purged_at`` set, title and artist blanked): SQLite
+would otherwise hand the highest deleted id to the next upload, which would inherit
+plays still buffered for the old track and every cache keyed by track id.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlmodel import Session, delete, select, update
+
+from ..config import settings
+from ..db import engine
+from ..models.audio import TrackAudio
+from ..models.favorite import Favorite
+from ..models.neighbor import TrackNeighbor
+from ..models.play import Play
+from ..models.queue import QueueItem
+from ..models.rendition import Rendition
+from ..models.track import Track
+from . import counters, metrics
+from .counters import user_daily_table
+from .storage import PLATFORM_PREFIX, backend_for
+
+logger = logging.getLogger(__name__)
+
+pending_gauge = metrics.gauge("tracks_purge_pending", "Deleted tracks whose rows and files are not purged yet")
+purged_tracks_total = metrics.counter("tracks_purged_total", "Deleted tracks fully purged")
+purged_rows_total = {
+    table: metrics.counter("track_purge_rows_total", "Rows removed while purging deleted tracks", table=table)
+    for table in ("play", "favorite", "userdailyplays")
+}
+files_deleted_total = metrics.counter("storage_files_deleted_total", "Blobs deleted once no track referenced them")
+files_restored_total = metrics.counter(
+    "storage_files_restored_total", "Blobs put back because an upload referenced them while they were purged"
+)
+
+# unreferenced blobs are renamed to this suffix while the purger checks for references again
+TRASH_SUFFIX = ".purging"
+purge_seconds = metrics.histogram("track_purge_seconds", "Time spent purging one deleted track")
+
+
+class TrackPurger:
+    def __init__(self, interval: float, batch_size: int, pause: float):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="track-purger", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def wake(self) -> None:
+        """Start purging now instead of at the next interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.purge()
+            except Exception:
+                logger.exception("Track purge failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def purge(self) -> int:
+        """Purge every tombstoned track, oldest first; returns how many were fully removed."""
+        with engine.connect() as conn:
+            pending = conn.execute(
+                select(Track.id, Track.filename)
+                .where(Track.deleted_at != None, Track.purged_at == None)  # noqa: E711
+                .order_by(Track.deleted_at)
+            ).all()
+        pending_gauge.set(len(pending))
+        purged = 0
+        for track_id, filename in pending:
+            if self._stop.is_set() or not self.purge_track(track_id, filename):
+                break
+            purged += 1
+            pending_gauge.set(len(pending) - purged)
+        return purged
+
+    def purge_track(self, track_id: int, filename: str) -> bool:
+        """Remove one tombstoned track, its rows and unshared files; False if interrupted by stop."""
+        start = time.perf_counter()
+        for name, table, key in (
+            ("play", Play.__table__, Play.__table__.c.id),
+            ("favorite", Favorite.__table__, Favorite.__table__.c.user_id),
+            ("userdailyplays", user_daily_table, user_daily_table.c.user_id),
+        ):
+            if not self._delete_in_batches(name, table, key, track_id):
+                return False
+
+        with Session(engine) as session:
+            renditions = list(session.exec(select(Rendition.filename).where(Rendition.track_id == track_id)).all())
+            counters.delete_track_counters(session, track_id)
+            session.exec(delete(TrackAudio).where(TrackAudio.track_id == track_id))
+            session.exec(delete(Rendition).where(Rendition.track_id == track_id))
+            session.exec(delete(TrackNeighbor).where(TrackNeighbor.track_id == track_id))
+            session.exec(delete(QueueItem).where(QueueItem.track_id == track_id))
+            session.exec(
+                update(Track).where(Track.id == track_id).values(purged_at=datetime.utcnow(), title="", artist="")
+            )
+            session.commit()
+        self._collect_files(filename, renditions)
+        purged_tracks_total.inc()
+        purge_seconds.observe(time.perf_counter() - start)
+        logger.info("Purged deleted track %s", track_id)
+        return True
+
+    def _delete_in_batches(self, name: str, table, key, track_id: int) -> bool:
+        """Delete ``table`` rows of the track ``batch_size`` at a time (``key`` picks a batch)."""
+        while not self._stop.is_set():
+            with engine.begin() as conn:
+                batch = select(key).where(table.c.track_id == track_id).limit(self.batch_size)
+                count = conn.execute(
+                    delete(table).where(table.c.track_id == track_id, key.in_(batch))
+                ).rowcount
+            purged_rows_total[name].inc(count)
+            if count < self.batch_size:
+                return True
+            time.sleep(self.pause)
+        return False
+
+    def _collect_files(self, filename: str, renditions: list[str]) -> None:
+        """Delete the blob and its renditions unless a live track was uploaded with the same file."""
+        # the platform catalog ships with the app; services.catalog owns those files
+        if filename.startswith(PLATFORM_PREFIX) or self._referenced(filename):
+            return
+        # an upload of the same file may have saved its row since; it stores the blob only
+        # after that, so with the blobs out of the way a second look settles it either way
+        trashed = []
+        for key in [filename, *renditions]:
+            try:
+                if backend_for(key).move(key, key + TRASH_SUFFIX):
+                    trashed.append(key)
+            except Exception:
+                logger.exception("Could not move stored file %s aside", key)
+        keep = self._referenced(filename)
+        for key in trashed:
+            backend = backend_for(key)
+            try:
+                if not keep:
+                    backend.delete(key + TRASH_SUFFIX)
+                    files_deleted_total.inc()
+                elif backend.exists(key):
+                    # the upload already stored its own copy
+                    backend.delete(key + TRASH_SUFFIX)
+                else:
+                    backend.move(key + TRASH_SUFFIX, key)
+                    files_restored_total.inc()
+            except Exception:
+                logger.exception("Could not %s stored file %s", "restore" if keep else "delete", key)
+
+    def _referenced(self, filename: str) -> bool:
+        """Whether a live track uses the blob; rendition keys derive from it, so they go with it."""
+        with engine.connect() as conn:
+            shared = select(Track.id).where(Track.filename == filename, Track.deleted_at == None).limit(1)  # noqa: E711
+            return conn.execute(shared).first() is not None
+
+
+track_purger = TrackPurger(
+    interval=settings.track_purge_interval,
+    batch_size=settings.track_purge_batch_size,
+    pause=settings.track_purge_pause,
+)
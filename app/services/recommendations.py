@@ -0,0 +1,233 @@
+"""Item-to-item recommendations from co-listening.
+
+Users × tracks interactions (likes, plus log-scaled plays from ``UserDailyPlays``, which
+survive play pruning) form a sparse matrix; the cosine similarity between track columns
+gives each track's nearest neighbors. The top ``neighbors_k`` per track are stored in
+``TrackNeighbor`` so requests only read a few rows by primary key.
+
+A background thread refreshes the tracks that were played or liked since the newest
+``computed_at`` every few minutes, and rebuilds everything once a day (unlikes and the
+neighbors of tracks whose listeners moved on are only picked up by the full rebuild).
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..db import engine, read_engine
+from ..models.favorite import Favorite
+from ..models.neighbor import TrackNeighbor
+from ..models.play import Play
+from ..models.stats import UserDailyPlays
+from . import metrics
+from .likes import liked_set
+
+logger = logging.getLogger(__name__)
+
+neighbor_table = TrackNeighbor.__table__
+user_daily_table = UserDailyPlays.__table__
+
+# a like counts as much as ~150 plays of the same track
+LIKE_WEIGHT = 5.0
+# tracks per similarity chunk; bounds the size of the partial product
+CHUNK_SIZE = 1000
+# the for-you feed starts from this many recent likes and most played tracks
+MAX_SEEDS = 50
+SEED_DAYS = 30
+
+refresh_seconds = metrics.histogram("neighbors_refresh_seconds", "Time spent refreshing track neighbors")
+refreshed_total = metrics.counter("neighbors_tracks_refreshed_total", "Tracks whose neighbors were recomputed")
+
+
+def load_interactions(conn):
+    """(user ids, track ids, weights) for every like and every user's plays of a track."""
+    import numpy as np
+
+    likes = conn.execute(select(Favorite.user_id, Favorite.track_id)).all()
+    plays = conn.execute(
+        select(user_daily_table.c.user_id, user_daily_table.c.track_id, func.sum(user_daily_table.c.plays)).group_by(
+            user_daily_table.c.user_id, user_daily_table.c.track_id
+        )
+    ).all()
+    users = np.array([r[0] for r in likes] + [r[0] for r in plays], dtype=np.int64)
+    tracks = np.array([r[1] for r in likes] + [r[1] for r in plays], dtype=np.int64)
+    weights = np.concatenate(
+        [np.full(len(likes), LIKE_WEIGHT), np.log1p(np.array([r[2] for r in plays], dtype=np.float64))]
+    )
+    return users, tracks, weights
+
+
+def track_vectors(users, tracks, weights):
+    """Sorted track ids and the users × tracks matrix with unit-length columns."""
+    import numpy as np
+    from scipy import sparse
+
+    track_ids, cols = np.unique(tracks, return_inverse=True)
+    _, rows = np.unique(users, return_inverse=True)
+    # duplicate (user, track) pairs, i.e. a like and plays, are summed
+    matrix = sparse.csc_matrix((weights, (rows, cols)), shape=(rows.max() + 1, len(track_ids)))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    return track_ids, (matrix @ sparse.diags(1.0 / norms)).tocsc()
+
+
+def top_neighbors(track_ids, vectors, columns, k: int):
+    """Yield (track id, neighbor ids, scores) for the given columns, best first."""
+    import numpy as np
+
+    similarity = (vectors[:, columns].T @ vectors).tocsr()
+    for row, column in enumerate(columns):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        cols = similarity.indices[start:end]
+        scores = similarity.data[start:end]
+        keep = cols != column
+        cols, scores = cols[keep], scores[keep]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            cols, scores = cols[best], scores[best]
+        order = np.lexsort((track_ids[cols], -scores))
+        yield int(track_ids[column]), track_ids[cols[order]].tolist(), scores[order].tolist()
+
+
+class NeighborIndex:
+    def __init__(self, k: int, interval: float, rebuild_interval: float):
+        self.k = k
+        self.interval = interval
+        self.rebuild_interval = rebuild_interval
+        self._last_rebuild = float("-inf")
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        try:
+            import scipy.sparse  # noqa: F401
+        except ImportError:
+            logger.warning("scipy is not installed; similar tracks and the for-you feed are disabled")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="neighbor-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        # a restart shouldn't redo a recent full rebuild: rows it wrote keep its computed_at
+        with read_engine.connect() as conn:
+            oldest = conn.execute(select(func.min(neighbor_table.c.computed_at))).scalar()
+        if oldest is not None:
+            self._last_rebuild = time.monotonic() - (datetime.utcnow() - oldest).total_seconds()
+        while not self._stop.is_set():
+            full = time.monotonic() - self._last_rebuild >= self.rebuild_interval
+            try:
+                self.refresh(full=full)
+            except Exception:
+                logger.exception("Neighbor refresh failed")
+            else:
+                if full:
+                    self._last_rebuild = time.monotonic()
+            self._stop.wait(self.interval)
+
+    def refresh(self, full: bool = False) -> int:
+        """Recompute neighbors of every track (``full``) or of recently active ones; returns the count."""
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        with read_engine.connect() as conn:
+            since = None if full else conn.execute(select(func.max(neighbor_table.c.computed_at))).scalar()
+            if since is not None:
+                dirty = set(
+                    conn.execute(select(Play.track_id).where(Play.played_at > since).distinct()).scalars()
+                ) | set(conn.execute(select(Favorite.track_id).where(Favorite.created_at > since).distinct()).scalars())
+                if not dirty:
+                    return 0
+            users, tracks, weights = load_interactions(conn)
+        if len(tracks) == 0:
+            return 0
+
+        import numpy as np
+
+        track_ids, vectors = track_vectors(users, tracks, weights)
+        if since is None:
+            columns = np.arange(len(track_ids))
+        else:
+            columns = np.flatnonzero(np.isin(track_ids, list(dirty)))
+        for chunk_start in range(0, len(columns), CHUNK_SIZE):
+            if self._stop.is_set():
+                break
+            chunk = columns[chunk_start:chunk_start + CHUNK_SIZE]
+            rows = [
+                {"track_id": track_id, "rank": rank, "neighbor_id": neighbor_id, "score": score, "computed_at": started_at}
+                for track_id, neighbor_ids, scores in top_neighbors(track_ids, vectors, chunk, self.k)
+                for rank, (neighbor_id, score) in enumerate(zip(neighbor_ids, scores), start=1)
+            ]
+            # one short write per chunk, so the writer is not held for the whole build
+            with engine.begin() as conn:
+                conn.execute(delete(neighbor_table).where(neighbor_table.c.track_id.in_(track_ids[chunk].tolist())))
+                if rows:
+                    conn.execute(neighbor_table.insert(), rows)
+        if since is None and not self._stop.is_set():
+            # tracks that lost all their listeners
+            with engine.begin() as conn:
+                conn.execute(delete(neighbor_table).where(neighbor_table.c.computed_at < started_at))
+        refresh_seconds.observe(time.perf_counter() - start)
+        refreshed_total.inc(len(columns))
+        return len(columns)
+
+
+def similar_tracks(db: Session, track_id: int, limit: int) -> list[tuple[int, float]]:
+    """(track id, similarity) of the precomputed neighbors, best first."""
+    return db.exec(
+        select(TrackNeighbor.neighbor_id, TrackNeighbor.score)
+        .where(TrackNeighbor.track_id == track_id)
+        .order_by(TrackNeighbor.rank)
+        .limit(limit)
+    ).all()
+
+
+def for_you(db: Session, user_id: int, limit: int) -> list[tuple[int, float]]:
+    """Neighbors of the user's recent likes and most played tracks, minus what they already like."""
+    seeds: Counter = Counter()
+    for track_id in db.exec(
+        select(Favorite.track_id).where(Favorite.user_id == user_id).order_by(Favorite.created_at.desc()).limit(MAX_SEEDS)
+    ).all():
+        seeds[track_id] += LIKE_WEIGHT
+    plays = func.sum(user_daily_table.c.plays)
+    since = datetime.utcnow().date() - timedelta(days=SEED_DAYS)
+    for track_id, count in db.exec(
+        select(user_daily_table.c.track_id, plays)
+        .where(user_daily_table.c.user_id == user_id, user_daily_table.c.day >= since)
+        .group_by(user_daily_table.c.track_id)
+        .order_by(plays.desc())
+        .limit(MAX_SEEDS)
+    ).all():
+        seeds[track_id] += math.log1p(count)
+    if not seeds:
+        return []
+
+    scores: Counter = Counter()
+    for track_id, neighbor_id, score in db.exec(
+        select(TrackNeighbor.track_id, TrackNeighbor.neighbor_id, TrackNeighbor.score).where(
+            TrackNeighbor.track_id.in_(list(seeds))
+        )
+    ).all():
+        scores[neighbor_id] += seeds[track_id] * score
+    liked = liked_set(db, user_id)
+    ranked = [(tid, score) for tid, score in scores.most_common() if tid not in seeds and tid not in liked]
+    return ranked[:limit]
+
+
+neighbor_index = NeighborIndex(
+    k=settings.neighbors_k,
+    interval=settings.neighbors_refresh_interval,
+    rebuild_interval=settings.neighbors_rebuild_interval,
+)
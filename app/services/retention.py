@@ -0,0 +1,120 @@
+"""Deletes raw plays past the retention window, and expired batch idempotency keys.
+
+Counters never need the raw rows: every flush already folds plays into ``TrackStats``,
+``TrackDailyPlays`` and ``UserDailyPlays``. Pruning cuts at midnight so a day is either
+fully raw or fully rolled up, records the cut in ``RetentionState`` first (see
+``counters.rebuild_counters``), then deletes oldest-first in small transactions so the
+single SQLite writer is never held for long.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime, time as day_start, timedelta
+
+from sqlalchemy import delete, select
+from sqlmodel import Session
+
+from ..config import settings
+from ..db import engine
+from ..models.play import Play
+from ..models.stats import RetentionState
+from . import metrics
+from .batch import expire_idempotency_keys
+from .charts import MIN_SCORE, PERIODS, STATE, state_table
+from .counters import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+retention_table = RetentionState.__table__
+
+# plays older than this no longer move any chart score above MIN_SCORE
+CHART_HORIZON_DAYS = math.ceil(max(PERIODS.values()) * math.log2(1 / MIN_SCORE) / 86400)
+
+pruned_total = metrics.counter("plays_pruned_total", "Raw play rows deleted by retention")
+prune_seconds = metrics.histogram("plays_prune_seconds", "Time spent on one retention pass")
+
+
+def prune_cutoff(now: datetime, retention_days: int) -> datetime:
+    days = max(retention_days, CHART_HORIZON_DAYS)
+    return datetime.combine(now.date() - timedelta(days=days), day_start())
+
+
+class PlayPruner:
+    def __init__(self, retention_days: int, interval: float, batch_size: int, pause: float):
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="play-pruner", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.prune()
+                with Session(engine) as session:
+                    expire_idempotency_keys(session)
+            except Exception:
+                logger.exception("Play pruning failed")
+
+    def prune(self, now: datetime | None = None) -> int:
+        """Delete raw plays before the cutoff; returns how many rows went."""
+        if not self.retention_days:
+            return 0
+        cutoff = prune_cutoff(now or datetime.utcnow(), self.retention_days)
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            pruned_before = conn.execute(
+                select(retention_table.c.pruned_before).where(retention_table.c.name == "play")
+            ).scalar()
+            # a longer retention can't bring deleted days back
+            cutoff = max(cutoff, pruned_before or cutoff)
+            stmt = upsert_insert(retention_table)
+            conn.execute(
+                stmt.values(name="play", pruned_before=cutoff).on_conflict_do_update(
+                    index_elements=["name"], set_={"pruned_before": stmt.excluded.pruned_before}
+                )
+            )
+        deleted = 0
+        while not self._stop.is_set():
+            with engine.begin() as conn:
+                # leave plays the chart engine has not read yet
+                charted = conn.execute(select(state_table.c.play_id).where(state_table.c.name == STATE)).scalar() or 0
+                batch = (
+                    select(Play.id)
+                    .where(Play.played_at < cutoff, Play.id <= charted)
+                    .order_by(Play.played_at)
+                    .limit(self.batch_size)
+                )
+                count = conn.execute(delete(Play).where(Play.id.in_(batch))).rowcount
+            deleted += count
+            pruned_total.inc(count)
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause)
+        prune_seconds.observe(time.perf_counter() - start)
+        if deleted:
+            logger.info("Pruned %d plays before %s", deleted, cutoff.date())
+        return deleted
+
+
+play_pruner = PlayPruner(
+    retention_days=settings.play_retention_days,
+    interval=settings.play_prune_interval,
+    batch_size=settings.play_prune_batch_size,
+    pause=settings.play_prune_pause,
+)
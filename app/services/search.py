@@ -1,29 +1,155 @@
+import re
 from typing import List, Optional
 
+from sqlalchemy import column, func, literal_column, or_, table, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, select
 
 from ..models.track import Track
 from ..models.user import User
+from .pagination import PAGE_SIZE, encode_cursor, keyset_page, offset_of, split_page
 
+# FTS5 shadow tables; rowid is track.id / user.id. Kept in sync by triggers so every
+# write path (upload, update, delete, nickname change, platform seed) is covered.
+track_fts = table("track_fts", column("rowid"), column("title"), column("artist"), column("nickname"))
+user_fts = table("user_fts", column("rowid"), column("nickname"))
 
-def search_tracks(db: Session, query: Optional[str], filter_by: str = "all") -> List[Track]:
-    stmt = select(Track)
+_fts_enabled = False
+
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS track_fts USING fts5("
+    "title, artist, nickname, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_fts USING fts5("
+    "nickname, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    """CREATE TRIGGER IF NOT EXISTS track_fts_ai AFTER INSERT ON track BEGIN
+        INSERT INTO track_fts(rowid, title, artist, nickname)
+        VALUES (new.id, new.title, new.artist, (SELECT nickname FROM "user" WHERE id = new.creator_id));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS track_fts_au AFTER UPDATE OF title, artist, creator_id ON track BEGIN
+        UPDATE track_fts SET title = new.title, artist = new.artist,
+            nickname = (SELECT nickname FROM "user" WHERE id = new.creator_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS track_fts_ad AFTER DELETE ON track BEGIN
+        DELETE FROM track_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_ai AFTER INSERT ON "user" BEGIN
+        INSERT INTO user_fts(rowid, nickname) VALUES (new.id, new.nickname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_au AFTER UPDATE OF nickname ON "user" BEGIN
+        UPDATE user_fts SET nickname = new.nickname WHERE rowid = new.id;
+        UPDATE track_fts SET nickname = new.nickname
+        WHERE rowid IN (SELECT id FROM track WHERE creator_id = new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_fts_ad AFTER DELETE ON "user" BEGIN
+        DELETE FROM user_fts WHERE rowid = old.id;
+    END""",
+]
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """Create the FTS5 index if the database supports it; otherwise searches fall back to LIKE."""
+    global _fts_enabled
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        existed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'track_fts'")
+        ).first()
+        try:
+            for ddl in FTS_SCHEMA:
+                conn.execute(text(ddl))
+        except OperationalError:
+            # sqlite built without fts5
+            return
+        if not existed:
+            _populate(conn)
+    _fts_enabled = True
+
+
+def rebuild_search_index(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM track_fts"))
+        conn.execute(text("DELETE FROM user_fts"))
+        _populate(conn)
+
+
+def _populate(conn) -> None:
+    conn.execute(
+        text(
+            'INSERT INTO track_fts(rowid, title, artist, nickname) '
+            'SELECT track.id, track.title, track.artist, "user".nickname '
+            'FROM track JOIN "user" ON "user".id = track.creator_id'
+        )
+    )
+    conn.execute(text('INSERT INTO user_fts(rowid, nickname) SELECT id, nickname FROM "user"'))
+
+
+def fts_enabled() -> bool:
+    return _fts_enabled
+
+
+def match_expression(query: Optional[str]) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    terms = re.findall(r"\w+", (query or "").lower())
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_tracks(
+    db: Session,
+    query: Optional[str],
+    filter_by: str = "all",
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+) -> tuple[List[Track], Optional[str]]:
+    """One page of tracks plus the cursor for the next page (None on the last page)."""
+    stmt = select(Track).where(Track.deleted_at == None, Track.file_missing == False)  # noqa: E711, E712
     if filter_by == "user":
         stmt = stmt.where(Track.is_platform == False)  # noqa: E712
     elif filter_by == "platform":
         stmt = stmt.where(Track.is_platform == True)  # noqa: E712
 
+    match = match_expression(query) if _fts_enabled else None
+    if match:
+        # bm25 weights: title > artist > creator nickname; lower score is better
+        rank = func.bm25(literal_column("track_fts"), 10.0, 5.0, 1.0)
+        offset = offset_of(cursor)
+        stmt = (
+            stmt.join(track_fts, track_fts.c.rowid == Track.id)
+            .where(literal_column("track_fts").match(match))
+            .order_by(rank, Track.created_at.desc(), Track.id.desc())
+            .offset(offset)
+            .limit(limit + 1)
+        )
+        rows = db.exec(stmt).all()
+        next_cursor = encode_cursor({"o": offset + limit}) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
     if query:
         pattern = f"%{query}%"
-        stmt = stmt.where(Track.title.ilike(pattern))
-
-    stmt = stmt.order_by(Track.created_at.desc()).limit(50)
-    return db.exec(stmt).all()
+        stmt = stmt.join(User, User.id == Track.creator_id).where(
+            or_(Track.title.ilike(pattern), Track.artist.ilike(pattern), User.nickname.ilike(pattern))
+        )
+    stmt = keyset_page(stmt, Track.created_at, Track.id, cursor, limit)
+    return split_page(db.exec(stmt).all(), limit)
 
 
 def search_profiles(db: Session, nickname_query: Optional[str]) -> List[User]:
     if not nickname_query:
         return []
+    match = match_expression(nickname_query) if _fts_enabled else None
+    if match:
+        stmt = (
+            select(User)
+            .join(user_fts, user_fts.c.rowid == User.id)
+            .where(literal_column("user_fts").match(match))
+            .order_by(func.bm25(literal_column("user_fts")))
+            .limit(20)
+        )
+        return db.exec(stmt).all()
     pattern = f"%{nickname_query}%"
     stmt = select(User).where(User.nickname.ilike(pattern)).limit(20)
     return db.exec(stmt).all()
@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+
+from ..config import settings
+from . import metrics
+from .lru import TTLCache
+
+lookups_total = {
+    source: metrics.counter("current_user_lookups_total", "Signed-in user resolutions by where they were answered", source=source)
+    # request: already resolved in this request; cookie: signed payload; cache: process cache; database: miss
+    for source in ("request", "cookie", "cache", "database")
+}
+cache_size = metrics.gauge("user_cache_size", "Users held in the process-level cache")
+
+
+@dataclass(frozen=True)
+class SessionUser:
+    """What handlers and templates need about the signed-in user.
+
+    Cheap to cache and to rebuild from the cookie; load the ``User`` row when you need more.
+    """
+
+    id: int
+    nickname: str
+
+
+# resolved users; a nickname changed in another worker is picked up within the TTL
+user_cache: TTLCache[int, SessionUser] = TTLCache(
+    max_size=settings.user_cache_size, ttl=settings.user_cache_ttl, size_gauge=cache_size
+)
@@ -1,22 +1,323 @@
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
 from pathlib import Path
-import shutil
-from uuid import uuid4
-from fastapi import UploadFile
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from ..config import settings
+from .audio import _frame
 
 # Root for storing uploaded MP3 files
 UPLOAD_ROOT = Path(__file__).resolve().parent.parent / "static" / "uploads"
 UPLOAD_ROOT.mkdir(parents=True, exist_ok=True)
+# partial uploads live on the same filesystem so the final rename is atomic
+INCOMING_ROOT = UPLOAD_ROOT / ".incoming"
+INCOMING_ROOT.mkdir(exist_ok=True)
+# the platform catalog ships with the app and is always served from local disk
+PLATFORM_PREFIX = "platform/"
+
+CHUNK_SIZE = 1024 * 1024
+# how far past the ID3 tag we look for the first MPEG frame header
+SYNC_SCAN_BYTES = 4096
+# one header-shaped 4 bytes turns up in about half of all random 8 KB blobs; a run of
+# frames, each header where the previous frame's length says, does not
+SYNC_FRAMES = 3
+# longest MPEG audio frame: layer II at 160 kbps and 8 kHz
+MAX_FRAME_BYTES = 2881
+
+_SHARDED_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[^/]+$")
+
+
+def shard_key(name: str) -> str:
+    """Spread files over 65536 directories by hash prefix: ``ab/cd/<name>``."""
+    prefix = name[:4].lower()
+    if not re.fullmatch(r"[0-9a-f]{4}", prefix):
+        prefix = hashlib.sha1(name.encode()).hexdigest()[:4]
+    return f"{prefix[:2]}/{prefix[2:4]}/{name}"
+
+
+def is_sharded(key: str) -> bool:
+    return bool(_SHARDED_RE.match(key))
+
+
+class StorageBackend(ABC):
+    """Where uploaded blobs live. Keys are the values stored in ``Track.filename``."""
+
+    @abstractmethod
+    def put(self, src: Path, key: str) -> None:
+        """Move a finished local file to ``key``; keeps the existing blob if the key is taken."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def move(self, key: str, new_key: str) -> bool:
+        """Rename a blob, replacing ``new_key``; False if there was no blob at ``key``."""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        ...
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path for zero-copy serving, or None when the blob is remote."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: Path, url_prefix: str = "/static/uploads"):
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"invalid stored filename: {key!r}")
+        return path
+
+    def put(self, src: Path, key: str) -> None:
+        dest = self._path(key)
+        if dest.exists():
+            src.unlink()
+            return
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # mkstemp creates 0600 files; stored audio must stay readable by the web server
+        os.chmod(src, 0o644)
+        os.replace(src, dest)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def move(self, key: str, new_key: str) -> bool:
+        try:
+            os.replace(self._path(key), self._path(new_key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def url(self, key: str) -> str:
+        return f"{self.url_prefix}/{key}"
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible bucket (AWS, MinIO, moto server, ...) selected with ``storage_backend=s3``.
+
+    Point ``s3_endpoint_url`` at a local stand-in to exercise it without AWS;
+    credentials come from the usual AWS environment variables.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        public_url: Optional[str] = None,
+    ):
+        try:
+            import boto3
+        except ImportError as exc:  # optional dependency
+            raise RuntimeError("storage_backend=s3 requires the boto3 package") from exc
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.public_url = public_url.rstrip("/") if public_url else None
+
+    def _object(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put(self, src: Path, key: str) -> None:
+        if not self.exists(key):
+            self.client.upload_file(
+                str(src),
+                self.bucket,
+                self._object(key),
+                ExtraArgs={"ContentType": "audio/mpeg", "CacheControl": "public, max-age=31536000, immutable"},
+            )
+        src.unlink()
 
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
 
-def save_mp3(file: UploadFile) -> str:
-    """Save uploaded MP3 with a unique filename, return stored filename."""
-    ext = Path(file.filename).suffix or ".mp3"
-    filename = f"{uuid4().hex}{ext}"
-    dest = UPLOAD_ROOT / filename
-    with dest.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return filename
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object(key))
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object(key))
+
+    def move(self, key: str, new_key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=self._object(new_key),
+                CopySource={"Bucket": self.bucket, "Key": self._object(key)},
+            )
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        self.delete(key)
+        return True
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{self._object(key)}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._object(key)}, ExpiresIn=3600
+        )
+
+
+def build_storage() -> StorageBackend:
+    if settings.storage_backend == "s3":
+        if not settings.s3_bucket:
+            raise RuntimeError("storage_backend=s3 requires s3_bucket")
+        return S3Storage(settings.s3_bucket, settings.s3_prefix, settings.s3_endpoint_url, settings.s3_public_url)
+    if settings.storage_backend != "local":
+        raise RuntimeError(f"unknown storage_backend: {settings.storage_backend!r}")
+    return LocalStorage(UPLOAD_ROOT)
+
+
+storage = build_storage()
+platform_storage = LocalStorage(UPLOAD_ROOT)
+
+
+def backend_for(key: str) -> StorageBackend:
+    return platform_storage if key.startswith(PLATFORM_PREFIX) else storage
+
+
+async def receive_mp3(file: UploadFile) -> tuple[Path, str]:
+    """Stream an upload to a temporary file; returns it and its storage key, from the SHA-256.
+
+    Identical uploads map to the same key, so re-uploads reuse the existing blob. Save the
+    track row before ``storage.put``: services.purge only deletes blobs no live row names.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=INCOMING_ROOT, suffix=".part")
+    tmp_path = Path(tmp_name)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.max_upload_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File is too large"
+                    )
+                await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+            await run_in_threadpool(_sync, buffer)
+        if not await run_in_threadpool(looks_like_mp3, tmp_path):
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Not a valid MP3 file")
+        return tmp_path, shard_key(f"{digest.hexdigest()}.mp3")
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _write_chunk(buffer, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    buffer.write(chunk)
+
+
+def _sync(buffer) -> None:
+    buffer.flush()
+    os.fsync(buffer.fileno())
+
+
+def looks_like_mp3(path: Path) -> bool:
+    """Check for ``SYNC_FRAMES`` back-to-back MPEG audio frames after any leading ID3v2 tags."""
+    with path.open("rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        offset = 0
+        # some taggers stack several tags; each header must be well formed and fit the file
+        while (header := fh.read(10))[:3] == b"ID3":
+            tag_size = id3_tag_size(header)
+            if tag_size is None or offset + tag_size > size:
+                return False
+            offset += tag_size
+            fh.seek(offset)
+        fh.seek(offset)
+        window = fh.read(SYNC_SCAN_BYTES + SYNC_FRAMES * MAX_FRAME_BYTES)
+    return any(frames_follow(window, pos) for pos in range(min(len(window), SYNC_SCAN_BYTES)))
+
+
+def id3_tag_size(header: bytes) -> Optional[int]:
+    """Bytes taken by the ID3v2 tag this 10-byte header starts, or None if it is malformed."""
+    if len(header) < 10 or header[3] not in (2, 3, 4) or header[4] == 0xFF or any(b & 0x80 for b in header[6:10]):
+        return None
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    return 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+def frames_follow(data: bytes, pos: int) -> bool:
+    """Whether ``SYNC_FRAMES`` frames with one sample rate start at ``pos``, each where the last ended."""
+    sample_rate = None
+    for _ in range(SYNC_FRAMES):
+        frame = _frame(data, pos)
+        if frame is None or frame[0] <= 0 or sample_rate not in (None, frame[2]):
+            return False
+        sample_rate = frame[2]
+        pos += frame[0]
+    return True
 
 
 def file_url(filename: str) -> str:
-    return f"/static/uploads/{filename}"
+    return backend_for(filename).url(filename)
+
+
+def file_path(filename: str) -> Optional[Path]:
+    """Local path of a stored file, or None when it lives in a remote backend."""
+    return backend_for(filename).local_path(filename)
+
+
+def migrate_layout(db) -> tuple[int, int]:
+    """Move legacy flat uploads into the sharded layout of the configured backend.
+
+    Returns (blobs moved, blobs missing on disk). Tracks sharing a blob are updated together.
+    """
+    from sqlalchemy import update
+    from sqlmodel import select
+
+    from ..models.track import Track
+
+    remote = not isinstance(storage, LocalStorage)
+    moved = missing = 0
+    # purged tracks keep their row but not their blob
+    filenames = db.exec(select(Track.filename).where(Track.purged_at == None).distinct()).all()  # noqa: E711
+    for old_key in filenames:
+        if old_key.startswith(PLATFORM_PREFIX):
+            continue
+        new_key = old_key if is_sharded(old_key) else shard_key(old_key)
+        src = UPLOAD_ROOT / old_key
+        if new_key == old_key and not (remote and src.exists()):
+            continue
+        if src.exists():
+            storage.put(src, new_key)
+            moved += 1
+        elif not storage.exists(new_key):
+            missing += 1
+            continue
+        if new_key != old_key:
+            db.exec(update(Track).where(Track.filename == old_key).values(filename=new_key))
+            db.commit()
+    return moved, missing
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from fastapi import HTTPException, Request, status
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from . import metrics
+
+CHUNK_SIZE = 64 * 1024
+# /tracks/{id}/stream switches to a rendition once one is ready and 404s once the track is
+# deleted, so clients revalidate every time; the ETag keeps that to a 304 while nothing changed
+CACHE_CONTROL = "no-cache"
+
+streams_total = metrics.counter("stream_requests_total", "Audio stream responses started")
+stream_bytes_total = metrics.counter("stream_bytes_total", "Audio bytes sent to clients")
+not_modified_total = metrics.counter("stream_not_modified_total", "Audio requests answered with 304")
+stream_seconds = metrics.histogram("stream_duration_seconds", "Time to send one audio response")
+stream_throughput = metrics.histogram(
+    "stream_throughput_bytes_per_second",
+    "Per-stream send rate",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6),
+)
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Return the inclusive byte range requested, or None to send the whole file.
+
+    Only single ranges are honoured; multi-range requests get the full body.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise _unsatisfiable(size)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or start > end:
+        raise _unsatisfiable(size)
+    return start, min(end, size - 1)
+
+
+def _unsatisfiable(size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        detail="Range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"},
+    )
+
+
+def validators(path: Path, stat: os.stat_result) -> tuple[str, str]:
+    name = hashlib.blake2b(path.name.encode(), digest_size=8).hexdigest()
+    etag = f'"{name}-{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    return etag, formatdate(stat.st_mtime, usegmt=True)
+
+
+def _not_modified(request: Request, etag: str, stat: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(stat.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def stream_file(request: Request, path: Path, media_type: str = "audio/mpeg") -> Response:
+    """Serve a file with conditional GET and single byte-range support."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio file not found")
+    etag, last_modified = validators(path, stat)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": CACHE_CONTROL,
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    }
+    if _not_modified(request, etag, stat):
+        not_modified_total.inc()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() in (etag, last_modified):
+        byte_range = parse_range(request.headers.get("range"), stat.st_size)
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+    else:
+        start, end = 0, stat.st_size - 1
+        status_code = status.HTTP_200_OK
+    return FileRangeResponse(
+        path,
+        start,
+        end,
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+        send_body=request.method != "HEAD",
+    )
+
+
+class FileRangeResponse(Response):
+    """Send bytes [start, end] of a file, using zero-copy sendfile when the server offers it."""
+
+    def __init__(
+        self,
+        path: Path,
+        start: int,
+        end: int,
+        status_code: int,
+        headers: dict,
+        media_type: str,
+        send_body: bool = True,
+    ):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.length = max(end - start + 1, 0)
+        self.send_body = send_body
+        self.headers["content-length"] = str(self.length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        streams_total.inc()
+        began = time.perf_counter()
+        sent = 0
+        try:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                with open(self.path, "rb") as fh:
+                    await send(
+                        {
+                            "type": "http.response.zerocopysend",
+                            "file": fh.fileno(),
+                            "offset": self.start,
+                            "count": self.length,
+                        }
+                    )
+                sent = self.length
+            else:
+                async with await anyio.open_file(self.path, mode="rb") as fh:
+                    await fh.seek(self.start)
+                    remaining = self.length
+                    while remaining:
+                        chunk = await fh.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        remaining -= len(chunk)
+                        sent += len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                    if remaining:
+                        # file shrank underneath us; close the body anyway
+                        await send({"type": "http.response.body", "body": b""})
+        finally:
+            elapsed = time.perf_counter() - began
+            stream_bytes_total.inc(sent)
+            stream_seconds.observe(elapsed)
+            if elapsed > 0 and sent:
+                stream_throughput.observe(sent / elapsed)
@@ -0,0 +1,72 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from fastapi import HTTPException, status
+
+from . import metrics
+
+throttled_total = metrics.counter("auth_throttled_total", "Login attempts refused after too many failures")
+
+
+class FailureLimiter:
+    """Sliding-window count of failed attempts per key (a nickname or a client IP).
+
+    Only failures are recorded, so a user who types the password correctly is never slowed
+    down. The oldest keys are evicted beyond ``max_keys`` to bound memory.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 100_000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._failures: OrderedDict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key: str, now: float):
+        failures = self._failures.get(key)
+        if failures is None:
+            return None
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[key]
+            return None
+        return failures
+
+    def retry_after(self, key: str) -> float:
+        """Seconds until ``key`` may try again; 0 when it is not blocked."""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent(key, now)
+            if failures is None or len(failures) < self.limit:
+                return 0
+            return failures[-self.limit] + self.window - now
+
+    def fail(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            failures = self._recent(key, now)
+            if failures is None:
+                failures = self._failures[key] = deque(maxlen=self.limit)
+            failures.append(now)
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+def check(*limited: tuple[FailureLimiter, str]) -> None:
+    """Raise 429 if any (limiter, key) pair is over its failure budget."""
+    wait = max(limiter.retry_after(key) for limiter, key in limited)
+    if wait > 0:
+        throttled_total.inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed attempts, try again later",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
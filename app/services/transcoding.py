@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from sqlmodel import Session, select
+
+from ..config import settings
+from ..db import engine
+from ..models.audio import TrackAudio
+from ..models.rendition import Rendition
+from ..models.track import Track
+from . import metrics
+from .audio import scan_frames
+from .storage import INCOMING_ROOT, file_path, is_sharded, shard_key, storage
+
+logger = logging.getLogger(__name__)
+
+# kbps per rung, lowest first
+LADDER = {"low": 64, "medium": 128, "high": 192}
+QUALITIES = tuple(LADDER)
+# a rung is only worth producing if it saves at least this share of the source bitrate
+MIN_SAVING = 0.15
+# request headers that pick the rendition; browsers send ECT/Downlink once a page opts in via Accept-CH
+CLIENT_HINTS = "Save-Data, ECT, Downlink"
+
+transcoded_total = metrics.counter("transcode_renditions_total", "Renditions produced")
+transcode_failed_total = metrics.counter("transcode_failed_total", "Tracks whose transcoding failed")
+transcode_seconds = metrics.histogram(
+    "transcode_seconds", "Time to produce all renditions of one track", buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+transcode_pending = metrics.gauge("transcode_pending", "Tracks queued or being transcoded")
+served_total = {
+    quality: metrics.counter("rendition_served_total", "Audio stream requests by delivered quality", quality=quality)
+    for quality in (*QUALITIES, "original")
+}
+
+
+def rendition_key(source_key: str, quality: str, version: str = "") -> str:
+    """Renditions of a content-addressed upload sit next to it: ``ab/cd/<sha>.low.mp3``.
+
+    Platform files are not content-addressed, so their renditions hash the filename plus
+    ``version`` (mtime and size): an edited file gets new keys instead of the old blobs.
+    """
+    if is_sharded(source_key):
+        stem = Path(source_key).stem
+    else:
+        stem = hashlib.sha256(f"{source_key}:{version}".encode()).hexdigest()
+    return shard_key(f"{stem}.{quality}.mp3")
+
+
+def rungs_for(source_bitrate: Optional[int]) -> list[str]:
+    if not source_bitrate:
+        return list(QUALITIES)
+    return [q for q, kbps in LADDER.items() if kbps <= source_bitrate * (1 - MIN_SAVING)]
+
+
+def encode(ffmpeg: str, src: Path, dest: Path, kbps: int) -> None:
+    subprocess.run(
+        [
+            ffmpeg, "-v", "error", "-y", "-i", str(src),
+            "-map", "0:a:0", "-map_metadata", "-1",
+            "-c:a", "libmp3lame", "-b:a", f"{kbps}k", "-f", "mp3", str(dest),
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+
+class Transcoder:
+    """Job queue that builds the bitrate ladder for each track with a pool of ffmpeg workers.
+
+    The heavy lifting happens in the ffmpeg subprocess, so plain threads are enough to
+    keep ``workers`` encodes running in parallel.
+    """
+
+    def __init__(self, workers: int, ffmpeg: str):
+        self.workers = workers
+        self.ffmpeg = ffmpeg
+        self._pool: ThreadPoolExecutor | None = None
+        self._pending: set[int] = set()
+        self._lock = threading.Lock()
+        transcode_pending.set_function(lambda: len(self._pending))
+
+    def start(self) -> None:
+        if self._pool:
+            return
+        if shutil.which(self.ffmpeg) is None:
+            logger.warning("ffmpeg not found at %r; serving original files only", self.ffmpeg)
+            return
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcode")
+        threading.Thread(target=self._backfill, name="transcode-backfill", daemon=True).start()
+
+    def stop(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, track_id: int, filename: str) -> bool:
+        pool = self._pool
+        if pool is None:
+            return False
+        with self._lock:
+            if track_id in self._pending:
+                return False
+            self._pending.add(track_id)
+        try:
+            pool.submit(self._run, track_id, filename)
+        except RuntimeError:
+            self._pending.discard(track_id)
+            return False
+        return True
+
+    def _run(self, track_id: int, filename: str) -> None:
+        began = time.perf_counter()
+        try:
+            self.transcode(track_id, filename)
+        except Exception:
+            transcode_failed_total.inc()
+            logger.exception("Transcoding failed for track %s", track_id)
+        finally:
+            self._pending.discard(track_id)
+            transcode_seconds.observe(time.perf_counter() - began)
+
+    def transcode(self, track_id: int, filename: str) -> list[Rendition]:
+        src = file_path(filename)
+        if src is None or not src.exists():
+            # remote sources would need a download first; leave them on the original
+            return []
+        with Session(engine) as session:
+            audio = session.get(TrackAudio, track_id)
+            source_bitrate = audio.bitrate if audio and audio.bitrate else _probe_bitrate(src)
+            done = set(session.exec(select(Rendition.quality).where(Rendition.track_id == track_id)).all())
+        stat = src.stat()
+        version = f"{stat.st_mtime_ns}:{stat.st_size}"
+        made = []
+        for quality in rungs_for(source_bitrate):
+            if quality in done:
+                continue
+            key = rendition_key(filename, quality, version)
+            fd, tmp_name = tempfile.mkstemp(dir=INCOMING_ROOT, suffix=".mp3")
+            os.close(fd)
+            tmp = Path(tmp_name)
+            try:
+                encode(self.ffmpeg, src, tmp, LADDER[quality])
+                size = tmp.stat().st_size
+                storage.put(tmp, key)
+            finally:
+                tmp.unlink(missing_ok=True)
+            made.append(Rendition(track_id=track_id, quality=quality, filename=key, bitrate=LADDER[quality], size=size))
+            transcoded_total.inc()
+        if made:
+            with Session(engine) as session:
+                track = session.get(Track, track_id)
+                if track is None or track.deleted_at is not None:
+                    return []
+                for rendition in made:
+                    session.merge(rendition)
+                session.commit()
+        return made
+
+    def _backfill(self) -> None:
+        last_id = 0
+        while self._pool is not None:
+            with Session(engine) as session:
+                rows = session.exec(
+                    select(Track.id, Track.filename)
+                    .outerjoin(Rendition, Rendition.track_id == Track.id)
+                    .outerjoin(TrackAudio, TrackAudio.track_id == Track.id)
+                    .where(Rendition.track_id == None, Track.id > last_id)  # noqa: E711
+                    .where(Track.deleted_at == None, Track.file_missing == False)  # noqa: E711, E712
+                    # tracks already at or below the lowest rung have nothing to gain
+                    .where((TrackAudio.bitrate == None) | (TrackAudio.bitrate > min(LADDER.values())))  # noqa: E711
+                    .order_by(Track.id)
+                    .limit(200)
+                ).all()
+            if not rows:
+                return
+            for track_id, filename in rows:
+                # keep the queue short so uploads don't wait behind the whole catalog
+                while len(self._pending) >= self.workers * 2 and self._pool is not None:
+                    time.sleep(0.5)
+                self.submit(track_id, filename)
+            last_id = rows[-1][0]
+
+
+def _probe_bitrate(path: Path) -> Optional[int]:
+    with path.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return scan_frames(data).get("bitrate")
+
+
+def preferred_quality(request: Request, quality: Optional[str]) -> str:
+    """Quality asked for explicitly with ``?quality=`` or inferred from network client hints."""
+    if quality is not None:
+        if quality != "original" and quality not in LADDER:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"quality must be one of: original, {', '.join(QUALITIES)}",
+            )
+        return quality
+    headers = request.headers
+    if headers.get("save-data", "").strip().lower() == "on":
+        return "low"
+    ect = headers.get("ect", "").strip().lower()
+    if ect in ("slow-2g", "2g"):
+        return "low"
+    if ect == "3g":
+        return "medium"
+    try:
+        downlink = float(headers.get("downlink", ""))
+    except ValueError:
+        downlink = None
+    if downlink is not None:
+        if downlink < 0.5:
+            return "low"
+        if downlink < 1.5:
+            return "medium"
+    return "high"
+
+
+def pick_rendition(renditions: list[Rendition], wanted: str) -> Optional[Rendition]:
+    """The rendition to serve, or None for the original.
+
+    A missing rung means the source is already at or below it (or not transcoded yet),
+    so the original is the right answer rather than a lower rung.
+    """
+    return next((r for r in renditions if r.quality == wanted), None)
+
+
+transcoder = Transcoder(workers=settings.transcode_workers, ffmpeg=settings.ffmpeg_path)
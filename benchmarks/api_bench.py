@@ -0,0 +1,104 @@
+"""Compare the dict/jsonable_encoder JSON path with the compact /api/v1 endpoints.
+
+Part one times serialization alone for a page of track dicts; part two drives both
+profile endpoints in-process, uncached and cached, and reports body sizes per encoding.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.api_bench --tracks 20000 --requests 300
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+
+def timed(fn, repeat: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(int(len(timings) * 0.99), len(timings) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp()) / "api.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["FFMPEG_PATH"] = "/nonexistent/ffmpeg"
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, select
+
+    from app.db import create_db_and_tables, engine
+    from app.main import app
+    from app.models.user import User
+    from app.routers import api
+    from app.routers.profiles import profile_payload
+    from app.services import counters, fragments
+    from benchmarks.search_bench import populate
+
+    create_db_and_tables()
+    populate(engine, args.tracks, args.users, random.Random(args.seed))
+    with Session(engine) as session:
+        counters.rebuild_counters(session)
+        # the most prolific creator, so pages are full
+        user = session.exec(select(User).where(User.id == 1)).one()
+        payload = profile_payload(session, user, None, None, args.limit)
+
+    print(f"serializing {len(payload['uploaded'])} tracks")
+    for label, fn in [
+        ("jsonable_encoder + json", lambda: json.dumps(jsonable_encoder(payload)).encode()),
+        ("orjson, all fields", lambda: api.orjson.dumps(api.compact_profile(payload, api.TRACK_FIELDS))),
+        ("orjson, id,title", lambda: api.orjson.dumps(api.compact_profile(payload, ("id", "title")))),
+    ]:
+        p50, p99 = timed(fn, args.requests)
+        print(f"  {label:<26} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+
+    body = api.orjson.dumps(api.compact_profile(payload, api.TRACK_FIELDS))
+    sizes = {"identity": len(body), "gzip": len(gzip.compress(body, compresslevel=6))}
+    if api.brotli is not None:
+        sizes["br"] = len(api.brotli.compress(body, quality=4))
+    print("  body bytes: " + ", ".join(f"{k} {v}" for k, v in sizes.items()))
+
+    nickname = user.nickname
+    with TestClient(app) as client:
+        cases = [
+            ("/api/profiles (dicts)", f"/api/profiles/{nickname}?limit={args.limit}", None),
+            ("/api/v1 uncached", f"/api/v1/profiles/{nickname}?limit={args.limit}", "bump"),
+            ("/api/v1 cached", f"/api/v1/profiles/{nickname}?limit={args.limit}", None),
+            ("/api/v1 cached, gzip", f"/api/v1/profiles/{nickname}?limit={args.limit}", "gzip"),
+            ("/api/v1 If-None-Match", f"/api/v1/profiles/{nickname}?limit={args.limit}", "etag"),
+        ]
+        print(f"requests against a {args.tracks}-track catalog")
+        for label, url, mode in cases:
+            etag = client.get(url).headers.get("etag")
+
+            def request():
+                if mode == "bump":
+                    fragments.fragment_cache.bump()
+                headers = {"Accept-Encoding": "gzip"} if mode == "gzip" else {}
+                if mode == "etag":
+                    headers["If-None-Match"] = etag
+                client.get(url, headers=headers)
+
+            p50, p99 = timed(request, args.requests)
+            print(f"  {label:<26} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Bulk synthetic data for benchmarks: users, tracks, plays and likes with realistic skew.
+
+Creators, listeners and tracks all follow power laws (a few prolific uploaders, a few
+heavy listeners, a few hits), plays are spread over the last ``days`` days in id order,
+and the counters, rollups, search index and charts are rebuilt from the generated rows
+the same way ``python -m app.manage`` would. Millions of plays take seconds: rows are
+built with numpy and written with executemany over the raw SQLite connection.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.datagen --scale medium --db /tmp/pulse-medium.db
+"""
+import argparse
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+CHUNK = 200_000
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    tracks: int
+    plays: int
+    favorites: int
+    days: int = 90
+
+
+SCALES = {
+    "tiny": Scale(users=200, tracks=2_000, plays=20_000, favorites=5_000),
+    "small": Scale(users=2_000, tracks=20_000, plays=500_000, favorites=50_000),
+    "medium": Scale(users=20_000, tracks=100_000, plays=5_000_000, favorites=500_000),
+    "large": Scale(users=100_000, tracks=500_000, plays=20_000_000, favorites=2_000_000),
+}
+
+
+def zipf_choice(np_rng, n: int, size: int, exponent: float):
+    """``size`` indices in [0, n) where index i has weight 1 / (i + 1) ** exponent."""
+    import numpy as np
+
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    cumulative = np.cumsum(weights)
+    return np.searchsorted(cumulative, np_rng.random(size) * cumulative[-1])
+
+
+def timestamps(np_rng, end: datetime, days: float, size: int) -> list[str]:
+    """Sorted timestamps in the ``days`` before ``end``, in SQLAlchemy's SQLite format, oldest first."""
+    import numpy as np
+
+    offsets = np.sort(np_rng.integers(0, max(int(days * 86_400_000_000), 1), size))[::-1]
+    end = np.datetime64(end, "us")
+    return [s.replace("T", " ") for s in np.datetime_as_string(end - offsets.astype("timedelta64[us]"), unit="us")]
+
+
+def generate(engine, scale: Scale, seed: int = 1, log=print) -> list[str]:
+    """Fill an empty database; returns the vocabulary titles were drawn from."""
+    import numpy as np
+
+    from app.models.audio import TrackAudio
+    from benchmarks.search_bench import word
+
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    now = datetime.utcnow()
+    vocabulary = [word(rng) for _ in range(5000)]
+
+    started = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        # a throwaway database: skip durability while loading
+        cursor.execute("PRAGMA synchronous=OFF")
+        stamp = now.isoformat(sep=" ")
+        cursor.executemany(
+            "INSERT INTO user (id, nickname, hashed_password, created_at) VALUES (?, ?, 'x', ?)",
+            ((i, f"user{i}_{word(rng)}", stamp) for i in range(1, scale.users + 1)),
+        )
+        # a handful of accounts upload most of the catalog
+        creators = zipf_choice(np_rng, scale.users, scale.tracks, 1.1) + 1
+        created = timestamps(np_rng, now, 3 * 365, scale.tracks)
+        cursor.executemany(
+            "INSERT INTO track (id, title, artist, filename, creator_id, is_platform, file_missing, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+            (
+                (
+                    i + 1,
+                    " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))),
+                    rng.choice(vocabulary),
+                    f"{i + 1}.mp3",
+                    int(creators[i]),
+                    rng.random() < 0.1,
+                    created[i],
+                )
+                for i in range(scale.tracks)
+            ),
+        )
+        # the blobs don't exist; mark them so the analyzer doesn't spend the run on them
+        cursor.executemany(
+            f"INSERT INTO {TrackAudio.__tablename__} (track_id, status, analyzed_at) VALUES (?, 'unavailable', ?)",
+            ((i, stamp) for i in range(1, scale.tracks + 1)),
+        )
+        raw.commit()
+        log(f"  {scale.users} users, {scale.tracks} tracks in {time.perf_counter() - started:.1f}s")
+
+        # popularity is independent of upload order
+        popularity = np_rng.permutation(scale.tracks) + 1
+        started = time.perf_counter()
+        for offset in range(0, scale.plays, CHUNK):
+            size = min(CHUNK, scale.plays - offset)
+            tracks = popularity[zipf_choice(np_rng, scale.tracks, size, 1.0)]
+            users = zipf_choice(np_rng, scale.users, size, 0.8) + 1
+            # a fifth of plays are anonymous
+            anonymous = np_rng.random(size) < 0.2
+            # each chunk is the next slice of the time range, so ids stay in time order
+            chunk_end = now - timedelta(days=scale.days * (scale.plays - offset - size) / scale.plays)
+            played = timestamps(np_rng, chunk_end, scale.days * size / scale.plays, size)
+            cursor.executemany(
+                "INSERT INTO play (track_id, user_id, played_at) VALUES (?, ?, ?)",
+                zip(tracks.tolist(), [None if a else u for a, u in zip(anonymous.tolist(), users.tolist())], played),
+            )
+            raw.commit()
+        log(f"  {scale.plays} plays in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        users = zipf_choice(np_rng, scale.users, scale.favorites, 0.9) + 1
+        tracks = popularity[zipf_choice(np_rng, scale.tracks, scale.favorites, 0.9)]
+        pairs = np.unique(users.astype(np.int64) * (scale.tracks + 1) + tracks)
+        liked = timestamps(np_rng, now, scale.days, len(pairs))
+        cursor.executemany(
+            "INSERT INTO favorite (user_id, track_id, created_at) VALUES (?, ?, ?)",
+            zip((pairs // (scale.tracks + 1)).tolist(), (pairs % (scale.tracks + 1)).tolist(), liked),
+        )
+        raw.commit()
+        log(f"  {len(pairs)} favorites in {time.perf_counter() - started:.1f}s")
+    finally:
+        raw.close()
+    return vocabulary
+
+
+def prepare(db_path: Path, scale: Scale, seed: int = 1, log=print) -> None:
+    """Create the schema, generate data and rebuild every derived table.
+
+    Must run before anything imports ``app.db`` with a different DATABASE_URL.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from sqlmodel import Session
+
+    from app import main, migrations  # noqa: F401 - main imports every model, so create_all sees all tables
+    from app.db import create_db_and_tables, engine
+    from app.services import counters, search
+    from app.services.charts import rebuild_charts
+    from app.services.recommendations import neighbor_index
+
+    def rebuild_counters():
+        with Session(engine) as session:
+            counters.rebuild_counters(session)
+
+    create_db_and_tables()
+    migrations.migrate(engine)
+    generate(engine, scale, seed, log)
+    for label, step in [
+        ("counters", rebuild_counters),
+        ("search index", lambda: search.ensure_search_index(engine)),
+        ("charts", rebuild_charts),
+        ("neighbors", lambda: neighbor_index.refresh(full=True)),
+    ]:
+        started = time.perf_counter()
+        step()
+        log(f"  rebuilt {label} in {time.perf_counter() - started:.1f}s")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--db", type=Path, required=True)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.db.exists():
+        raise SystemExit(f"{args.db} already exists")
+    print(f"generating {args.scale} dataset into {args.db}")
+    prepare(args.db, SCALES[args.scale], args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Load test for the live counter WebSocket hub.
+
+Starts the app under uvicorn in-process, opens many client connections that each
+subscribe to a page worth of tracks, and publishes play/like deltas from a background
+thread the way the play writer does. Every client also watches a probe track that gets
+a delta once a second, which gives the publish-to-receive latency. A fraction of the
+clients never read; once their socket buffers fill up (run longer, or lower
+LIVE_SEND_BUFFER) the server drops them instead of queueing without bound.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.live_load --clients 5000 --seconds 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+PROBE_TRACK = 0
+
+
+def publisher(hub, stop: threading.Event, rate: int, tracks: int, probes: list, rng: random.Random) -> None:
+    """Play/like deltas at ``rate`` events per second, in 50 ms bursts like play flushes."""
+    next_probe = time.monotonic()
+    while not stop.is_set():
+        deltas = {}
+        for _ in range(max(rate // 20, 1)):
+            track_id = int(rng.paretovariate(1.2)) % tracks + 1
+            likes, plays = deltas.get(track_id, (0, 0))
+            deltas[track_id] = (likes + (rng.random() < 0.1), plays + 1)
+        hub.publish(deltas)
+        if time.monotonic() >= next_probe:
+            probes.append(time.perf_counter())
+            hub.publish({PROBE_TRACK: (0, 1)})
+            next_probe += 1.0
+        time.sleep(0.05)
+
+
+async def client(url: str, track_ids: list[int], slow: bool, stats: dict, probes: list, stop: asyncio.Event) -> None:
+    import orjson
+    import websockets
+
+    try:
+        async with websockets.connect(url, max_queue=1 if slow else None) as ws:
+            stats["connected"] += 1
+            await ws.send(orjson.dumps({"subscribe": [PROBE_TRACK] + track_ids}).decode())
+            if slow:
+                # never read; the server should drop us once its send queue is full
+                await stop.wait()
+                return
+            while not stop.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                received = time.perf_counter()
+                stats["messages"] += 1
+                entries = orjson.loads(message)["d"]
+                stats["deltas"] += len(entries)
+                if probes and any(entry[0] == PROBE_TRACK for entry in entries):
+                    stats["latency"].append(received - probes[-1])
+    except websockets.ConnectionClosed as exc:
+        stats["closed", exc.rcvd.code if exc.rcvd else None] += 1
+    except OSError:
+        stats["failed"] += 1
+
+
+async def run(args) -> None:
+    import uvicorn
+
+    from app.main import app
+    from app.services import live
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning")
+    server = uvicorn.Server(config)
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    rng = random.Random(args.seed)
+    stats = defaultdict(int, latency=[])
+    probes: list[float] = []
+    stop = asyncio.Event()
+    url = f"ws://127.0.0.1:{args.port}/api/v1/live"
+
+    start = time.perf_counter()
+    clients = []
+    for i in range(args.clients):
+        page = rng.sample(range(1, args.tracks + 1), args.page)
+        clients.append(asyncio.create_task(client(url, page, rng.random() < args.slow, stats, probes, stop)))
+        if i % 200 == 199:
+            await asyncio.sleep(0)
+    while stats["connected"] + stats["failed"] < args.clients and time.perf_counter() - start < 60:
+        await asyncio.sleep(0.1)
+    print(f"{stats['connected']} clients connected in {time.perf_counter() - start:.1f}s ({stats['failed']} failed)")
+
+    publishing = threading.Event()
+    thread = threading.Thread(
+        target=publisher,
+        args=(live.live_hub, publishing, args.rate, args.tracks, probes, random.Random(args.seed + 1)),
+        daemon=True,
+    )
+    thread.start()
+    await asyncio.sleep(args.seconds)
+    publishing.set()
+    thread.join()
+    await asyncio.sleep(live.live_hub.tick * 2)
+    stop.set()
+    await asyncio.gather(*clients, return_exceptions=True)
+
+    latency = sorted(stats["latency"])
+    fanout = live.fanout_seconds.snapshot()
+    print(f"published {args.rate}/s events over {args.seconds}s across {args.tracks} tracks")
+    print(f"  messages received {stats['messages']} ({stats['messages'] / args.seconds:.0f}/s), deltas {stats['deltas']}")
+    if latency:
+        p99 = latency[min(int(len(latency) * 0.99), len(latency) - 1)]
+        print(f"  probe latency p50 {statistics.median(latency) * 1000:.1f} ms   p99 {p99 * 1000:.1f} ms")
+    print(f"  fan-out per tick: {fanout['count']} ticks, mean {fanout['sum'] / max(fanout['count'], 1) * 1000:.2f} ms")
+    print(f"  slow consumers dropped {live.dropped_total.value:.0f}; closes seen by clients: "
+          + ", ".join(f"{key[1]}: {n}" for key, n in stats.items() if isinstance(key, tuple)))
+    server.should_exit = True
+    await serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--tracks", type=int, default=10_000)
+    parser.add_argument("--page", type=int, default=20, help="tracks each client subscribes to")
+    parser.add_argument("--rate", type=int, default=2000, help="play events per second")
+    parser.add_argument("--slow", type=float, default=0.02, help="fraction of clients that never read")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # two sockets per client, both in this process
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if 2 * args.clients + 100 > hard:
+        raise SystemExit(f"--clients {args.clients} needs about {2 * args.clients + 100} file descriptors, limit is {hard}")
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'live.db'}"
+    os.environ["FFMPEG_PATH"] = "/nonexistent/ffmpeg"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Load test: index page under mixed read/write traffic against a real uvicorn server.
+
+Builds a synthetic catalog in a temporary SQLite database, starts the app in a
+subprocess, and drives it with concurrent clients: mostly index and search page views,
+plus play pings and like/unlike toggles from signed-in users.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.load_index --duration 20 --concurrency 32
+    python -m benchmarks.load_index --journal-mode delete   # compare with SQLite's default journal
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# (share of requests, kind)
+MIX = [(0.70, "index"), (0.10, "search"), (0.15, "play"), (0.05, "like")]
+
+
+def populate(db_path: Path, tracks: int, users: int, seed: int, journal_mode: str):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["SQLITE_JOURNAL_MODE"] = journal_mode
+    from app.db import create_db_and_tables, engine
+    from app.deps import serializer
+    from app.models.audio import TrackAudio
+    from app.models.user import User
+    from benchmarks.search_bench import populate as populate_catalog
+
+    rng = random.Random(seed)
+    create_db_and_tables()
+    vocabulary = populate_catalog(engine, tracks, users, rng)
+    with engine.begin() as conn:
+        # the blobs don't exist; mark them so the analyzer doesn't spend the run on them
+        conn.execute(TrackAudio.__table__.insert(), [{"track_id": i, "status": "unavailable"} for i in range(1, tracks + 1)])
+        nicknames = dict(conn.execute(User.__table__.select().with_only_columns(User.id, User.nickname)).all())
+    cookies = [serializer.dumps({"user_id": uid, "nickname": nick}) for uid, nick in nicknames.items()]
+    return vocabulary, cookies
+
+
+async def client(base: str, stop_at: float, tracks: int, vocabulary, cookies, rng, results: dict) -> None:
+    import httpx
+
+    kinds = [kind for _, kind in MIX]
+    weights = [share for share, _ in MIX]
+    async with httpx.AsyncClient(base_url=base, timeout=30) as http:
+        http.cookies.set("music_session", rng.choice(cookies))
+        liked = set()
+        while time.perf_counter() < stop_at:
+            kind = rng.choices(kinds, weights)[0]
+            track_id = rng.randint(1, tracks)
+            began = time.perf_counter()
+            if kind == "index":
+                response = await http.get("/")
+            elif kind == "search":
+                response = await http.get("/", params={"q": rng.choice(vocabulary)[:4]})
+            elif kind == "play":
+                response = await http.post(f"/tracks/{track_id}/play")
+            else:
+                action = "unlike" if track_id in liked else "like"
+                liked ^= {track_id}
+                response = await http.post(f"/tracks/{track_id}/{action}")
+            elapsed = time.perf_counter() - began
+            ok = response.status_code < 400 or response.status_code == 503
+            results.setdefault(kind, []).append(elapsed if ok else None)
+
+
+def report(results: dict, duration: float) -> None:
+    total = sum(len(v) for v in results.values())
+    print(f"{total / duration:8.1f} req/s overall")
+    for kind, samples in sorted(results.items()):
+        timings = sorted(t for t in samples if t is not None)
+        errors = len(samples) - len(timings)
+        if not timings:
+            print(f"{kind:<7} no successful requests ({errors} errors)")
+            continue
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)] * 1000
+        print(f"{kind:<7} {len(samples) / duration:8.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   errors {errors}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--journal-mode", default="wal")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp()) / "load.db"
+    vocabulary, cookies = populate(db_path, args.tracks, args.users, args.seed, args.journal_mode)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "SQLITE_JOURNAL_MODE": args.journal_mode,
+        "FFMPEG_PATH": "/nonexistent/ffmpeg",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env,
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        import httpx
+
+        for _ in range(100):
+            try:
+                httpx.get(base + "/", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.2)
+        results: dict = {}
+        rng = random.Random(args.seed)
+
+        async def run() -> None:
+            stop_at = time.perf_counter() + args.duration
+            await asyncio.gather(
+                *(
+                    client(base, stop_at, args.tracks, vocabulary, cookies, random.Random(rng.random()), results)
+                    for _ in range(args.concurrency)
+                )
+            )
+
+        asyncio.run(run())
+        print(f"journal_mode={args.journal_mode} concurrency={args.concurrency} tracks={args.tracks}")
+        report(results, args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
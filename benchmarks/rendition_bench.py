@@ -0,0 +1,103 @@
+"""Bytes served per play with and without the transcoding ladder.
+
+Encodes the ladder for a set of MP3s (synthetic 320 kbps tones by default), then replays
+a mix of client network hints through the stream endpoint's rendition choice.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.rendition_bench --plays 10000
+    python -m benchmarks.rendition_bench --ffmpeg /path/to/ffmpeg some.mp3 other.mp3
+"""
+import argparse
+import random
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+# share of plays per kind of client, with the request headers it sends
+CLIENTS = [
+    (0.10, {"save-data": "on"}),
+    (0.05, {"ect": "2g"}),
+    (0.20, {"ect": "3g", "downlink": "1.2"}),
+    (0.45, {"ect": "4g", "downlink": "10"}),
+    (0.20, {}),
+]
+
+
+def synthetic_sources(ffmpeg: str, workdir: Path, count: int, seconds: int) -> list[Path]:
+    sources = []
+    for i in range(count):
+        path = workdir / f"source{i}.mp3"
+        subprocess.run(
+            [
+                ffmpeg, "-v", "error", "-y",
+                "-f", "lavfi", "-i", f"sine=frequency={220 + 110 * i}:duration={seconds}",
+                "-f", "lavfi", "-i", f"anoisesrc=amplitude=0.05:duration={seconds}",
+                "-filter_complex", "amix=inputs=2", "-ac", "2",
+                "-c:a", "libmp3lame", "-b:a", "320k", str(path),
+            ],
+            check=True,
+            capture_output=True,
+        )
+        sources.append(path)
+    return sources
+
+
+def request_with(headers: dict):
+    from starlette.requests import Request
+
+    raw = [(name.encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": raw})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sources", nargs="*", type=Path)
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--synthetic", type=int, default=3, help="tones to generate when no sources are given")
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--plays", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from app.models.rendition import Rendition
+    from app.services.transcoding import LADDER, encode, pick_rendition, preferred_quality, rungs_for, _probe_bitrate
+
+    workdir = Path(tempfile.mkdtemp())
+    sources = args.sources or synthetic_sources(args.ffmpeg, workdir, args.synthetic, args.seconds)
+
+    catalog = []
+    for n, src in enumerate(sources):
+        renditions = []
+        start = time.perf_counter()
+        for quality in rungs_for(_probe_bitrate(src)):
+            dest = workdir / f"{n}.{quality}.mp3"
+            encode(args.ffmpeg, src, dest, LADDER[quality])
+            renditions.append(Rendition(track_id=n, quality=quality, filename=str(dest), bitrate=LADDER[quality], size=dest.stat().st_size))
+        elapsed = time.perf_counter() - start
+        sizes = ", ".join(f"{r.quality} {r.size / 1e6:.2f}" for r in renditions)
+        print(f"{src.name}: original {src.stat().st_size / 1e6:.2f} MB; {sizes} MB; encoded in {elapsed:.1f}s")
+        catalog.append((src.stat().st_size, renditions))
+
+    rng = random.Random(args.seed)
+    weights = [share for share, _ in CLIENTS]
+    before = after = 0
+    served = {}
+    for _ in range(args.plays):
+        original_size, renditions = rng.choice(catalog)
+        _, headers = rng.choices(CLIENTS, weights)[0]
+        rendition = pick_rendition(renditions, preferred_quality(request_with(headers), None))
+        before += original_size
+        after += rendition.size if rendition else original_size
+        label = rendition.quality if rendition else "original"
+        served[label] = served.get(label, 0) + 1
+
+    mix = ", ".join(f"{label} {count * 100 / args.plays:.0f}%" for label, count in sorted(served.items()))
+    print(f"{args.plays} plays ({mix})")
+    print(f"original only  {before / 1e9:8.2f} GB")
+    print(f"with ladder    {after / 1e9:8.2f} GB   ({(1 - after / before) * 100:.0f}% less)")
+
+
+if __name__ == "__main__":
+    main()
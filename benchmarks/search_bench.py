@@ -0,0 +1,101 @@
+"""Compare FTS5 and LIKE track search on a synthetic catalog.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.search_bench --tracks 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "no", "te", "su", "vi", "da", "ro", "ze", "pa", "ny", "sha", "bo"]
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def populate(engine, tracks: int, users: int, rng: random.Random) -> list[str]:
+    from app.models.track import Track
+    from app.models.user import User
+
+    vocabulary = [word(rng) for _ in range(5000)]
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(
+            User.__table__.insert(),
+            [{"id": i, "nickname": f"user{i}_{word(rng)}", "hashed_password": "x", "created_at": now} for i in range(1, users + 1)],
+        )
+        batch = []
+        for i in range(1, tracks + 1):
+            batch.append(
+                {
+                    "id": i,
+                    "title": " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))),
+                    "artist": rng.choice(vocabulary),
+                    "filename": f"{i}.mp3",
+                    "creator_id": rng.randint(1, users),
+                    "is_platform": rng.random() < 0.1,
+                    "created_at": now - timedelta(seconds=i),
+                }
+            )
+            if len(batch) == 10000:
+                conn.execute(Track.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(Track.__table__.insert(), batch)
+    return vocabulary
+
+
+def run(label: str, fn, queries: list[str]) -> None:
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<6} mean {statistics.mean(timings):8.2f} ms   p50 {timings[len(timings) // 2]:8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = Path(tempfile.mkdtemp()) / "search_bench.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from sqlmodel import Session
+
+    from app.db import create_db_and_tables, engine
+    from app.services import search
+
+    rng = random.Random(args.seed)
+    create_db_and_tables()
+    start = time.perf_counter()
+    vocabulary = populate(engine, args.tracks, args.users, rng)
+    print(f"generated {args.tracks} tracks in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    search.ensure_search_index(engine)
+    print(f"built FTS index in {time.perf_counter() - start:.1f}s (enabled: {search.fts_enabled()})")
+
+    # keystroke-style queries: prefixes of existing words
+    queries = [rng.choice(vocabulary)[: rng.randint(3, 6)] for _ in range(args.queries)]
+    with Session(engine) as session:
+        search._fts_enabled = False
+        run("LIKE", lambda q: search.search_tracks(session, q), queries)
+        search._fts_enabled = True
+        run("FTS5", lambda q: search.search_tracks(session, q), queries)
+
+
+if __name__ == "__main__":
+    main()
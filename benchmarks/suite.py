@@ -0,0 +1,274 @@
+"""Benchmark suite: service micro-benchmarks and an in-process HTTP load driver.
+
+Runs against a synthetic dataset from ``benchmarks.datagen`` (generated into a temporary
+directory, or reused with ``--db``). The micro-benchmarks call the functions behind the
+hot pages directly; the HTTP driver sends a weighted mix of requests through the ASGI
+app with httpx (no sockets), with the background services running as in production.
+
+Results are compared with the numbers stored for the same scale in
+``benchmarks/baselines.json``: a p50 or p95 more than ``--tolerance`` slower (and at
+least 1 ms slower) is flagged, and ``--check`` turns flags into a non-zero exit. The
+stored numbers come from one machine, so record a new baseline (``--save``) before
+comparing on another.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.suite --scale small
+    python -m benchmarks.suite --scale small --save
+    python -m benchmarks.suite --scale medium --db /tmp/pulse-medium.db --only http --check
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.datagen import SCALES, prepare
+
+BASELINES = Path(__file__).with_name("baselines.json")
+# regressions smaller than this are noise whatever the ratio
+MIN_DELTA_MS = 1.0
+
+
+def percentiles(timings: list[float]) -> dict:
+    """p50/p95/p99 in milliseconds of timings in seconds."""
+    timings = sorted(timings)
+    pick = lambda q: round(timings[min(int(len(timings) * q), len(timings) - 1)] * 1000, 3)  # noqa: E731
+    return {"p50": round(statistics.median(timings) * 1000, 3), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def fixtures(engine, rng: random.Random) -> dict:
+    """Ids and names the cases use: the busiest creator, listener and track, query words."""
+    from sqlalchemy import func, select
+
+    from app.models.favorite import Favorite
+    from app.models.stats import TrackStats, UserDailyPlays
+    from app.models.track import Track
+    from app.models.user import User
+
+    with engine.connect() as conn:
+        creator_id = conn.execute(
+            select(Track.creator_id).group_by(Track.creator_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        listener_id = conn.execute(
+            select(UserDailyPlays.user_id).group_by(UserDailyPlays.user_id).order_by(func.sum(UserDailyPlays.plays).desc()).limit(1)
+        ).scalar()
+        hit_id = conn.execute(select(TrackStats.track_id).order_by(TrackStats.plays_count.desc()).limit(1)).scalar()
+        nicknames = dict(conn.execute(select(User.id, User.nickname)).all())
+        liker_ids = conn.execute(select(Favorite.user_id).distinct().limit(500)).scalars().all()
+        titles = conn.execute(select(Track.title).order_by(func.random()).limit(500)).scalars().all()
+        track_count = conn.execute(select(func.max(Track.id))).scalar()
+    words = [w for title in titles for w in title.split()]
+    return {
+        "creator": nicknames[creator_id],
+        "listener_id": listener_id,
+        "hit_id": hit_id,
+        "tracks": track_count,
+        "users": [(uid, nicknames[uid]) for uid in liker_ids],
+        "nicknames": list(nicknames.values()),
+        # keystroke-style prefixes of real title words
+        "queries": [rng.choice(words)[: rng.randint(3, 6)] for _ in range(200)],
+    }
+
+
+def micro_cases(db, fx: dict, rng: random.Random) -> list[tuple[str, callable]]:
+    from app.routers.charts import chart_tracks
+    from app.routers.pages import index_fragment, profile_fragment
+    from app.routers.tracks import aggregate_track_counts
+    from app.services import counters, recommendations
+    from app.services.search import search_tracks
+
+    page, _ = search_tracks(db, None)
+    return [
+        ("search_tracks newest page", lambda: search_tracks(db, None)),
+        ("search_tracks query", lambda: search_tracks(db, rng.choice(fx["queries"]))),
+        ("aggregate_track_counts page", lambda: aggregate_track_counts(db, page)),
+        ("load_counters random ids", lambda: counters.load_counters(db, [rng.randint(1, fx["tracks"]) for _ in range(len(page))])),
+        ("index_fragment uncached", lambda: index_fragment(db, None, "all", None)),
+        ("profile_fragment top creator", lambda: profile_fragment(db, fx["creator"], None, None)),
+        ("chart_tracks day", lambda: chart_tracks(db, "day", None)),
+        ("similar_tracks hit", lambda: recommendations.similar_tracks(db, fx["hit_id"], 20)),
+        ("for_you top listener", lambda: recommendations.for_you(db, fx["listener_id"], 50)),
+    ]
+
+
+def run_micro(fx: dict, repeat: int, rng: random.Random) -> dict:
+    from sqlmodel import Session
+
+    from app.db import read_engine
+
+    results = {}
+    with Session(read_engine) as db:
+        for name, fn in micro_cases(db, fx, rng):
+            for _ in range(3):
+                fn()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+            results[name] = percentiles(timings)
+    return results
+
+
+def http_mix(fx: dict):
+    """(weight, route label, signed in, request builder) for the load driver."""
+    def track(rng):
+        return rng.randint(1, fx["tracks"])
+
+    return [
+        (30, "GET /", False, lambda rng, liked: ("GET", "/")),
+        (15, "GET / signed in", True, lambda rng, liked: ("GET", "/")),
+        (10, "GET /?q=", False, lambda rng, liked: ("GET", f"/?q={rng.choice(fx['queries'])}")),
+        (8, "GET /profiles/{nickname}", False, lambda rng, liked: ("GET", f"/profiles/{rng.choice(fx['nicknames'][:50])}")),
+        (8, "GET /api/v1/tracks", False, lambda rng, liked: ("GET", "/api/v1/tracks?fields=id,title,likes_count")),
+        (5, "GET /api/charts/day", False, lambda rng, liked: ("GET", "/api/charts/day?limit=20")),
+        (4, "GET /tracks/for-you", True, lambda rng, liked: ("GET", "/tracks/for-you")),
+        (15, "POST /tracks/{id}/play", False, lambda rng, liked: ("POST", f"/tracks/{track(rng)}/play")),
+        (5, "POST /tracks/{id}/like", True, like_request(track)),
+    ]
+
+
+def like_request(track):
+    def build(rng, liked: set):
+        track_id = track(rng)
+        action = "unlike" if track_id in liked else "like"
+        liked ^= {track_id}
+        return "POST", f"/tracks/{track_id}/{action}"
+
+    return build
+
+
+async def run_http(fx: dict, duration: float, concurrency: int, seed: int) -> dict:
+    import httpx
+
+    from app.config import settings
+    from app.deps import serializer
+    from app.main import app
+
+    mix = http_mix(fx)
+    weights = [weight for weight, *_ in mix]
+    samples: dict[str, list] = {label: [] for _, label, _, _ in mix}
+
+    async def client(rng: random.Random, stop_at: float) -> None:
+        uid, nickname = rng.choice(fx["users"])
+        cookie = {settings.session_cookie: serializer.dumps({"user_id": uid, "nickname": nickname})}
+        liked: set = set()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            while time.perf_counter() < stop_at:
+                _, label, signed_in, build = rng.choices(mix, weights)[0]
+                method, url = build(rng, liked)
+                start = time.perf_counter()
+                response = await http.request(method, url, cookies=cookie if signed_in else None)
+                elapsed = time.perf_counter() - start
+                # 503 is the play buffer's back-pressure, not a failure
+                samples[label].append(elapsed if response.status_code < 400 or response.status_code == 503 else None)
+
+    await app.router.startup()
+    try:
+        rng = random.Random(seed)
+        stop_at = time.perf_counter() + duration
+        await asyncio.gather(*(client(random.Random(rng.random()), stop_at) for _ in range(concurrency)))
+    finally:
+        await app.router.shutdown()
+
+    results = {}
+    for label, values in samples.items():
+        timings = [t for t in values if t is not None]
+        if not values:
+            continue
+        results[label] = {
+            "rps": round(len(values) / duration, 1),
+            "errors": len(values) - len(timings),
+            **(percentiles(timings) if timings else {}),
+        }
+    return results
+
+
+def compare(section: str, results: dict, baseline: dict, tolerance: float) -> list[str]:
+    flagged = []
+    print(f"\n{section}")
+    for name, stats in results.items():
+        base = baseline.get(name, {})
+        notes = []
+        for key in ("p50", "p95"):
+            if key in stats and key in base:
+                if stats[key] > base[key] * (1 + tolerance) and stats[key] - base[key] >= MIN_DELTA_MS:
+                    notes.append(f"{key} {base[key]:.2f} -> {stats[key]:.2f} ms")
+        line = f"  {name:<32}" + "".join(f" {key} {stats[key]:8.2f}" for key in ("p50", "p95", "p99") if key in stats)
+        if "rps" in stats:
+            line += f"   {stats['rps']:7.1f} req/s   errors {stats['errors']}"
+        if notes:
+            line += "   REGRESSION " + ", ".join(notes)
+            flagged.append(f"{section}: {name}: " + ", ".join(notes))
+        print(line)
+    return flagged
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--db", type=Path, help="reuse (or create) this dataset instead of a temporary one")
+    parser.add_argument("--only", choices=("micro", "http"))
+    parser.add_argument("--repeat", type=int, default=200, help="calls per micro-benchmark")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of HTTP load")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline for this scale")
+    parser.add_argument("--check", action="store_true", help="exit 1 if anything regressed")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db_path = args.db or Path(tempfile.mkdtemp()) / f"{args.scale}.db"
+    os.environ["FFMPEG_PATH"] = "/nonexistent/ffmpeg"
+    if db_path.exists():
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    else:
+        print(f"generating {args.scale} dataset into {db_path}")
+        start = time.perf_counter()
+        prepare(db_path, SCALES[args.scale], args.seed)
+        print(f"dataset ready in {time.perf_counter() - start:.1f}s")
+
+    from app.db import read_engine
+    from app.services.charts import chart_engine
+
+    rng = random.Random(args.seed)
+    fx = fixtures(read_engine, rng)
+    chart_engine.reload()
+    results = {}
+    if args.only != "http":
+        results["micro"] = run_micro(fx, args.repeat, rng)
+    if args.only != "micro":
+        results["http"] = asyncio.run(run_http(fx, args.duration, args.concurrency, args.seed))
+
+    stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    baseline = stored.get(args.scale, {})
+    flagged = []
+    for section, section_results in results.items():
+        flagged += compare(section, section_results, baseline.get(section, {}), args.tolerance)
+
+    if args.save:
+        stored[args.scale] = {
+            **baseline,
+            **results,
+            "machine": f"{platform.machine()} {platform.system()} python {platform.python_version()}",
+        }
+        BASELINES.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"\nbaseline for {args.scale} saved to {BASELINES}")
+    elif not baseline:
+        print(f"\nno stored baseline for {args.scale}; run with --save to record one")
+    if flagged:
+        print(f"\n{len(flagged)} regression(s) against the {args.scale} baseline")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()